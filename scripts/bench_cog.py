@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Benchmarks COG encodings (codec x predictor x blocksize x level) on synthetic
+DEM- and NDVI-like rasters: write time, file size and random-window reads.
+
+Usage:
+    python scripts/bench_cog.py --size 2048 --reads 50 --csv cog_bench.csv
+    python scripts/bench_cog.py --profiles   # compare the named COG_PROFILES
+"""
+
+import argparse
+import csv
+import itertools
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from fastclime.m1_etl import utils
+
+# Compression levels worth trying per codec; None is the codec's default.
+LEVELS = {
+    "DEFLATE": [1, 6, 9],
+    "ZSTD": [1, 9, 15],
+    "LZW": [None],
+    "LERC_ZSTD": [None],
+}
+READ_WINDOW = 256
+
+
+def _fractal(size: int, beta: float, rng) -> np.ndarray:
+    """A fractional Brownian surface in [0, 1] (spectral synthesis)."""
+    fy = np.fft.fftfreq(size)[:, None]
+    fx = np.fft.rfftfreq(size)[None, :]
+    freq = np.hypot(fx, fy)
+    freq[0, 0] = 1
+    spectrum = rng.normal(size=freq.shape) + 1j * rng.normal(size=freq.shape)
+    surface = np.fft.irfft2(spectrum / freq**beta, s=(size, size))
+    return (surface - surface.min()) / np.ptp(surface)
+
+
+def dem_like(size: int, rng) -> tuple[np.ndarray, float | None]:
+    """Smooth float32 elevations in metres, like Copernicus GLO-30."""
+    return (_fractal(size, 1.6, rng) * 3000).astype("float32"), None
+
+
+def ndvi_like(size: int, rng) -> tuple[np.ndarray, float | None]:
+    """Noisy NDVI in [-0.2, 1] on a 1e-4 grid, with nodata clouds and water."""
+    field = _fractal(size, 1.2, rng) * 1.1 - 0.15 + rng.normal(0, 0.03, (size, size))
+    ndvi = np.round(field.clip(-0.2, 1) * 10000) / 10000
+    ndvi[_fractal(size, 1.4, rng) > 0.8] = utils.RASTER_NODATA
+    return ndvi.astype("float32"), utils.RASTER_NODATA
+
+
+RASTERS = {"dem": dem_like, "ndvi": ndvi_like}
+
+
+def _source(data: np.ndarray, nodata: float | None) -> MemoryFile:
+    memfile = MemoryFile()
+    with memfile.open(
+        driver="GTiff",
+        width=data.shape[1],
+        height=data.shape[0],
+        count=1,
+        dtype=data.dtype,
+        crs="EPSG:4326",
+        transform=from_origin(-79, 9, 1 / 3600, 1 / 3600),
+        nodata=nodata,
+    ) as dst:
+        dst.write(data, 1)
+    return memfile
+
+
+def _read_latency_ms(path: Path, reads: int, rng) -> float:
+    """Median time to open the file and read one random full-res window."""
+    times = []
+    with rasterio.Env(GDAL_CACHEMAX=8):
+        for _ in range(reads):
+            start = time.perf_counter()
+            with rasterio.open(path) as src:
+                col = rng.integers(0, src.width - READ_WINDOW + 1)
+                row = rng.integers(0, src.height - READ_WINDOW + 1)
+                src.read(1, window=Window(col, row, READ_WINDOW, READ_WINDOW))
+            times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def _encodings(args) -> list[dict]:
+    if args.profiles:
+        return [
+            {"profile": name, **utils.cog_options(name)} for name in utils.COG_PROFILES
+        ]
+    encodings = []
+    for codec, predictor, blocksize in itertools.product(
+        args.codecs, args.predictors, args.blocksizes
+    ):
+        # LERC does its own prediction.
+        if codec.startswith("LERC") and predictor != 1:
+            continue
+        for level in LEVELS.get(codec, [None]):
+            encodings.append(
+                {
+                    "compress": codec,
+                    "predictor": predictor,
+                    "blocksize": blocksize,
+                    "level": level,
+                }
+            )
+    return encodings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=2048, help="Raster side, px.")
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--rasters", nargs="+", default=list(RASTERS))
+    parser.add_argument("--codecs", nargs="+", default=list(LEVELS))
+    parser.add_argument("--predictors", nargs="+", type=int, default=[1, 2, 3])
+    parser.add_argument("--blocksizes", nargs="+", type=int, default=[256, 512, 1024])
+    parser.add_argument("--threads", default="1", help="GDAL NUM_THREADS.")
+    parser.add_argument("--profiles", action="store_true")
+    parser.add_argument("--csv", type=Path)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.rasters:
+            data, nodata = RASTERS[kind](args.size, rng)
+            raw_mb = data.nbytes / 1024**2
+            with _source(data, nodata) as memfile, memfile.open() as src:
+                for i, encoding in enumerate(_encodings(args)):
+                    options = {k: v for k, v in encoding.items() if k != "profile"}
+                    dst = Path(tmp) / f"{kind}_{i}.tif"
+                    start = time.perf_counter()
+                    utils.write_cog(src, dst, num_threads=args.threads, **options)
+                    write_s = time.perf_counter() - start
+                    results.append(
+                        {
+                            "raster": kind,
+                            **encoding,
+                            "write_s": round(write_s, 3),
+                            "size_mb": round(dst.stat().st_size / 1024**2, 2),
+                            "ratio": round(raw_mb / (dst.stat().st_size / 1024**2), 2),
+                            "read_ms": round(_read_latency_ms(dst, args.reads, rng), 2),
+                        }
+                    )
+                    dst.unlink()
+                    print(results[-1])
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+
+    print(f"\nsize={args.size}px reads={args.reads} window={READ_WINDOW}px")
+    for kind in args.rasters:
+        print(f"\n{kind}: smallest files")
+        rows = sorted(
+            (r for r in results if r["raster"] == kind), key=lambda r: r["size_mb"]
+        )
+        for r in rows[:10]:
+            label = r.get("profile") or (
+                f"{r['compress']} p{r['predictor']} b{r['blocksize']} L{r['level']}"
+            )
+            print(
+                f"  {label:<28} {r['size_mb']:>7.2f} MB  x{r['ratio']:<5} "
+                f"write {r['write_s']:>6.2f} s  read {r['read_ms']:>6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
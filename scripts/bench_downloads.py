@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmarks sequential vs. pooled concurrent downloads against a local HTTP
+stand-in server that adds a fixed per-request latency.
+
+Usage:
+    python scripts/bench_downloads.py --files 100 --size-kb 512 --latency 0.1
+"""
+
+import argparse
+import http.server
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from fastclime.m1_etl import utils
+
+
+class _SlowHandler(http.server.SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds/request.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-per-host", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "served"
+        root.mkdir()
+        payload = b"\0" * (args.size_kb * 1024)
+        for i in range(args.files):
+            (root / f"tile_{i}.tif").write_bytes(payload)
+
+        _SlowHandler.latency = args.latency
+        server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), partial(_SlowHandler, directory=str(root))
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+        urls = [f"{base}/tile_{i}.tif" for i in range(args.files)]
+
+        out = Path(tmp) / "sequential"
+        start = time.perf_counter()
+        for url in urls:
+            utils.download_file(url, out / url.rsplit("/", 1)[-1])
+        sequential = time.perf_counter() - start
+
+        out = Path(tmp) / "pooled"
+        start = time.perf_counter()
+        with utils.DownloadManager(
+            max_workers=args.workers, max_per_host=args.max_per_host
+        ) as manager:
+            manager.download_many(
+                [(url, out / url.rsplit("/", 1)[-1]) for url in urls],
+                raise_on_error=True,
+            )
+        pooled = time.perf_counter() - start
+        server.shutdown()
+
+    print(f"files={args.files} size={args.size_kb}KiB latency={args.latency}s")
+    print(f"sequential: {sequential:.2f}s")
+    print(f"pooled ({args.workers} workers): {pooled:.2f}s")
+    print(f"speedup: {sequential / pooled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
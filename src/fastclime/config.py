@@ -40,6 +40,55 @@ class Settings(BaseSettings):
     def DIR_LOGS(self) -> Path:
         return self.DATA_DIR / "logs"
 
+    # Seconds a catalog writer waits for another process to release the
+    # DuckDB write lock before giving up.
+    CATALOG_LOCK_TIMEOUT_S: float = 30.0
+
+    # Disk quotas for the LRU-managed caches, in GiB (see `m0_storage.cache`).
+    CACHE_QUOTA_RAW_GB: float = 50.0
+    CACHE_QUOTA_TMP_GB: float = 10.0
+
+    # Concurrency of the ETL download manager (see `m1_etl.utils.DownloadManager`).
+    DOWNLOAD_WORKERS: int = 8
+    DOWNLOAD_MAX_PER_HOST: int = 4
+
+    # How long cached NASA CMR search responses stay fresh (see `m1_etl.cmr`).
+    CMR_CACHE_TTL_H: float = 24.0
+
+    # Worker processes for CPU-bound ETL steps such as tile extraction.
+    PROCESS_WORKERS: int = os.cpu_count() or 1
+
+    # Encoding and resources of raster writes (see `m1_etl.utils.write_cog`).
+    # The predictor "YES" lets GDAL pick 2 (integers) or 3 (floating point).
+    COG_COMPRESS: str = "DEFLATE"
+    COG_PREDICTOR: str = "YES"
+    RASTER_NUM_THREADS: str = "ALL_CPUS"
+    RASTER_CACHE_MB: int = 512
+    # GDAL's own default; changing it changes how warps are chunked, which
+    # can alter the last bit of interpolated floats.
+    RASTER_WARP_MEM_MB: int = 64
+
+    # Thresholds every processed file is checked against before it is
+    # registered (see `m1_etl.qa`). QA_THRESHOLDS overrides them per dataset
+    # and can add a value range, e.g.
+    # '{"ndvi": {"max_fill_ratio": 0.5, "min": -1, "max": 1}}'.
+    QA_MAX_FILL_RATIO: float = 1.0
+    QA_MIN_VALID: int = 0
+    QA_THRESHOLDS: dict[str, dict[str, float]] = {}
+
+    # Read DEM tiles in place over HTTP range requests instead of downloading
+    # them (see `m1_etl.utils.remote_env`).
+    DEM_REMOTE_READ: bool = False
+
+    # Derive slope, aspect and air pressure COGs from every ingested DEM
+    # (see `m1_etl.terrain`); `fastclime ingest run dem --terrain` does it
+    # for a single run.
+    DEM_TERRAIN: bool = False
+
+    # Parcel polygons (any vector format, with `parcel_id` and `zone_id`
+    # columns) for per-parcel zonal statistics (see `m1_etl.zonal`).
+    PARCELS_PATH: Path | None = None
+
     # GDAL/PROJ environment variables
     GDAL_DATA: str | None = os.environ.get("GDAL_DATA")
     PROJ_LIB: str | None = os.environ.get("PROJ_LIB")
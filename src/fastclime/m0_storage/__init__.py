@@ -8,6 +8,7 @@ file paths, and metadata for the FastClime project.
 from fastclime.config import settings
 from .io import data_path, calculate_sha256, Stage
 from .catalog import DataCatalog, get_catalog as get_catalog_singleton
+from .sync import sync as _sync, write_manifest
 from ..core.logging import get_logger
 
 log = get_logger(__name__)
@@ -33,13 +34,21 @@ def register_artifact(*args, **kwargs):
     return get_catalog().register_artifact(*args, **kwargs)
 
 
-def sync(remote_source: str):
-    """
-    Placeholder for the data synchronization logic.
-    In a real implementation, this would trigger a robust sync process.
-    """
-    log.info(f"Syncing from remote source: {remote_source}...")
-    print(f"Syncing from {remote_source}... (placeholder)")
+def sync(remote_source: str, **kwargs) -> dict:
+    """Delta-syncs a remote into DATA_DIR. See `m0_storage.sync.sync`."""
+    return _sync(remote_source, **kwargs)
+
+
+# `footprints` needs shapely and rasterio, so it is only imported when used.
+_LAZY = {"FootprintIndex": "footprints", "find_rasters": "footprints"}
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        import importlib
+
+        return getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 __all__ = [
@@ -47,6 +56,7 @@ __all__ = [
     "DATA_DIR",
     # Types
     "Stage",
+    "FootprintIndex",
     # Functions
     "get_catalog",
     "data_path",
@@ -54,4 +64,6 @@ __all__ = [
     "register_dataset",
     "register_artifact",
     "sync",
+    "write_manifest",
+    "find_rasters",
 ]
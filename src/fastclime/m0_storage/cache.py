@@ -0,0 +1,246 @@
+"""
+Quota-based LRU management of the `raw/` and `tmp/` caches.
+
+Access times and sizes are tracked in the `cache_entries` catalog table. The
+index is reconciled with the filesystem on every scan, so files written by
+other tools are picked up and deleted files are forgotten. Consumers call
+`touch` when they reuse a cached file so that hot files survive eviction, and
+`enforce_quota` after writing to a cache so it never stays over its quota.
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from .catalog import DataCatalog, get_catalog
+from .io import get_stage_dir
+
+log = get_logger(__name__)
+
+CACHE_STAGES = ("raw", "tmp")
+GIB = 1024**3
+# In-flight downloads and syncs; never evicted.
+_PROTECTED_SUFFIXES = (".part",)
+
+
+def _init_tables(con):
+    """Creates the cache index table if it doesn't exist."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            relative_path VARCHAR PRIMARY KEY,
+            stage VARCHAR,
+            size_bytes BIGINT,
+            last_access TIMESTAMP,
+            hits BIGINT DEFAULT 0
+        );
+    """
+    )
+
+
+def get_quota_bytes(stage: str) -> int:
+    """Returns the configured quota for a cache stage, in bytes."""
+    quotas = {
+        "raw": settings.CACHE_QUOTA_RAW_GB,
+        "tmp": settings.CACHE_QUOTA_TMP_GB,
+    }
+    return int(quotas[stage] * GIB)
+
+
+def _scan_dir(stage: str, data_dir: Path) -> pd.DataFrame:
+    """Lists every file of a stage with its size and last access time."""
+    base = get_stage_dir(stage)
+    rows = []
+    for dirpath, _, filenames in os.walk(base):
+        for name in filenames:
+            path = Path(dirpath) / name
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # Removed while scanning
+            rows.append(
+                (
+                    path.relative_to(data_dir).as_posix(),
+                    stage,
+                    st.st_size,
+                    # atime is unreliable on noatime/relatime mounts.
+                    datetime.fromtimestamp(max(st.st_atime, st.st_mtime)),
+                )
+            )
+    return pd.DataFrame(
+        rows, columns=["relative_path", "stage", "size_bytes", "last_access"]
+    )
+
+
+class CacheManager:
+    """Tracks and evicts files in the raw/tmp caches in LRU order."""
+
+    def __init__(
+        self, catalog: DataCatalog | None = None, data_dir: Path | None = None
+    ):
+        self.catalog = catalog or get_catalog()
+        self.data_dir = Path(data_dir or settings.DATA_DIR)
+        with self.catalog.get_connection() as con:
+            _init_tables(con)
+
+    def scan(self, stage: str) -> None:
+        """Reconciles the index of a stage with the files on disk."""
+        fs = _scan_dir(stage, self.data_dir)
+        with self.catalog.get_connection() as con:
+            con.register("fs", fs)
+            con.execute(
+                """
+                DELETE FROM cache_entries
+                WHERE stage = ? AND relative_path NOT IN (SELECT relative_path FROM fs)
+                """,
+                (stage,),
+            )
+            con.execute(
+                """
+                INSERT INTO cache_entries (relative_path, stage, size_bytes, last_access)
+                SELECT relative_path, stage, size_bytes, last_access FROM fs
+                ON CONFLICT (relative_path) DO UPDATE SET
+                    size_bytes = excluded.size_bytes,
+                    last_access = greatest(cache_entries.last_access, excluded.last_access)
+                """
+            )
+            con.unregister("fs")
+        log.debug(f"Indexed {len(fs)} files in the '{stage}' cache.")
+
+    def touch(self, paths: list[Path]) -> None:
+        """Records an access to cached files, keeping them hot."""
+        now = datetime.now()
+        rows = []
+        for path in paths:
+            path = Path(path)
+            rel = path.relative_to(self.data_dir)
+            rows.append((rel.as_posix(), rel.parts[0], path.stat().st_size, now))
+        if not rows:
+            return
+        with self.catalog.get_connection() as con:
+            con.executemany(
+                """
+                INSERT INTO cache_entries (relative_path, stage, size_bytes, last_access, hits)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT (relative_path) DO UPDATE SET
+                    size_bytes = excluded.size_bytes,
+                    last_access = excluded.last_access,
+                    hits = cache_entries.hits + 1
+                """,
+                rows,
+            )
+
+    def stats(self) -> dict:
+        """Returns usage, quota and access range per cache stage."""
+        for stage in CACHE_STAGES:
+            self.scan(stage)
+        with self.catalog.get_connection() as con:
+            rows = con.execute(
+                """
+                SELECT stage, count(*), coalesce(sum(size_bytes), 0),
+                       min(last_access), max(last_access), coalesce(sum(hits), 0)
+                FROM cache_entries
+                GROUP BY stage
+                """
+            ).fetchall()
+        by_stage = {r[0]: r[1:] for r in rows}
+
+        out = {}
+        for stage in CACHE_STAGES:
+            files, size, oldest, newest, hits = by_stage.get(
+                stage, (0, 0, None, None, 0)
+            )
+            quota = get_quota_bytes(stage)
+            out[stage] = {
+                "files": files,
+                "size_bytes": int(size),
+                "quota_bytes": quota,
+                "usage_ratio": round(size / quota, 4) if quota else None,
+                "hits": int(hits),
+                "oldest_access": oldest.isoformat() if oldest else None,
+                "newest_access": newest.isoformat() if newest else None,
+            }
+        return out
+
+    def evict(
+        self,
+        stage: str,
+        quota_bytes: int | None = None,
+        dry_run: bool = False,
+    ) -> dict:
+        """
+        Deletes least-recently-used files until the stage fits its quota.
+
+        Returns the number of files and bytes evicted.
+        """
+        quota = get_quota_bytes(stage) if quota_bytes is None else quota_bytes
+        self.scan(stage)
+        with self.catalog.get_connection() as con:
+            entries = con.execute(
+                """
+                SELECT relative_path, size_bytes
+                FROM cache_entries
+                WHERE stage = ?
+                ORDER BY last_access ASC, relative_path
+                """,
+                (stage,),
+            ).fetchall()
+
+        total = sum(size for _, size in entries)
+        evicted = []
+        freed = 0
+        for rel, size in entries:
+            if total - freed <= quota:
+                break
+            if rel.endswith(_PROTECTED_SUFFIXES):
+                continue
+            evicted.append(rel)
+            freed += size
+
+        if not dry_run:
+            for rel in evicted:
+                path = self.data_dir / rel
+                path.unlink(missing_ok=True)
+                self._prune_empty_dirs(path.parent, get_stage_dir(stage))
+            if evicted:
+                with self.catalog.get_connection() as con:
+                    con.executemany(
+                        "DELETE FROM cache_entries WHERE relative_path = ?",
+                        [(rel,) for rel in evicted],
+                    )
+            log.info(
+                f"Evicted {len(evicted)} files ({freed} bytes) from the '{stage}' cache."
+            )
+
+        return {
+            "stage": stage,
+            "quota_bytes": quota,
+            "size_before_bytes": total,
+            "size_after_bytes": total - freed,
+            "files_evicted": len(evicted),
+            "bytes_evicted": freed,
+            "dry_run": dry_run,
+        }
+
+    def enforce_quota(self, stages: tuple[str, ...] = CACHE_STAGES) -> list[dict]:
+        """
+        Evicts from every stage that exceeds its configured quota.
+
+        Returns the evictions made, one per stage that was over quota.
+        """
+        results = [self.evict(stage) for stage in stages]
+        return [r for r in results if r["files_evicted"]]
+
+    @staticmethod
+    def _prune_empty_dirs(directory: Path, stop: Path) -> None:
+        """Removes empty directories left behind by evictions, up to `stop`."""
+        while directory != stop and stop in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                return  # Not empty
+            directory = directory.parent
@@ -1,4 +1,7 @@
 import duckdb
+import os
+import threading
+import time
 from pathlib import Path
 import uuid
 from datetime import datetime
@@ -9,6 +12,24 @@ from fastclime.core.logging import get_logger
 
 log = get_logger(__name__)
 
+# Tables exported to Parquet snapshots for lock-free readers.
+SNAPSHOT_TABLES = (
+    "datasets",
+    "artifacts",
+    "metrics_hourly",
+    "deficit_proj",
+    "plant_ndvi_daily",
+)
+
+
+# DuckDB can fail with a file handle conflict when several threads of one
+# process open the same database file at the same moment.
+_CONNECT_LOCK = threading.Lock()
+
+
+def _is_lock_error(e: Exception) -> bool:
+    return isinstance(e, duckdb.IOException) and "lock" in str(e).lower()
+
 
 class DataCatalog:
     """Manages the DuckDB catalog for datasets and artifacts."""
@@ -21,9 +42,175 @@ class DataCatalog:
         """Ensures the parent directory for the database exists."""
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    def get_connection(self) -> duckdb.DuckDBPyConnection:
-        """Returns a connection to the DuckDB database."""
-        return duckdb.connect(database=str(self.db_path), read_only=False)
+    @property
+    def snapshot_dir(self) -> Path:
+        """Directory holding the Parquet snapshots of the hot tables."""
+        return self.db_path.parent / "snapshots"
+
+    def get_connection(
+        self, read_only: bool = False, timeout: float | None = None
+    ) -> duckdb.DuckDBPyConnection:
+        """
+        Returns a connection to the DuckDB database.
+
+        DuckDB allows a single writing process. If another process holds the
+        lock, this waits up to `timeout` seconds (default
+        `settings.CATALOG_LOCK_TIMEOUT_S`) for it to be released, so concurrent
+        writers queue up instead of failing. Readers that must not wait for
+        writers should use `read_connection` instead.
+        """
+        if timeout is None:
+            timeout = settings.CATALOG_LOCK_TIMEOUT_S
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            try:
+                with _CONNECT_LOCK:
+                    return duckdb.connect(
+                        database=str(self.db_path), read_only=read_only
+                    )
+            except duckdb.IOException as e:
+                if not _is_lock_error(e) or time.monotonic() >= deadline:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def _last_write_time(self) -> float:
+        """Modification time of the database, including its write-ahead log."""
+        wal = self.db_path.with_name(self.db_path.name + ".wal")
+        return max(
+            (p.stat().st_mtime for p in (self.db_path, wal) if p.exists()),
+            default=0.0,
+        )
+
+    def snapshot(
+        self, tables: tuple[str, ...] | None = None, wait: bool = True
+    ) -> list[Path]:
+        """
+        Exports tables to Parquet snapshots that readers can query lock-free.
+
+        Only snapshots older than the last write to the catalog are refreshed.
+        Each file is written next to its target and renamed into place, so
+        readers never see a partial snapshot. With `wait=False` the export is
+        skipped (and existing snapshots kept) while a writer holds the lock.
+        Returns the paths of the snapshots that were refreshed.
+        """
+        tables = tables or SNAPSHOT_TABLES
+        last_write = self._last_write_time()
+        stale = [
+            t
+            for t in tables
+            if not (self.snapshot_dir / f"{t}.parquet").exists()
+            or (self.snapshot_dir / f"{t}.parquet").stat().st_mtime < last_write
+        ]
+        if not stale:
+            return []
+
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            con = self.get_connection(read_only=False, timeout=None if wait else 0)
+        except duckdb.IOException as e:
+            if wait or not _is_lock_error(e):
+                raise
+            log.info("Catalog is locked by a writer; serving existing snapshots.")
+            return []
+
+        refreshed = []
+        with con:
+            existing = {
+                r[0]
+                for r in con.execute(
+                    "SELECT table_name FROM information_schema.tables "
+                    "WHERE table_schema = 'main'"
+                ).fetchall()
+            }
+            for table in stale:
+                if table not in existing:
+                    continue
+                dst = self.snapshot_dir / f"{table}.parquet"
+                tmp = dst.with_name(f".{table}.{os.getpid()}.parquet")
+                con.execute(
+                    f"COPY (SELECT * FROM {table}) TO '{tmp}' "
+                    "(FORMAT PARQUET, COMPRESSION ZSTD)"
+                )
+                os.replace(tmp, dst)
+                refreshed.append(dst)
+        # Closing may checkpoint the WAL into the database file without any
+        # logical change; keep the fresh snapshots from looking stale.
+        last_write = self._last_write_time()
+        for path in refreshed:
+            if path.stat().st_mtime < last_write:
+                os.utime(path, (last_write, last_write))
+        if refreshed:
+            log.info(f"Refreshed {len(refreshed)} catalog snapshots.")
+        return refreshed
+
+    def read_connection(
+        self, tables: tuple[str, ...] | None = None
+    ) -> duckdb.DuckDBPyConnection:
+        """
+        Returns an in-memory connection with a view per snapshotted table.
+
+        The catalog file itself is never opened by the returned connection, so
+        any number of readers can run at full speed while an ingest or model
+        run holds the write lock. Snapshots are refreshed first when the
+        catalog has changed and no writer is active; otherwise the latest
+        snapshot is served.
+
+        Tables without a snapshot yet (a cold start while the catalog could
+        not be exported) are copied from a read-only attach of the catalog.
+        If a writer holds the lock even that is impossible, and
+        FileNotFoundError is raised rather than leaving the table undefined.
+        """
+        self.snapshot(tables, wait=False)
+        con = duckdb.connect(":memory:")
+        missing = []
+        for table in tables or SNAPSHOT_TABLES:
+            path = self.snapshot_dir / f"{table}.parquet"
+            if path.exists():
+                con.execute(
+                    f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}')"
+                )
+            else:
+                missing.append(table)
+        if missing and self.db_path.exists():
+            try:
+                self._copy_read_only(con, missing)
+            except BaseException:
+                con.close()
+                raise
+        return con
+
+    def _copy_read_only(self, con: duckdb.DuckDBPyConnection, tables: list[str]):
+        """
+        Copies catalog tables into an in-memory connection through a
+        read-only attach, detached again so readers don't hold the file.
+        """
+        try:
+            with _CONNECT_LOCK:
+                con.execute(f"ATTACH '{self.db_path}' AS catalog (READ_ONLY)")
+        except duckdb.IOException as e:
+            if not _is_lock_error(e):
+                raise
+            raise FileNotFoundError(
+                f"No catalog snapshot of {tables} yet and '{self.db_path}' is "
+                "locked by a writer; retry once the write job has finished."
+            ) from e
+        try:
+            existing = {
+                r[0]
+                for r in con.execute(
+                    "SELECT table_name FROM duckdb_tables() "
+                    "WHERE database_name = 'catalog'"
+                ).fetchall()
+            }
+            for table in tables:
+                if table in existing:
+                    con.execute(
+                        f"CREATE TABLE {table} AS SELECT * FROM catalog.main.{table}"
+                    )
+        finally:
+            con.execute("DETACH catalog")
 
     def init_catalog(self):
         """Creates the necessary tables if they don't exist."""
@@ -96,6 +283,60 @@ class DataCatalog:
         )
         return artifact_id
 
+    def register_artifacts(self, records: list[dict]) -> list[uuid.UUID]:
+        """
+        Registers many file artifacts in a single transaction.
+
+        Each record must provide the keyword arguments of `register_artifact`.
+        """
+        if not records:
+            return []
+        now = datetime.now()
+        ids = [uuid.uuid4() for _ in records]
+        rows = [
+            (
+                artifact_id,
+                r["dataset_name"],
+                r["stage"],
+                r["relative_path"],
+                r["file_hash"],
+                r["file_size_bytes"],
+                now,
+            )
+            for artifact_id, r in zip(ids, records)
+        ]
+        with self.get_connection() as con:
+            con.executemany(
+                """
+                INSERT INTO artifacts (id, dataset_name, stage, relative_path, file_hash, file_size_bytes, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        log.info(f"Registered {len(rows)} artifacts.")
+        return ids
+
+    def get_artifact_index(
+        self, stage: str | None = None
+    ) -> dict[str, tuple[str, int]]:
+        """
+        Returns the latest (file_hash, file_size_bytes) for every artifact path.
+
+        Paths may be registered more than once (e.g. after a re-sync); the most
+        recent registration wins.
+        """
+        query = """
+            SELECT relative_path, file_hash, file_size_bytes
+            FROM artifacts
+            WHERE ? IS NULL OR stage = ?
+            QUALIFY row_number() OVER (
+                PARTITION BY relative_path ORDER BY created_at DESC
+            ) = 1
+        """
+        with self.get_connection() as con:
+            rows = con.execute(query, (stage, stage)).fetchall()
+        return {path: (file_hash, size) for path, file_hash, size in rows}
+
 
 _CATALOG_SINGLETON: Optional[DataCatalog] = None
 
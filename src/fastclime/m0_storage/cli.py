@@ -1,12 +1,23 @@
 import typer
+import json
 import shutil
+from datetime import datetime
+from pathlib import Path
 
 from fastclime.config import settings
 from fastclime.core.logging import get_logger
 from .catalog import get_catalog
+from .sync import DEFAULT_WORKERS, sync as run_sync, write_manifest
+from .cache import CACHE_STAGES, CacheManager
+from . import lake
+from .stats import storage_stats
 
 log = get_logger(__name__)
 app = typer.Typer(help="Manage the FastClime data storage hub.")
+cache_app = typer.Typer(help="Inspect and evict the LRU-managed raw/tmp caches.")
+app.add_typer(cache_app, name="cache")
+lake_app = typer.Typer(help="Maintain the partitioned Parquet lake.")
+app.add_typer(lake_app, name="lake")
 
 
 @app.command()
@@ -50,20 +61,143 @@ def info():
         print(f"  - {d.relative_to(settings.DATA_DIR)}/")
 
 
+@app.command()
+def stats(
+    as_json: bool = typer.Option(
+        False, "--json", help="Print the full report as JSON."
+    ),
+):
+    """Reports storage usage per dataset and stage, growth and duplicates."""
+    report = storage_stats()
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    total = report["total"]
+    print("FastClime Storage Usage")
+    print("=======================")
+    print(
+        f"Catalog: {total['files']} files, {total['bytes'] / 1024**2:.1f} MiB "
+        f"({total['duplicate_ratio']:.1%} duplicate bytes)"
+    )
+    print("\nBy dataset / stage:")
+    for row in report["by_dataset_stage"]:
+        print(
+            f"  - {row['dataset']}/{row['stage']}: {row['files']} files, "
+            f"{row['bytes'] / 1024**2:.1f} MiB"
+        )
+    if report["growth"]:
+        print("\nGrowth by month:")
+        for row in report["growth"]:
+            print(
+                f"  - {row['month']}: +{row['bytes'] / 1024**2:.1f} MiB "
+                f"(total {row['cumulative_bytes'] / 1024**2:.1f} MiB)"
+            )
+    for stage, datasets in report["filesystem"].items():
+        if datasets:
+            print(f"\nNot in catalog, scanned '{stage}/':")
+            for name, usage in datasets.items():
+                print(
+                    f"  - {name}: {usage['files']} files, "
+                    f"{usage['bytes'] / 1024**2:.1f} MiB"
+                )
+
+
 @app.command()
 def sync(
     remote: str = typer.Argument(
-        ..., help="The remote URI to sync from (e.g., 's3://bucket/path')."
+        ..., help="The remote to sync from (a local path or 'file://' URI)."
+    ),
+    workers: int = typer.Option(DEFAULT_WORKERS, help="Number of parallel transfers."),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Only report what would be transferred."
     ),
 ):
     """
-    Syncs data from a remote source (placeholder).
+    Syncs data from a remote source, transferring only missing or changed files.
 
-    In a real implementation, this would use rclone, boto3, etc.
+    Interrupted transfers are resumed on the next run.
     """
     log.info(f"Starting sync from remote: {remote}")
-    print(f"Syncing data from {remote}... (placeholder)")
-    print("✅ Sync complete (placeholder).")
+    try:
+        stats = run_sync(remote, workers=workers, dry_run=dry_run)
+    except (FileNotFoundError, ValueError) as e:
+        log.error(f"Sync from '{remote}' failed: {e}")
+        raise typer.Exit(code=1)
+
+    print(json.dumps(stats, indent=2))
+    if stats["failed"]:
+        raise typer.Exit(code=1)
+    print("✅ Sync complete.")
+
+
+@app.command()
+def manifest(
+    root: Path = typer.Argument(..., help="Directory to publish as a sync remote."),
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, help="Number of parallel hashing workers."
+    ),
+):
+    """Writes the sync manifest (path, size, SHA-256) for a remote directory."""
+    manifest_path = write_manifest(root, workers=workers)
+    print(f"✅ Manifest written to: {manifest_path}")
+
+
+@app.command()
+def snapshot():
+    """
+    Exports the hot catalog tables to Parquet snapshots for lock-free readers.
+
+    Readers refresh stale snapshots on their own when no writer is active.
+    Exporting needs the catalog's write lock, so while another process is
+    writing this waits up to FASTCLIME_CATALOG_LOCK_TIMEOUT_S and then
+    fails; run it after write jobs, e.g. before a batch of readers starts.
+    """
+    refreshed = get_catalog().snapshot()
+    for path in refreshed:
+        log.info(f"Snapshot written: {path}")
+    print(f"✅ {len(refreshed)} catalog snapshots refreshed.")
+
+
+@app.command()
+def coverage(
+    bbox: str = typer.Option(
+        ..., help='Bounding box in "min_lon min_lat max_lon max_lat" format.'
+    ),
+    dataset: str = typer.Option(None, help="Only rasters of this dataset."),
+    start: datetime = typer.Option(None, formats=["%Y-%m-%d"], help="First date."),
+    end: datetime = typer.Option(None, formats=["%Y-%m-%d"], help="Last date."),
+    reindex: bool = typer.Option(
+        False, "--reindex", help="Index rasters registered without a footprint."
+    ),
+):
+    """Lists the processed rasters that intersect a bbox and date range."""
+    from .footprints import FootprintIndex, index_artifacts
+
+    if reindex:
+        index_artifacts()
+    index = FootprintIndex.load(dataset)
+    hits = index.query(
+        [float(v) for v in bbox.split()],
+        start.date() if start else None,
+        end.date() if end else None,
+    )
+    print(
+        json.dumps(
+            [
+                {
+                    "dataset": f.dataset_name,
+                    "path": f.relative_path,
+                    "crs": f.crs,
+                    "resolution": [f.res_x, f.res_y],
+                    "time_start": f.time_start.isoformat() if f.time_start else None,
+                    "time_end": f.time_end.isoformat() if f.time_end else None,
+                }
+                for f in hits
+            ],
+            indent=2,
+        )
+    )
 
 
 @app.command(name="clean-temp")
@@ -82,3 +216,64 @@ def clean_temp():
         else:
             item.unlink()
     print(f"✅ Temporary directory cleaned: {temp_dir}")
+
+
+def _parse_stages(stage: str | None) -> tuple[str, ...]:
+    if stage is None:
+        return CACHE_STAGES
+    if stage not in CACHE_STAGES:
+        print(f"Unknown cache stage '{stage}'. Choose from: {', '.join(CACHE_STAGES)}")
+        raise typer.Exit(code=1)
+    return (stage,)
+
+
+@cache_app.command("stats")
+def cache_stats():
+    """Shows size, quota usage and access range of each cache."""
+    stats = CacheManager().stats()
+    print(json.dumps(stats, indent=2))
+
+
+@cache_app.command("evict")
+def cache_evict(
+    stage: str = typer.Option(
+        None, help="Only evict from this cache ('raw' or 'tmp')."
+    ),
+    quota_gb: float = typer.Option(
+        None, help="Override the configured quota (GiB) for this run."
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Only report what would be evicted."
+    ),
+):
+    """Evicts least-recently-used files until each cache fits its quota."""
+    manager = CacheManager()
+    quota_bytes = int(quota_gb * 1024**3) if quota_gb is not None else None
+    results = [
+        manager.evict(s, quota_bytes=quota_bytes, dry_run=dry_run)
+        for s in _parse_stages(stage)
+    ]
+    print(json.dumps(results, indent=2))
+
+
+@lake_app.command("refresh")
+def lake_refresh():
+    """Re-creates the `lake_<dataset>` views over the partitioned Parquet files."""
+    views = lake.refresh_views()
+    print(f"✅ {len(views)} lake views refreshed: {', '.join(views)}")
+
+
+@lake_app.command("export")
+def lake_export(
+    table: str = typer.Argument(..., help="Catalog table to export."),
+    time_column: str = typer.Option(
+        ..., help="Timestamp/date column used for year/month partitions."
+    ),
+    dataset: str = typer.Option(None, help="Lake dataset name (defaults to table)."),
+    delete: bool = typer.Option(
+        False, "--delete", help="Remove the exported rows from the catalog."
+    ),
+):
+    """Moves a large catalog table into the Parquet lake."""
+    rows = lake.export_table(table, time_column, dataset=dataset, delete=delete)
+    print(f"✅ Exported {rows} rows from '{table}'.")
@@ -0,0 +1,269 @@
+"""
+Spatial index of processed raster artifacts.
+
+Every raster registered in the catalog gets a row in `raster_footprints`
+with its lon/lat footprint, native CRS, size, resolution and the time range
+it describes (NULL for static layers such as the DEM). `FootprintIndex`
+loads those rows into a shapely STRtree, so "which files cover this bbox and
+date?" is answered without opening a single raster.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+import rasterio
+from rasterio.warp import transform_bounds
+from shapely import wkt
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from .catalog import DataCatalog, get_catalog
+
+log = get_logger(__name__)
+
+FOOTPRINT_CRS = "EPSG:4326"
+RASTER_SUFFIXES = (".tif", ".tiff", ".vrt")
+
+
+def _init_tables(con):
+    """Creates the raster footprint table if it doesn't exist."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS raster_footprints (
+            artifact_id UUID PRIMARY KEY,
+            dataset_name VARCHAR,
+            relative_path VARCHAR,
+            crs VARCHAR,
+            width INTEGER,
+            height INTEGER,
+            res_x DOUBLE,
+            res_y DOUBLE,
+            footprint VARCHAR, -- WKT polygon in EPSG:4326
+            time_start DATE,
+            time_end DATE
+        );
+    """
+    )
+
+
+@dataclass(frozen=True)
+class Footprint:
+    """Where, when and at which resolution a processed raster has data."""
+
+    artifact_id: str
+    dataset_name: str
+    relative_path: str
+    crs: str
+    width: int
+    height: int
+    res_x: float
+    res_y: float
+    geometry: object
+    time_start: date | None = None
+    time_end: date | None = None
+
+    @property
+    def path(self) -> Path:
+        return settings.DATA_DIR / self.relative_path
+
+    @property
+    def tolerance(self) -> float:
+        """Half a pixel, in footprint (degree) units."""
+        min_x, _, max_x, _ = self.geometry.bounds
+        return (max_x - min_x) / self.width / 2
+
+    def overlaps_time(self, start: date | None, end: date | None) -> bool:
+        """Static rasters (no time range) match every date."""
+        if self.time_start is None or start is None:
+            return True
+        return self.time_start <= (end or start) and start <= self.time_end
+
+    def covers_time(self, start: date | None, end: date | None) -> bool:
+        """Tells whether the raster spans the whole date range."""
+        if self.time_start is None or start is None:
+            return True
+        return self.time_start <= start and (end or start) <= self.time_end
+
+
+def read_footprint(path: Path) -> dict:
+    """Reads the footprint columns of a raster from its header."""
+    with rasterio.open(path) as src:
+        bounds = transform_bounds(src.crs, FOOTPRINT_CRS, *src.bounds, densify_pts=21)
+        return {
+            "crs": src.crs.to_string(),
+            "width": src.width,
+            "height": src.height,
+            "res_x": src.res[0],
+            "res_y": src.res[1],
+            "footprint": box(*bounds).wkt,
+        }
+
+
+def register_footprint(
+    artifact_id,
+    dataset_name: str,
+    path: Path,
+    time_start: date | None = None,
+    time_end: date | None = None,
+    catalog: DataCatalog | None = None,
+) -> None:
+    """Indexes a registered raster artifact; `path` is read for its header."""
+    catalog = catalog or get_catalog()
+    row = read_footprint(path)
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        con.execute(
+            """
+            INSERT OR REPLACE INTO raster_footprints
+                (artifact_id, dataset_name, relative_path, crs, width, height,
+                 res_x, res_y, footprint, time_start, time_end)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                artifact_id,
+                dataset_name,
+                Path(path).relative_to(settings.DATA_DIR).as_posix(),
+                row["crs"],
+                row["width"],
+                row["height"],
+                row["res_x"],
+                row["res_y"],
+                row["footprint"],
+                time_start,
+                time_end,
+            ),
+        )
+
+
+def index_artifacts(catalog: DataCatalog | None = None) -> int:
+    """
+    Indexes processed raster artifacts registered before the footprint table.
+
+    Only the latest registration of each path is indexed, and files that no
+    longer exist are skipped. Returns the number of rasters indexed.
+    """
+    catalog = catalog or get_catalog()
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        rows = con.execute(
+            """
+            SELECT a.id, a.dataset_name, a.relative_path
+            FROM artifacts a
+            WHERE a.stage = 'processed'
+              AND NOT EXISTS (
+                  SELECT 1 FROM raster_footprints f
+                  WHERE f.relative_path = a.relative_path
+              )
+            QUALIFY row_number() OVER (
+                PARTITION BY a.relative_path ORDER BY a.created_at DESC
+            ) = 1
+            """
+        ).fetchall()
+    indexed = 0
+    for artifact_id, dataset_name, rel in rows:
+        path = settings.DATA_DIR / rel
+        if path.suffix.lower() in RASTER_SUFFIXES and path.is_file():
+            register_footprint(artifact_id, dataset_name, path, catalog=catalog)
+            indexed += 1
+    log.info(f"Indexed the footprints of {indexed} rasters.")
+    return indexed
+
+
+class FootprintIndex:
+    """In-memory STRtree over the footprints of the catalog's rasters."""
+
+    def __init__(self, footprints: list[Footprint]):
+        self.footprints = footprints
+        self._tree = STRtree([f.geometry for f in footprints])
+
+    @classmethod
+    def load(
+        cls,
+        dataset_name: str | None = None,
+        catalog: DataCatalog | None = None,
+    ) -> "FootprintIndex":
+        """Builds the index from the catalog, keeping the latest row per path."""
+        catalog = catalog or get_catalog()
+        with catalog.get_connection() as con:
+            _init_tables(con)
+            rows = con.execute(
+                """
+                SELECT f.artifact_id, f.dataset_name, f.relative_path, f.crs,
+                       f.width, f.height, f.res_x, f.res_y, f.footprint,
+                       f.time_start, f.time_end
+                FROM raster_footprints f
+                JOIN artifacts a ON a.id = f.artifact_id
+                WHERE ? IS NULL OR f.dataset_name = ?
+                QUALIFY row_number() OVER (
+                    PARTITION BY f.relative_path ORDER BY a.created_at DESC
+                ) = 1
+                """,
+                (dataset_name, dataset_name),
+            ).fetchall()
+        return cls(
+            [
+                Footprint(
+                    str(r[0]), *r[1:8], wkt.loads(r[8]), time_start=r[9], time_end=r[10]
+                )
+                for r in rows
+            ]
+        )
+
+    def __len__(self) -> int:
+        return len(self.footprints)
+
+    def query(
+        self,
+        bbox: list[float],
+        start: date | None = None,
+        end: date | None = None,
+        dataset_name: str | None = None,
+    ) -> list[Footprint]:
+        """Returns the rasters intersecting a lon/lat bbox and date range."""
+        hits = self._tree.query(box(*bbox), predicate="intersects")
+        return [
+            f
+            for f in (self.footprints[i] for i in sorted(hits))
+            if dataset_name in (None, f.dataset_name) and f.overlaps_time(start, end)
+        ]
+
+    def covering(
+        self,
+        bbox: list[float],
+        start: date | None = None,
+        end: date | None = None,
+        dataset_name: str | None = None,
+    ) -> Footprint | None:
+        """
+        Returns an existing raster that alone covers the bbox and dates.
+
+        Footprints are allowed half a pixel of slack, since outputs are
+        snapped to the pixel grid. Among several candidates the finest
+        resolution wins.
+        """
+        area = box(*bbox)
+        candidates = [
+            f
+            for f in self.query(bbox, start, end, dataset_name)
+            if f.covers_time(start, end)
+            and f.geometry.buffer(f.tolerance).covers(area)
+            and f.path.is_file()
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda f: f.res_x * f.res_y)
+
+
+def find_rasters(
+    bbox: list[float],
+    start: date | None = None,
+    end: date | None = None,
+    dataset_name: str | None = None,
+    catalog: DataCatalog | None = None,
+) -> list[Path]:
+    """Returns the processed rasters a reader needs for a bbox and date range."""
+    index = FootprintIndex.load(dataset_name, catalog=catalog)
+    return [f.path for f in index.query(bbox, start, end, dataset_name)]
@@ -5,6 +5,8 @@ from typing import Literal
 
 Stage = Literal["raw", "processed", "models", "tmp"]
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
 
 def get_stage_dir(stage: Stage) -> Path:
     """Gets the base directory for a given stage."""
@@ -41,7 +43,8 @@ def calculate_sha256(filepath: Path) -> str:
 
     sha256_hash = hashlib.sha256()
     with open(filepath, "rb") as f:
-        # Read and update hash in chunks of 4K
-        for byte_block in iter(lambda: f.read(4096), b""):
+        # Read and update hash in chunks of 1 MiB; small reads dominate the
+        # runtime on multi-GB granules.
+        for byte_block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
@@ -0,0 +1,229 @@
+"""
+Hive-partitioned Parquet lake for tabular processed data.
+
+Tabular outputs live under `processed/<dataset>/<key>=<value>/.../*.parquet`
+(e.g. `processed/smap/year=2024/month=5/SMAP_2024125.parquet`), written with
+ZSTD compression and bounded row groups. The catalog only stores a
+`lake_<dataset>` view per dataset, so queries get partition pruning and
+parallel scans while `catalog.db` stays small.
+"""
+
+import os
+import re
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from .catalog import DataCatalog, get_catalog
+
+log = get_logger(__name__)
+
+PARQUET_COMPRESSION = "zstd"
+# DuckDB's native row group size: large enough for efficient scans, small
+# enough that a filtered read does not decompress whole files.
+ROW_GROUP_SIZE = 122_880
+VIEW_PREFIX = "lake_"
+_PARTITION_DIR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=")
+
+
+def partition_dir(dataset_dir: Path, **partitions) -> Path:
+    """
+    Returns (and creates) the hive-style partition directory for a dataset.
+
+    Example: `partition_dir(root / "smap", year=2024, month=5)` returns
+    `root/smap/year=2024/month=5`, the same layout DuckDB's `PARTITION_BY`
+    writes.
+    """
+    path = Path(dataset_dir)
+    for key, value in partitions.items():
+        path = path / f"{key}={value}"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write_parquet(df: pd.DataFrame, dst: Path) -> Path:
+    """Writes a DataFrame as a ZSTD-compressed Parquet file, atomically."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    with duckdb.connect(":memory:") as con:
+        con.register("df", df)
+        con.execute(
+            f"COPY (SELECT * FROM df) TO '{tmp}' (FORMAT PARQUET, "
+            f"COMPRESSION {PARQUET_COMPRESSION}, ROW_GROUP_SIZE {ROW_GROUP_SIZE})"
+        )
+    os.replace(tmp, dst)
+    return dst
+
+
+def lake_datasets(root: Path | None = None) -> dict[str, Path]:
+    """Finds the datasets under `root` that use a partitioned layout."""
+    root = Path(root or settings.DIR_PROCESSED)
+    if not root.is_dir():
+        return {}
+    return {
+        d.name: d
+        for d in sorted(root.iterdir())
+        if d.is_dir()
+        and any(p.is_dir() and _PARTITION_DIR.match(p.name) for p in d.iterdir())
+    }
+
+
+def _lake_glob(dataset_dir: Path) -> str | None:
+    """The Parquet files of a lake dataset, or None while it has none."""
+    if next(dataset_dir.glob("*=*/**/*.parquet"), None) is None:
+        return None  # DuckDB refuses to bind a view over an empty glob
+    return (dataset_dir / "*=*" / "**" / "*.parquet").as_posix()
+
+
+def create_views(
+    con: duckdb.DuckDBPyConnection,
+    root: Path | None = None,
+    datasets: list[str] | None = None,
+) -> list[str]:
+    """Creates or replaces a `lake_<dataset>` view for each lake dataset."""
+    created = []
+    for name, dataset_dir in lake_datasets(root).items():
+        if datasets is not None and name not in datasets:
+            continue
+        glob = _lake_glob(dataset_dir)
+        if glob is None:
+            continue
+        view = f"{VIEW_PREFIX}{name}"
+        con.execute(
+            f"CREATE OR REPLACE VIEW {view} AS SELECT * FROM read_parquet("
+            f"'{glob}', hive_partitioning = true, union_by_name = true)"
+        )
+        created.append(view)
+    return created
+
+
+def refresh_views(
+    catalog: DataCatalog | None = None, datasets: list[str] | None = None
+) -> list[str]:
+    """Maintains the lake views stored in the catalog."""
+    catalog = catalog or get_catalog()
+    with catalog.get_connection() as con:
+        views = create_views(con, datasets=datasets)
+    if views:
+        log.info(f"Refreshed lake views: {', '.join(views)}")
+    return views
+
+
+def _lake_rows(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    glob: str,
+    time_column: str | None = None,
+) -> str:
+    """
+    Selects the rows of a table already in the lake, with the table's columns.
+
+    With `time_column`, files older than the table's oldest row are skipped
+    through the Parquet statistics instead of being read.
+    """
+    described = con.execute(f"SELECT * FROM {table} LIMIT 0").description
+    columns = ", ".join(f'"{c[0]}"' for c in described)
+    # The partition columns are only in the paths, so the files alone have
+    # the table's own columns.
+    query = (
+        f"SELECT {columns} FROM read_parquet('{glob}', hive_partitioning = false, "
+        "union_by_name = true)"
+    )
+    if time_column:
+        query += f" WHERE {time_column} >= (SELECT min({time_column}) FROM {table})"
+    return query
+
+
+def export_table(
+    table: str,
+    time_column: str,
+    dataset: str | None = None,
+    delete: bool = False,
+    catalog: DataCatalog | None = None,
+) -> int:
+    """
+    Moves a catalog table into the lake, partitioned by year and month.
+
+    Only rows not in the lake yet are written, as new files, so repeated
+    exports neither rewrite partitions nor duplicate rows. The difference is
+    a multiset one (`EXCEPT ALL`): identical rows are exported as many times
+    as the catalog has more of them, and late rows older than the newest
+    exported one are not skipped. With `delete=True` the catalog rows, now
+    all in the lake, are removed in the same transaction, which keeps
+    `catalog.db` from growing without bound. Returns the number of rows
+    exported.
+    """
+    catalog = catalog or get_catalog()
+    dataset = dataset or table
+    dst = Path(settings.DIR_PROCESSED) / dataset
+    dst.mkdir(parents=True, exist_ok=True)
+
+    with catalog.get_connection() as con:
+        con.execute("BEGIN TRANSACTION")
+        new_rows = f"SELECT * FROM {table}"
+        glob = _lake_glob(dst)
+        if glob is not None:
+            lake_rows = _lake_rows(con, table, glob, time_column)
+            new_rows = f"({new_rows}) EXCEPT ALL ({lake_rows})"
+        rows = con.execute(
+            f"""
+            COPY (
+                SELECT *, year({time_column}) AS year, month({time_column}) AS month
+                FROM ({new_rows})
+            ) TO '{dst.as_posix()}' (
+                FORMAT PARQUET, PARTITION_BY (year, month), APPEND,
+                FILENAME_PATTERN '{table}_{{uuid}}',
+                COMPRESSION {PARQUET_COMPRESSION}, ROW_GROUP_SIZE {ROW_GROUP_SIZE}
+            )
+            """
+        ).fetchone()[0]
+        if delete:
+            con.execute(f"DELETE FROM {table}")
+        con.execute("COMMIT")
+        create_views(con, datasets=[dataset])
+        if delete:
+            con.execute("CHECKPOINT")
+
+    log.info(f"Exported {rows} rows of '{table}' to the lake at '{dst}'.")
+    return rows
+
+
+def include_exported(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    time_column: str | None = None,
+    dataset: str | None = None,
+    root: Path | None = None,
+) -> bool:
+    """
+    Makes `table` in a read connection also return its exported rows.
+
+    `export_table(delete=True)` moves rows out of the catalog, so code that
+    reads the table from `DataCatalog.read_connection` would silently lose
+    them. This replaces the table with a view over the lake files plus the
+    catalog rows not exported yet (`UNION ALL` after an `EXCEPT ALL`
+    anti-join), so rows exported without `delete` are returned once and
+    genuine duplicates are kept. `time_column` limits the anti-join to lake
+    files as recent as the catalog rows. Returns False when the table has
+    nothing in the lake.
+    """
+    glob = _lake_glob(Path(root or settings.DIR_PROCESSED) / (dataset or table))
+    if glob is None:
+        return False
+    # Snapshots are views; tables copied on a cold start are tables.
+    tables = {
+        r[0] for r in con.execute("SELECT table_name FROM duckdb_tables()").fetchall()
+    }
+    kind = "TABLE" if table in tables else "VIEW"
+    source = f"{table}_catalog"
+    con.execute(f"ALTER {kind} {table} RENAME TO {source}")
+    exported = _lake_rows(con, source, glob)
+    recent = _lake_rows(con, source, glob, time_column)
+    con.execute(
+        f"CREATE VIEW {table} AS {exported} UNION ALL BY NAME "
+        f"((SELECT * FROM {source}) EXCEPT ALL ({recent}))"
+    )
+    return True
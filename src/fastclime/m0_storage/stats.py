@@ -0,0 +1,157 @@
+"""
+Storage usage analytics for capacity planning.
+
+Byte/file counts per dataset and stage, monthly growth and duplicate ratios
+are computed from the `artifacts` table in a single aggregate query. Stages
+the catalog knows nothing about are measured with a parallel filesystem scan
+instead.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import get_args
+
+from fastclime.core.logging import get_logger
+from .catalog import DataCatalog, get_catalog
+from .io import Stage, get_stage_dir
+
+log = get_logger(__name__)
+
+SCAN_WORKERS = 8
+
+# Only the latest registration of each path counts; a file is a duplicate when
+# an earlier artifact already has the same content hash. GROUPING() tells the
+# grouping sets apart: bit 2 = dataset_name, bit 1 = stage, bit 0 = month.
+_USAGE_QUERY = """
+    WITH latest AS (
+        SELECT dataset_name, stage, relative_path, file_hash, file_size_bytes, created_at
+        FROM artifacts
+        QUALIFY row_number() OVER (
+            PARTITION BY relative_path ORDER BY created_at DESC
+        ) = 1
+    ),
+    flagged AS (
+        SELECT *,
+               row_number() OVER (
+                   PARTITION BY file_hash ORDER BY created_at, relative_path
+               ) > 1 AS is_duplicate,
+               strftime(date_trunc('month', created_at), '%Y-%m') AS month
+        FROM latest
+    )
+    SELECT GROUPING(dataset_name, stage, month) AS grouping_id,
+           dataset_name, stage, month,
+           count(*) AS files,
+           coalesce(sum(file_size_bytes), 0) AS bytes,
+           count(*) FILTER (WHERE is_duplicate) AS duplicate_files,
+           coalesce(sum(file_size_bytes) FILTER (WHERE is_duplicate), 0)
+               AS duplicate_bytes
+    FROM flagged
+    GROUP BY GROUPING SETS ((dataset_name, stage), (dataset_name), (stage), (month), ())
+"""
+
+# grouping_id values for each grouping set (1 = column aggregated away).
+_BY_DATASET_STAGE = 0b001
+_BY_DATASET = 0b011
+_BY_STAGE = 0b101
+_BY_MONTH = 0b110
+_TOTAL = 0b111
+
+
+def _usage(files: int, size: int, dup_files: int = 0, dup_bytes: int = 0) -> dict:
+    return {
+        "files": int(files),
+        "bytes": int(size),
+        "duplicate_files": int(dup_files),
+        "duplicate_bytes": int(dup_bytes),
+        "duplicate_ratio": round(dup_bytes / size, 4) if size else 0.0,
+    }
+
+
+def _scan_tree(path: Path) -> tuple[int, int]:
+    """Counts files and bytes below a directory."""
+    files = size = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files += 1
+                size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def scan_stage(stage: str, workers: int = SCAN_WORKERS) -> dict[str, dict]:
+    """Measures every dataset directory of a stage with a parallel scan."""
+    base = get_stage_dir(stage)
+    if not base.is_dir():
+        return {}
+    # Loose files directly under the stage directory are reported as "_root".
+    datasets = {p.name: p for p in base.iterdir() if p.is_dir()}
+    root_files = [p for p in base.iterdir() if p.is_file()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        counts = dict(zip(datasets, pool.map(_scan_tree, datasets.values())))
+    if root_files:
+        counts["_root"] = (len(root_files), sum(p.stat().st_size for p in root_files))
+    return {name: _usage(files, size) for name, (files, size) in counts.items()}
+
+
+def storage_stats(catalog: DataCatalog | None = None) -> dict:
+    """
+    Computes storage usage per dataset, stage and month.
+
+    Stages with no registered artifacts fall back to a filesystem scan and are
+    reported under `filesystem`.
+    """
+    catalog = catalog or get_catalog()
+    rows = []
+    con = catalog.read_connection(tables=("artifacts",))
+    with con:
+        has_artifacts = con.execute(
+            "SELECT count(*) FROM information_schema.tables "
+            "WHERE table_name = 'artifacts'"
+        ).fetchone()[0]
+        if has_artifacts:
+            rows = con.execute(_USAGE_QUERY).fetchall()
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "total": _usage(0, 0),
+        "by_dataset": {},
+        "by_stage": {},
+        "by_dataset_stage": [],
+        "growth": [],
+        "filesystem": {},
+    }
+    for grouping_id, dataset, stage, month, *usage in rows:
+        if grouping_id == _TOTAL:
+            report["total"] = _usage(*usage)
+        elif grouping_id == _BY_DATASET:
+            report["by_dataset"][dataset] = _usage(*usage)
+        elif grouping_id == _BY_STAGE:
+            report["by_stage"][stage] = _usage(*usage)
+        elif grouping_id == _BY_DATASET_STAGE:
+            report["by_dataset_stage"].append(
+                {"dataset": dataset, "stage": stage, **_usage(*usage)}
+            )
+        elif grouping_id == _BY_MONTH:
+            report["growth"].append({"month": month, **_usage(*usage)})
+
+    report["by_dataset_stage"].sort(key=lambda r: r["bytes"], reverse=True)
+    report["growth"].sort(key=lambda r: r["month"])
+    cumulative = 0
+    for entry in report["growth"]:
+        cumulative += entry["bytes"]
+        entry["cumulative_bytes"] = cumulative
+
+    for stage in get_args(Stage):
+        if stage not in report["by_stage"]:
+            log.debug(f"No catalog data for stage '{stage}', scanning filesystem.")
+            report["filesystem"][stage] = scan_stage(stage)
+    return report
@@ -0,0 +1,274 @@
+"""
+Delta synchronization between a remote data source and the local DATA_DIR.
+
+A remote exposes a manifest of (path, size, sha256) entries. Only entries that
+are missing from the catalog, or whose hash/size differ from the latest
+registered artifact, are transferred. Transfers run on a bounded thread pool
+and write to `.part` files first, so an interrupted sync resumes where it
+stopped instead of starting over.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, NamedTuple, get_args
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from .catalog import DataCatalog, get_catalog
+from .io import HASH_CHUNK_SIZE, Stage, calculate_sha256
+
+log = get_logger(__name__)
+
+MANIFEST_NAME = "fastclime_manifest.json"
+PART_SUFFIX = ".part"
+DEFAULT_WORKERS = 8
+# Number of completed transfers registered per catalog transaction.
+REGISTER_BATCH_SIZE = 256
+# Files that describe the local store itself and are never synced.
+_EXCLUDED_NAMES = {MANIFEST_NAME, "catalog.db", "catalog.db.wal"}
+
+
+class ManifestEntry(NamedTuple):
+    """A single file listed in a remote manifest."""
+
+    path: str  # POSIX path relative to the data root, e.g. 'raw/smap/x.h5'
+    size: int
+    sha256: str
+
+
+def build_manifest(root: Path, workers: int = DEFAULT_WORKERS) -> list[ManifestEntry]:
+    """Scans a directory and hashes every file in parallel."""
+    root = Path(root)
+    files = [
+        p
+        for p in root.rglob("*")
+        if p.is_file()
+        and p.name not in _EXCLUDED_NAMES
+        and not p.name.endswith(PART_SUFFIX)
+    ]
+    log.info(f"Hashing {len(files)} files under '{root}' with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(calculate_sha256, files))
+    return [
+        ManifestEntry(p.relative_to(root).as_posix(), p.stat().st_size, h)
+        for p, h in zip(files, hashes)
+    ]
+
+
+def write_manifest(root: Path, workers: int = DEFAULT_WORKERS) -> Path:
+    """Builds the manifest for `root` and stores it next to the data."""
+    entries = build_manifest(root, workers=workers)
+    manifest_path = Path(root) / MANIFEST_NAME
+    manifest_path.write_text(
+        json.dumps({"files": [e._asdict() for e in entries]}, indent=2)
+    )
+    log.info(f"Wrote manifest with {len(entries)} entries to '{manifest_path}'.")
+    return manifest_path
+
+
+class LocalRemote:
+    """A remote backed by a directory on a local or mounted filesystem."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"Remote directory not found at {self.root}")
+
+    def manifest(self, workers: int = DEFAULT_WORKERS) -> list[ManifestEntry]:
+        """
+        Returns the remote manifest.
+
+        A published `fastclime_manifest.json` is used when present; otherwise the
+        directory is scanned and hashed.
+        """
+        manifest_path = self.root / MANIFEST_NAME
+        if manifest_path.is_file():
+            data = json.loads(manifest_path.read_text())
+            return [ManifestEntry(**e) for e in data["files"]]
+        log.warning(f"No manifest found at '{manifest_path}', hashing remote files.")
+        return build_manifest(self.root, workers=workers)
+
+    def open(self, path: str, offset: int = 0) -> BinaryIO:
+        """Opens a remote file for reading, starting at `offset` bytes."""
+        f = open(self.root / path, "rb")
+        f.seek(offset)
+        return f
+
+
+def open_remote(uri: str) -> LocalRemote:
+    """Returns the remote implementation for a URI."""
+    if uri.startswith("file://"):
+        return LocalRemote(Path(uri[len("file://") :]))
+    if "://" not in uri:
+        return LocalRemote(Path(uri))
+    scheme = uri.split("://", 1)[0]
+    raise ValueError(
+        f"Unsupported remote scheme '{scheme}'. Use a local path or a file:// URI."
+    )
+
+
+def _classify(path: str) -> tuple[str, str]:
+    """Derives (dataset_name, stage) from a `<stage>/<dataset>/...` path."""
+    parts = PurePosixPath(path).parts
+    if parts[0] in get_args(Stage) and len(parts) > 2:
+        return parts[1], parts[0]
+    if parts[0] in get_args(Stage):
+        return parts[0], parts[0]
+    return parts[0] if len(parts) > 1 else "default", "raw"
+
+
+def _local_path(data_dir: Path, path: str) -> Path:
+    """
+    Resolves where a manifest entry is stored, refusing paths that would land
+    outside of the data directory (absolute, `..` or through a symlink).
+    """
+    root = data_dir.resolve()
+    target = (root / path).resolve()
+    if root not in target.parents:
+        raise ValueError(
+            f"Manifest path '{path}' is outside of the data directory '{root}'."
+        )
+    return target
+
+
+def _is_current(entry: ManifestEntry, local: Path, index: dict) -> bool:
+    """True if the catalog and the local file already match the manifest entry."""
+    if index.get(entry.path) != (entry.sha256, entry.size):
+        return False
+    return local.is_file() and local.stat().st_size == entry.size
+
+
+def _transfer(remote: LocalRemote, entry: ManifestEntry, dst: Path) -> int:
+    """
+    Copies one file from the remote, resuming from a previous `.part` file.
+
+    The hash is updated as bytes arrive, so verification needs no second read
+    of the finished file. Returns the number of bytes transferred.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+
+    # A file already on disk (e.g. registered by an earlier, interrupted run)
+    # only needs to be verified, not copied.
+    if dst.is_file() and dst.stat().st_size == entry.size:
+        if calculate_sha256(dst) == entry.sha256:
+            return 0
+
+    part = dst.with_name(dst.name + PART_SUFFIX)
+    offset = part.stat().st_size if part.exists() else 0
+    if offset > entry.size:
+        offset = 0
+
+    sha = hashlib.sha256()
+    if offset:
+        log.info(f"Resuming '{entry.path}' at byte {offset}/{entry.size}.")
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha.update(block)
+
+    transferred = 0
+    with (
+        remote.open(entry.path, offset) as src,
+        open(part, "ab" if offset else "wb") as f,
+    ):
+        for block in iter(lambda: src.read(HASH_CHUNK_SIZE), b""):
+            f.write(block)
+            sha.update(block)
+            transferred += len(block)
+
+    if sha.hexdigest() != entry.sha256:
+        part.unlink()
+        raise ValueError(
+            f"SHA mismatch for {entry.path}. Expected {entry.sha256}, got {sha.hexdigest()}"
+        )
+    os.replace(part, dst)
+    return transferred
+
+
+def sync(
+    remote_uri: str,
+    workers: int = DEFAULT_WORKERS,
+    dry_run: bool = False,
+    catalog: DataCatalog | None = None,
+    data_dir: Path | None = None,
+) -> dict:
+    """
+    Synchronizes a remote into the local data directory.
+
+    Only files missing from the catalog or changed since their last
+    registration are transferred; everything transferred is registered as an
+    artifact. Returns a summary of the run. A manifest listing any path
+    outside of the data directory is rejected before anything is transferred.
+    """
+    catalog = catalog or get_catalog()
+    data_dir = Path(data_dir or settings.DATA_DIR)
+    remote = open_remote(remote_uri)
+
+    entries = remote.manifest(workers=workers)
+    targets = {e.path: _local_path(data_dir, e.path) for e in entries}
+    index = catalog.get_artifact_index()
+    pending = [e for e in entries if not _is_current(e, targets[e.path], index)]
+    log.info(
+        f"Remote '{remote_uri}' lists {len(entries)} files; "
+        f"{len(pending)} missing or changed."
+    )
+
+    stats = {
+        "remote": remote_uri,
+        "files_total": len(entries),
+        "files_skipped": len(entries) - len(pending),
+        "files_pending": len(pending),
+        "files_transferred": 0,
+        "bytes_transferred": 0,
+        "failed": [],
+    }
+    if dry_run or not pending:
+        return stats
+
+    datasets = {_classify(e.path)[0] for e in pending}
+    for name in sorted(datasets):
+        catalog.register_dataset(
+            name=name,
+            source=remote_uri,
+            version="sync",
+            description=f"Synced from {remote_uri}",
+        )
+
+    batch = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_transfer, remote, e, targets[e.path]): e for e in pending
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                stats["bytes_transferred"] += future.result()
+            except (OSError, ValueError) as e:
+                log.error(f"Failed to sync '{entry.path}': {e}")
+                stats["failed"].append(entry.path)
+                continue
+
+            dataset_name, stage = _classify(entry.path)
+            batch.append(
+                {
+                    "dataset_name": dataset_name,
+                    "stage": stage,
+                    "relative_path": entry.path,
+                    "file_hash": entry.sha256,
+                    "file_size_bytes": entry.size,
+                }
+            )
+            stats["files_transferred"] += 1
+            if len(batch) >= REGISTER_BATCH_SIZE:
+                catalog.register_artifacts(batch)
+                batch = []
+    catalog.register_artifacts(batch)
+
+    log.info(
+        f"Sync complete: {stats['files_transferred']} files, "
+        f"{stats['bytes_transferred']} bytes transferred, "
+        f"{len(stats['failed'])} failed."
+    )
+    return stats
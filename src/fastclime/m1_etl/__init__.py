@@ -1,7 +1,6 @@
 """Public API for M1 – ETL-Ingest."""
 
 from .datasets import DATASETS
-from .orchestrator import ingest
 
 
 def list_datasets() -> dict[str, str]:
@@ -9,6 +8,15 @@ def list_datasets() -> dict[str, str]:
     return {name: spec["desc"] for name, spec in DATASETS.items()}
 
 
+def __getattr__(name: str):
+    # The orchestrator pulls in the raster stack; import it on first use.
+    if name == "ingest":
+        from .orchestrator import ingest
+
+        return ingest
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     "DATASETS",
     "ingest",
@@ -1,12 +1,15 @@
 import typer
+from datetime import datetime
 from typing_extensions import Annotated
 import json
+from pathlib import Path
 
 from fastclime.core.logging import get_logger
-from .orchestrator import ingest
 from .datasets import DATASETS
 
 log = get_logger(__name__)
+# Commands import the ETL modules they run when invoked, so listing datasets
+# and printing help don't load rasterio, geopandas or h5py.
 app = typer.Typer(
     help="ETL pipelines for ingesting and cleaning geospatial data.",
     add_completion=False,
@@ -54,9 +57,34 @@ def run(
         ),
     ] = False,
     day_of_year: Annotated[int, typer.Option(help="Day of year (1-366).")] = None,
+    use_cache: Annotated[
+        bool,
+        typer.Option(
+            "--cache/--no-cache",
+            help="Reuse raw files from the persistent download cache.",
+        ),
+    ] = True,
+    remote: Annotated[
+        bool,
+        typer.Option(
+            "--remote/--no-remote",
+            help="Read COG sources in place over HTTP instead of downloading "
+            "them (DEM). Defaults to FASTCLIME_DEM_REMOTE_READ.",
+        ),
+    ] = None,
+    terrain: Annotated[
+        bool,
+        typer.Option(
+            "--terrain/--no-terrain",
+            help="Derive slope, aspect and pressure layers from the DEM. "
+            "Defaults to FASTCLIME_DEM_TERRAIN.",
+        ),
+    ] = None,
 ):
     """Run an ETL pipeline for a specific dataset."""
     log.info(f"Received request to run ETL for '{dataset}' for year {year}.")
+    from .orchestrator import ingest
+
     try:
         stats = ingest(
             dataset_name=dataset,
@@ -64,6 +92,9 @@ def run(
             bbox=bbox,
             overwrite=overwrite,
             day_of_year=day_of_year,
+            use_cache=use_cache,
+            terrain=terrain,
+            remote=remote,
         )
         log.info(f"Ingestion successful for dataset '{dataset}'.")
         print("\n--- Ingestion Report ---")
@@ -73,3 +104,154 @@ def run(
     except Exception as e:
         log.error(f"ETL pipeline for '{dataset}' failed: {e}", exc_info=True)
         raise typer.Exit(code=1)
+
+
+@app.command()
+def backfill(
+    dataset: Annotated[
+        str,
+        typer.Argument(help="Alias of the dataset to ingest (e.g., 'smap', 'ndvi')."),
+    ],
+    start: Annotated[
+        datetime,
+        typer.Option(formats=["%Y-%m-%d"], help="First date of the range."),
+    ],
+    end: Annotated[
+        datetime,
+        typer.Option(formats=["%Y-%m-%d"], help="Last date of the range (inclusive)."),
+    ],
+    bbox: Annotated[
+        str,
+        typer.Option(
+            "--bbox",
+            help='Bounding box in "min_lon min_lat max_lon max_lat" format.',
+            callback=lambda value: [float(v) for v in value.split()] if value else None,
+        ),
+    ] = None,
+    cadence: Annotated[
+        int,
+        typer.Option(help="Days between jobs. Defaults to the dataset's cadence."),
+    ] = None,
+    workers: Annotated[int, typer.Option(help="Number of worker processes.")] = None,
+    overwrite: Annotated[
+        bool,
+        typer.Option("--overwrite", help="Re-run jobs that already completed."),
+    ] = False,
+    terrain: Annotated[
+        bool,
+        typer.Option(
+            "--terrain/--no-terrain",
+            help="Derive slope, aspect and pressure layers from the DEM. "
+            "Defaults to FASTCLIME_DEM_TERRAIN.",
+        ),
+    ] = None,
+):
+    """Ingest every job of a date range in parallel, resuming previous runs."""
+    from .orchestrator import backfill as run_backfill
+
+    stats = run_backfill(
+        dataset_name=dataset,
+        start=start.date(),
+        end=end.date(),
+        bbox=bbox,
+        cadence_days=cadence,
+        workers=workers,
+        overwrite=overwrite,
+        terrain=terrain,
+    )
+    print(json.dumps(stats, indent=2))
+    if stats["failed"]:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def zonal(
+    raster: Annotated[Path, typer.Argument(help="Processed NDVI raster (COG).")],
+    date: Annotated[
+        datetime,
+        typer.Option(formats=["%Y-%m-%d"], help="Date of the raster."),
+    ],
+    parcels: Annotated[
+        Path,
+        typer.Option(help="Parcel polygons. Defaults to FASTCLIME_PARCELS_PATH."),
+    ] = None,
+):
+    """Write per-parcel NDVI statistics of a raster to `plant_ndvi_daily`."""
+    from .zonal import update_ndvi
+
+    rows = update_ndvi(raster, date.date(), parcels_path=parcels)
+    print(f"Wrote NDVI statistics for {rows} parcels.")
+
+
+@app.command()
+def terrain(
+    dem: Annotated[Path, typer.Argument(help="Processed DEM raster (COG).")],
+    tile_size: Annotated[
+        int,
+        typer.Option(
+            help="Tile size in pixels processed per worker task "
+            "(default: terrain.TILE_SIZE)."
+        ),
+    ] = None,
+    workers: Annotated[int, typer.Option(help="Number of worker processes.")] = None,
+    register: Annotated[
+        bool,
+        typer.Option(
+            "--register/--no-register",
+            help="Register the layers as dem_<layer> artifacts in the catalog.",
+        ),
+    ] = True,
+):
+    """Derive slope, aspect and atmospheric pressure COGs from a DEM."""
+    from . import terrain as dem_terrain
+
+    outputs = dem_terrain.derive(
+        dem, tile_size=tile_size or dem_terrain.TILE_SIZE, workers=workers
+    )
+    if register:
+        dem_terrain.register(outputs, version=dem.parent.name)
+    for name, path in outputs.items():
+        print(f"{name}: {path}")
+
+
+@app.command()
+def stats(
+    dataset: Annotated[
+        str, typer.Option(help="Only report runs of this dataset.")
+    ] = None,
+    limit: Annotated[
+        int, typer.Option(help="Number of recent runs to summarize per dataset.")
+    ] = 20,
+    as_json: Annotated[
+        bool, typer.Option("--json", help="Print the full report as JSON.")
+    ] = False,
+):
+    """Reports recent ETL runs and where their time and memory went, per stage."""
+    from .telemetry import run_stats
+
+    report = run_stats(dataset, limit=limit)
+    if as_json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+
+    print("FastClime ETL Runs")
+    print("==================")
+    if not report["runs"]:
+        print("No runs recorded.")
+        return
+    for row in report["runs"]:
+        print(
+            f"  - {row['started_at'][:19]} {row['dataset_name']} [{row['status']}] "
+            f"{row['seconds']:.1f} s, peak RSS {row['peak_rss_mb']:.0f} MiB "
+            f"({row['params']})"
+        )
+    print("\nBy stage (median / p90 seconds):")
+    for row in report["stages"]:
+        throughput = row["median_mb_per_s"]
+        rate = f", {throughput:.1f} MB/s" if throughput is not None else ""
+        print(
+            f"  - {row['dataset_name']}/{row['stage']}: {row['median_s']:.2f} / "
+            f"{row['p90_s']:.2f} s over {row['runs']} runs, "
+            f"{row['bytes'] / 1024**2:.1f} MiB{rate}, "
+            f"peak RSS {row['peak_rss_mb']:.0f} MiB"
+        )
@@ -0,0 +1,191 @@
+"""
+Paginated, cached client for the NASA CMR granule search.
+
+Queries are split into calendar-month windows. Each window is paged through
+with the `CMR-Search-After` header, windows are fetched concurrently, and
+every window response is cached on disk under `tmp/cmr/`. A backfill over
+hundreds of days therefore costs one search per month instead of one per
+day, and an expired cache entry is still used when CMR can't be reached.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import requests
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+
+log = get_logger(__name__)
+
+CMR_URL = "https://cmr.earthdata.nasa.gov/search/granules.json"
+PAGE_SIZE = 2000  # Largest page CMR serves
+SEARCH_AFTER_HEADER = "CMR-Search-After"
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def month_windows(start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+    """Returns the calendar months overlapping [start, end] as (first, last) pairs."""
+    windows = []
+    first = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while first <= end:
+        if first.month == 12:
+            following = first.replace(year=first.year + 1, month=1)
+        else:
+            following = first.replace(month=first.month + 1)
+        windows.append((first, following - timedelta(seconds=1)))
+        first = following
+    return windows
+
+
+def _data_url(entry: dict) -> str | None:
+    """Picks the HTTPS download link of a granule entry."""
+    for link in entry.get("links", []):
+        if link.get("rel", "").endswith("#data") and "https" in link.get("href", ""):
+            return link["href"]
+    return None
+
+
+class CMRClient:
+    """
+    Searches CMR granules with pagination and an on-disk response cache.
+
+    A session created by the client is closed by `close()` or on leaving a
+    `with` block; a session passed in is left to its owner.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        cache_dir: Path | None = None,
+        ttl_hours: float | None = None,
+        workers: int | None = None,
+        url: str = CMR_URL,
+    ):
+        self._owns_session = session is None
+        self.session = session or requests.Session()
+        self.cache_dir = Path(cache_dir or settings.DIR_TMP / "cmr")
+        self.ttl_s = (
+            settings.CMR_CACHE_TTL_H if ttl_hours is None else ttl_hours
+        ) * 3600
+        self.workers = workers or settings.DOWNLOAD_MAX_PER_HOST
+        self.url = url
+
+    def __enter__(self) -> "CMRClient":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._owns_session:
+            self.session.close()
+
+    def _cache_path(self, params: dict) -> Path:
+        key = hashlib.sha256(
+            json.dumps({"url": self.url, **params}, sort_keys=True).encode()
+        ).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def _fetch_pages(self, params: dict) -> list[dict]:
+        """Follows `CMR-Search-After` until every page of a query is read."""
+        granules = []
+        headers = {}
+        while True:
+            response = self.session.get(
+                self.url,
+                params={**params, "page_size": PAGE_SIZE},
+                headers=headers,
+                timeout=60,
+            )
+            response.raise_for_status()
+            entries = response.json().get("feed", {}).get("entry", [])
+            granules.extend(
+                {
+                    "id": e.get("id"),
+                    "time_start": e.get("time_start"),
+                    "time_end": e.get("time_end"),
+                    "url": _data_url(e),
+                }
+                for e in entries
+            )
+            search_after = response.headers.get(SEARCH_AFTER_HEADER)
+            if not search_after or len(entries) < PAGE_SIZE:
+                return granules
+            headers = {SEARCH_AFTER_HEADER: search_after}
+
+    def _query(self, params: dict) -> list[dict]:
+        """Runs one query, served from the cache while it is fresh."""
+        path = self._cache_path(params)
+        cached = json.loads(path.read_text()) if path.is_file() else None
+        if cached and time.time() - cached["fetched_at"] < self.ttl_s:
+            log.debug(f"CMR cache hit for {params}")
+            return cached["granules"]
+
+        try:
+            granules = self._fetch_pages(params)
+        except requests.exceptions.RequestException as e:
+            if cached is None:
+                raise
+            log.warning(f"CMR unreachable ({e}); using cached response for {params}")
+            return cached["granules"]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(
+            json.dumps(
+                {"params": params, "fetched_at": time.time(), "granules": granules}
+            )
+        )
+        os.replace(tmp, path)
+        return granules
+
+    def search(
+        self,
+        short_name: str,
+        version: str,
+        temporal_range: tuple[str, str],
+        bbox: list[float],
+    ) -> list[dict]:
+        """
+        Returns the granules intersecting `temporal_range` and `bbox`.
+
+        Each granule is a dict with `id`, `time_start`, `time_end` and the
+        HTTPS download `url`, sorted by start time.
+        """
+        start, end = map(_parse_time, temporal_range)
+        queries = [
+            {
+                "short_name": short_name,
+                "version": version,
+                "temporal": f"{first:%Y-%m-%dT%H:%M:%SZ},{last:%Y-%m-%dT%H:%M:%SZ}",
+                "bounding_box": ",".join(map(str, bbox)),
+                "sort_key": "start_date",
+            }
+            for first, last in month_windows(start, end)
+        ]
+        log.info(
+            f"Searching CMR for {short_name} v{version} in {len(queries)} window(s)."
+        )
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            windows = list(pool.map(self._query, queries))
+
+        granules = {}
+        for granule in (g for window in windows for g in window):
+            # Windows are whole months; keep only granules overlapping the request.
+            if granule["time_start"] and granule["time_end"]:
+                if (
+                    _parse_time(granule["time_end"]) < start
+                    or _parse_time(granule["time_start"]) > end
+                ):
+                    continue
+            granules.setdefault(granule["id"] or granule["url"], granule)
+        return sorted(granules.values(), key=lambda g: g["time_start"] or "")
@@ -0,0 +1,294 @@
+"""
+Append-only time cube for daily gridded variables such as SMAP soil moisture.
+
+A cube is a directory holding a dense `time x row x col` array split into
+chunks of `TIME_CHUNK` days by `SPACE_CHUNK` x `SPACE_CHUNK` cells, one
+`.npy` file per chunk (a Zarr-like layout that needs nothing but numpy):
+
+    <root>/meta.json        grid shape, chunk sizes, dtype, time origin
+    <root>/lat.npy          latitude of each grid row (EASE-Grid 2.0 rows
+    <root>/lon.npy          and columns have a constant lat/lon)
+    <root>/dates.log        one ISO date per appended day
+    <root>/c<t>.<r>.<c>.npy chunk arrays
+
+Chunks are stored as `(row, col, time)` so the history of one cell is a
+contiguous run of bytes: reading a pixel's series is one read per time chunk
+instead of one file per day. Days are written in place through a memory
+map, so appending touches only the chunks inside the day's extent, and
+chunks are created atomically, so several worker processes can append
+different days at once.
+"""
+
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from fastclime.core.logging import get_logger
+
+log = get_logger(__name__)
+
+TIME_CHUNK = 365
+SPACE_CHUNK = 16
+# Day 0 of the time axis; SMAP science data starts on 2015-03-31.
+TIME_ORIGIN = date(2015, 1, 1)
+
+
+def _create_exclusive(path: Path, write) -> bool:
+    """
+    Creates `path` from a temporary file written by `write(tmp)`, unless it
+    already exists. Returns whether this call created it.
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    write(tmp)
+    try:
+        os.link(tmp, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        tmp.unlink()
+
+
+def _nan_array(shape: tuple[int, ...], dtype: str):
+    def write(tmp: Path):
+        array = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        array[:] = np.nan
+        array.flush()
+        del array
+
+    return write
+
+
+def _chunk_ranges(start: int, stop: int, size: int):
+    """Yields (chunk index, start, stop) of the chunks covering [start, stop)."""
+    for index in range(start // size, (stop - 1) // size + 1 if stop > start else 0):
+        yield index, max(start, index * size), min(stop, (index + 1) * size)
+
+
+class TimeCube:
+    """A chunked `time x row x col` array on local disk."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        meta = json.loads((self.root / "meta.json").read_text())
+        self.shape = tuple(meta["grid_shape"])
+        self.time_chunk, self.space_chunk = meta["time_chunk"], meta["space_chunk"]
+        self.dtype = meta["dtype"]
+        self.origin = date.fromisoformat(meta["time_origin"])
+
+    @classmethod
+    def open(
+        cls,
+        root: Path,
+        grid_shape: tuple[int, int] | None = None,
+        dtype: str = "float32",
+        time_chunk: int = TIME_CHUNK,
+        space_chunk: int = SPACE_CHUNK,
+    ) -> "TimeCube":
+        """Opens a cube, creating it first if `grid_shape` is given."""
+        root = Path(root)
+        if grid_shape is not None and not (root / "meta.json").is_file():
+            root.mkdir(parents=True, exist_ok=True)
+            rows, cols = grid_shape
+            _create_exclusive(root / "lat.npy", _nan_array((rows,), "float64"))
+            _create_exclusive(root / "lon.npy", _nan_array((cols,), "float64"))
+            meta = {
+                "grid_shape": [rows, cols],
+                "time_chunk": time_chunk,
+                "space_chunk": space_chunk,
+                "dtype": dtype,
+                "time_origin": TIME_ORIGIN.isoformat(),
+            }
+            _create_exclusive(
+                root / "meta.json", lambda tmp: tmp.write_text(json.dumps(meta))
+            )
+        cube = cls(root)
+        if grid_shape is not None and cube.shape != tuple(grid_shape):
+            raise ValueError(
+                f"Cube '{root}' has grid {cube.shape}, not {tuple(grid_shape)}."
+            )
+        return cube
+
+    def _time_index(self, day: date) -> int:
+        index = (day - self.origin).days
+        if index < 0:
+            raise ValueError(f"{day} is before the cube's origin {self.origin}.")
+        return index
+
+    def _chunk_path(self, t: int, r: int, c: int) -> Path:
+        return self.root / f"c{t}.{r}.{c}.npy"
+
+    def _chunk(self, t: int, r: int, c: int, create: bool = False):
+        """Memory-maps a chunk (read-write if `create`), or None if it's missing."""
+        path = self._chunk_path(t, r, c)
+        if create and not path.is_file():
+            shape = (self.space_chunk, self.space_chunk, self.time_chunk)
+            _create_exclusive(path, _nan_array(shape, self.dtype))
+        if not path.is_file():
+            return None
+        return np.load(path, mmap_mode="r+" if create else "r")
+
+    def dates(self) -> list[date]:
+        """Days appended so far, sorted."""
+        log_path = self.root / "dates.log"
+        if not log_path.is_file():
+            return []
+        return sorted({date.fromisoformat(d) for d in log_path.read_text().split()})
+
+    def append(
+        self,
+        day: date,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        values: np.ndarray,
+        lats: np.ndarray | None = None,
+        lons: np.ndarray | None = None,
+    ) -> int:
+        """
+        Writes one day of scattered grid cells; returns the number written.
+
+        Cells not given keep their fill (NaN). Re-appending a day overwrites
+        the cells it provides.
+        """
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=self.dtype)
+        t_index = self._time_index(day)
+        t_chunk, t = divmod(t_index, self.time_chunk)
+
+        chunk_r, local_r = np.divmod(rows, self.space_chunk)
+        chunk_c, local_c = np.divmod(cols, self.space_chunk)
+        keys = chunk_r * (self.shape[1] // self.space_chunk + 1) + chunk_c
+        order = np.argsort(keys, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(keys[order]) != 0])
+        for group in np.split(order, starts[1:]):
+            if not group.size:
+                continue
+            chunk = self._chunk(t_chunk, chunk_r[group[0]], chunk_c[group[0]], True)
+            chunk[local_r[group], local_c[group], t] = values[group]
+            chunk.flush()
+            del chunk
+
+        if lats is not None and lons is not None:
+            for name, index, coords in (("lat", rows, lats), ("lon", cols, lons)):
+                axis = np.load(self.root / f"{name}.npy", mmap_mode="r+")
+                axis[index] = coords
+                axis.flush()
+                del axis
+        with open(self.root / "dates.log", "a") as f:
+            f.write(f"{day.isoformat()}\n")
+        return len(values)
+
+    def read(
+        self,
+        rows: slice,
+        cols: slice,
+        start: date,
+        end: date,
+    ) -> np.ndarray:
+        """Reads a `time x row x col` block for the days [start, end]."""
+        t0, t1 = self._time_index(start), self._time_index(end) + 1
+        r0, r1, _ = rows.indices(self.shape[0])
+        c0, c1, _ = cols.indices(self.shape[1])
+        out = np.full((t1 - t0, r1 - r0, c1 - c0), np.nan, dtype=self.dtype)
+        for tc, ta, tb in _chunk_ranges(t0, t1, self.time_chunk):
+            for rc, ra, rb in _chunk_ranges(r0, r1, self.space_chunk):
+                for cc, ca, cb in _chunk_ranges(c0, c1, self.space_chunk):
+                    chunk = self._chunk(tc, rc, cc)
+                    if chunk is None:
+                        continue
+                    block = chunk[
+                        ra - rc * self.space_chunk : rb - rc * self.space_chunk,
+                        ca - cc * self.space_chunk : cb - cc * self.space_chunk,
+                        ta - tc * self.time_chunk : tb - tc * self.time_chunk,
+                    ]
+                    out[ta - t0 : tb - t0, ra - r0 : rb - r0, ca - c0 : cb - c0] = (
+                        np.moveaxis(block, -1, 0)
+                    )
+        return out
+
+    def locate(self, lats, lons) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the row/col of the written cells nearest to lat/lon points."""
+        found = []
+        for name, points in (("lat", lats), ("lon", lons)):
+            axis = np.load(self.root / f"{name}.npy")
+            known = np.flatnonzero(np.isfinite(axis))
+            if not known.size:
+                raise ValueError(f"Cube '{self.root}' is empty.")
+            nearest = np.abs(axis[known][None, :] - np.asarray(points)[:, None])
+            found.append(known[nearest.argmin(axis=1)])
+        return found[0], found[1]
+
+    def history(
+        self, rows: np.ndarray, cols: np.ndarray, start: date, end: date
+    ) -> np.ndarray:
+        """
+        Returns the `cell x time` series of the given cells for [start, end].
+
+        Each cell's series is a contiguous slice of its chunk files, so the
+        cost is one small read per cell and time chunk.
+        """
+        t0, t1 = self._time_index(start), self._time_index(end) + 1
+        out = np.full((len(rows), t1 - t0), np.nan, dtype=self.dtype)
+        for tc, ta, tb in _chunk_ranges(t0, t1, self.time_chunk):
+            chunks = {}
+            for i, (row, col) in enumerate(zip(rows, cols)):
+                key = (row // self.space_chunk, col // self.space_chunk)
+                if key not in chunks:
+                    chunks[key] = self._chunk(tc, *key)
+                if chunks[key] is None:
+                    continue
+                out[i, ta - t0 : tb - t0] = chunks[key][
+                    row % self.space_chunk,
+                    col % self.space_chunk,
+                    ta - tc * self.time_chunk : tb - tc * self.time_chunk,
+                ]
+        return out
+
+    def to_xarray(
+        self,
+        bbox: list[float] | None = None,
+        start: date | None = None,
+        end: date | None = None,
+        name: str = "value",
+    ) -> xr.DataArray:
+        """
+        Loads the cube (or a bbox/date subset) as a `time x row x col` array
+        with `lat`/`lon` coordinates. Rows and columns that were never written
+        are left out; dates default to the appended range.
+        """
+        days = self.dates()
+        if not days:
+            raise ValueError(f"Cube '{self.root}' is empty.")
+        start, end = start or days[0], end or days[-1]
+        lat = np.load(self.root / "lat.npy")
+        lon = np.load(self.root / "lon.npy")
+        row_ok, col_ok = np.isfinite(lat), np.isfinite(lon)
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            row_ok &= (lat >= min_lat) & (lat <= max_lat)
+            col_ok &= (lon >= min_lon) & (lon <= max_lon)
+        row_idx, col_idx = np.flatnonzero(row_ok), np.flatnonzero(col_ok)
+        if not row_idx.size or not col_idx.size:
+            rows = cols = slice(0, 0)
+        else:
+            rows = slice(row_idx[0], row_idx[-1] + 1)
+            cols = slice(col_idx[0], col_idx[-1] + 1)
+
+        data = self.read(rows, cols, start, end)
+        time = [start + timedelta(days=i) for i in range(data.shape[0])]
+        return xr.DataArray(
+            data,
+            dims=("time", "row", "col"),
+            coords={
+                "time": np.array(time, dtype="datetime64[D]"),
+                "row": np.arange(rows.start, rows.stop),
+                "col": np.arange(cols.start, cols.stop),
+                "lat": ("row", lat[rows]),
+                "lon": ("col", lon[cols]),
+            },
+            name=name,
+        )
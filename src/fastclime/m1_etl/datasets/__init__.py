@@ -1,16 +1,166 @@
-from . import dem, smap, ndvi
+"""
+Registry of the datasets `fastclime ingest` can run.
 
-DATASETS = {
-    "dem": {"download": dem.download, "process": dem.process, "desc": dem.DESCRIPTION},
+Specs are plain metadata; their hooks are `"module:attribute"` references
+imported only when a dataset runs, so listing datasets doesn't load
+rasterio, h5py or geopandas. Other packages add datasets through the
+`fastclime.datasets` entry point group, each naming a spec of the same form:
+
+    [project.entry-points."fastclime.datasets"]
+    era5 = "fastclime_era5.manifest:SPEC"
+
+Plugin names are discovered from package metadata without importing them;
+a plugin's spec is loaded when it is first looked up or listed, so the
+module holding it should import nothing heavy.
+"""
+
+import importlib
+from collections.abc import Mapping, MutableMapping
+from importlib.metadata import entry_points
+
+from fastclime.core.logging import get_logger
+
+log = get_logger(__name__)
+
+ENTRY_POINT_GROUP = "fastclime.datasets"
+# Spec keys holding callables, given as objects or "module:attribute" strings.
+HOOKS = ("download", "process", "plan", "process_file", "finalize", "zonal", "terrain")
+# Every spec needs a description and the sequential download/process hooks.
+REQUIRED = ("desc", "download", "process")
+
+# `cadence_days` is the spacing of backfill jobs; None means one job per year.
+# Datasets with `plan`/`process_file`/`finalize` hooks are ingested as a
+# pipeline that processes each file as soon as it is downloaded. `zonal`
+# summarizes each processed raster per parcel when FASTCLIME_PARCELS_PATH is set;
+# `terrain` derives slope/aspect/pressure layers when FASTCLIME_DEM_TERRAIN is set
+# or the ingest is run with `--terrain`.
+# `cog_profile` names the encoding of raster outputs (see `utils.COG_PROFILES`).
+MANIFEST = {
+    "dem": {
+        "download": "fastclime.m1_etl.datasets.dem:download",
+        "process": "fastclime.m1_etl.datasets.dem:process",
+        "terrain": "fastclime.m1_etl.terrain:update_dem",
+        "desc": "Copernicus 30 m DEM",
+        "cadence_days": None,
+        "cog_profile": "dem",
+    },
     "smap": {
-        "download": smap.download,
-        "process": smap.process,
-        "desc": smap.DESCRIPTION,
+        "download": "fastclime.m1_etl.datasets.smap:download",
+        "process": "fastclime.m1_etl.datasets.smap:process",
+        "plan": "fastclime.m1_etl.datasets.smap:plan",
+        "process_file": "fastclime.m1_etl.datasets.smap:process_file",
+        "finalize": "fastclime.m1_etl.datasets.smap:finalize",
+        "desc": "SMAP L3 Daily 9km Soil Moisture",
+        "cadence_days": 1,
     },
     "ndvi": {
-        "download": ndvi.download,
-        "process": ndvi.process,
-        "desc": ndvi.DESCRIPTION,
+        "download": "fastclime.m1_etl.datasets.ndvi:download",
+        "process": "fastclime.m1_etl.datasets.ndvi:process",
+        "plan": "fastclime.m1_etl.datasets.ndvi:plan",
+        "process_file": "fastclime.m1_etl.datasets.ndvi:process_file",
+        "finalize": "fastclime.m1_etl.datasets.ndvi:finalize",
+        "zonal": "fastclime.m1_etl.zonal:update_ndvi",
+        "desc": "MODIS 16-Day 250m NDVI",
+        "cadence_days": 16,
+        "cog_profile": "ndvi",
     },
 }
-__all__ = ["DATASETS"]
+
+
+def resolve(ref):
+    """Imports the object a `"module:attribute"` reference names."""
+    if not isinstance(ref, str):
+        return ref
+    module, _, attribute = ref.partition(":")
+    obj = importlib.import_module(module)
+    for part in attribute.split(".") if attribute else []:
+        obj = getattr(obj, part)
+    return obj
+
+
+class DatasetSpec(Mapping):
+    """
+    A dataset's spec. Hooks are resolved on every access, so patching a
+    dataset module's function takes effect without touching the registry.
+    """
+
+    def __init__(self, name: str, spec: Mapping):
+        missing = [key for key in REQUIRED if key not in spec]
+        if missing:
+            raise ValueError(f"Dataset '{name}' spec is missing {missing}.")
+        self.name = name
+        self._spec = dict(spec)
+
+    def __getitem__(self, key):
+        value = self._spec[key]
+        return resolve(value) if key in HOOKS else value
+
+    def __iter__(self):
+        return iter(self._spec)
+
+    def __len__(self):
+        return len(self._spec)
+
+    def __repr__(self):
+        return f"DatasetSpec({self.name!r}, {self._spec!r})"
+
+
+class DatasetRegistry(MutableMapping):
+    """Dataset specs by name: the built-in manifest plus entry point plugins."""
+
+    def __init__(self, manifest: Mapping, group: str = ENTRY_POINT_GROUP):
+        self._specs = {name: DatasetSpec(name, spec) for name, spec in manifest.items()}
+        self._group = group
+        self._plugins = None
+
+    def _entry_points(self) -> dict:
+        """Plugins not loaded yet, discovered on first use."""
+        if self._plugins is None:
+            self._plugins = {}
+            for ep in entry_points(group=self._group):
+                if ep.name in self._specs:
+                    log.warning(
+                        f"Ignoring dataset plugin '{ep.value}': "
+                        f"'{ep.name}' is already registered."
+                    )
+                    continue
+                self._plugins[ep.name] = ep
+        return self._plugins
+
+    def _load(self, name: str) -> None:
+        ep = self._entry_points().pop(name)
+        try:
+            self._specs[name] = DatasetSpec(name, ep.load())
+        except Exception as e:
+            log.error(f"Could not load dataset plugin '{name}' ({ep.value}): {e}")
+
+    def __getitem__(self, name: str) -> DatasetSpec:
+        if name not in self._specs and name in self._entry_points():
+            self._load(name)
+        return self._specs[name]
+
+    def __setitem__(self, name: str, spec: Mapping) -> None:
+        self._entry_points().pop(name, None)
+        if not isinstance(spec, DatasetSpec):
+            spec = DatasetSpec(name, spec)
+        self._specs[name] = spec
+
+    def __delitem__(self, name: str) -> None:
+        del self._specs[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._specs or name in self._entry_points()
+
+    def __iter__(self):
+        # Loading plugins can drop broken ones, so list them before yielding.
+        for name in list(self._entry_points()):
+            self._load(name)
+        return iter(list(self._specs))
+
+    def __len__(self) -> int:
+        return len(self._specs) + len(self._entry_points())
+
+
+DATASETS = DatasetRegistry(MANIFEST)
+
+__all__ = ["DATASETS", "DatasetRegistry", "DatasetSpec", "resolve"]
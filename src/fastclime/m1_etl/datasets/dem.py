@@ -3,29 +3,30 @@ Dataset definition for Copernicus DEM GLO-30.
 """
 
 import math
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import rasterio
+import rasterio.errors
+
 from .. import utils
+from fastclime.config import settings
 from fastclime.core.logging import get_logger
 
 log = get_logger(__name__)
 
-DESCRIPTION = "Copernicus 30 m DEM"
-
+BASE_URL = "https://copernicus-dem-30m.s3.amazonaws.com"
 
-def download(year: int, bbox: list[float], temp_dir: Path, **kwargs) -> list[Path]:
-    """
-    Downloads Copernicus GLO-30 DEM tiles for a given bounding box.
-    """
-    base_url = "https://copernicus-dem-30m.s3.amazonaws.com"
-    downloaded_files = []
 
+def _tile_jobs(bbox: list[float], temp_dir: Path) -> list[tuple[str, Path]]:
+    """Returns the (url, local path) of every 1x1 degree tile the bbox touches."""
     min_lon, min_lat, max_lon, max_lat = bbox
     start_lon = math.floor(min_lon)
     end_lon = math.ceil(max_lon)
     start_lat = math.floor(min_lat)
     end_lat = math.ceil(max_lat)
 
+    jobs = []
     for lon in range(start_lon, end_lon):
         for lat in range(start_lat, end_lat):
             ns = "N" if lat >= 0 else "S"
@@ -34,16 +35,55 @@ def download(year: int, bbox: list[float], temp_dir: Path, **kwargs) -> list[Pat
             lon_str = f"{abs(lon):03d}"
 
             tile_name = f"Copernicus_DSM_COG_10_{ns}{lat_str}_00_{ew}{lon_str}_00_DEM"
-            file_url = f"{base_url}/{tile_name}/{tile_name}.tif"
-            dst_path = temp_dir / f"{tile_name}.tif"
+            file_url = f"{BASE_URL}/{tile_name}/{tile_name}.tif"
+            jobs.append((file_url, temp_dir / f"{tile_name}.tif"))
+    return jobs
+
+
+def _open_remote(url: str) -> str | Exception:
+    """Reads the header of a remote tile; returns its GDAL path or the error."""
+    path = utils.remote_path(url)
+    try:
+        with utils.remote_env(), rasterio.open(path):
+            return path
+    except rasterio.errors.RasterioIOError as e:
+        return e
+
+
+def download(
+    year: int,
+    bbox: list[float],
+    temp_dir: Path,
+    raw_cache: utils.RawCache | None = None,
+    remote: bool | None = None,
+    **kwargs,
+) -> list[Path | str]:
+    """
+    Downloads Copernicus GLO-30 DEM tiles for a given bounding box concurrently.
+    Tiles already in `raw_cache` are not downloaded again.
 
-            try:
-                utils.download_file(url=file_url, dst=dst_path)
-                downloaded_files.append(dst_path)
-            except Exception as e:
-                log.warning(
-                    f"Could not download tile {tile_name}: {e}. Likely an ocean tile."
-                )
+    With `remote` (default `settings.DEM_REMOTE_READ`) nothing is downloaded:
+    the tiles are COGs, so only their headers are read here and the remote
+    paths are returned for `process` to read the bbox window from.
+    """
+    jobs = _tile_jobs(bbox, temp_dir)
+    if settings.DEM_REMOTE_READ if remote is None else remote:
+        urls = [url for url, _ in jobs]
+        with ThreadPoolExecutor(max_workers=settings.DOWNLOAD_WORKERS) as pool:
+            results = dict(zip(urls, pool.map(_open_remote, urls)))
+    else:
+        with utils.DownloadManager(raw_cache=raw_cache) as manager:
+            results = manager.download_many(jobs)
+
+    downloaded_files = []
+    for file_url, dst_path in jobs:
+        result = results[file_url]
+        if isinstance(result, Exception):
+            log.warning(
+                f"Could not download tile {dst_path.stem}: {result}. Likely an ocean tile."
+            )
+        else:
+            downloaded_files.append(result)
 
     if not downloaded_files:
         raise FileNotFoundError(
@@ -54,28 +94,22 @@ def download(year: int, bbox: list[float], temp_dir: Path, **kwargs) -> list[Pat
 
 
 def process(
-    raw_files: list[Path],
+    raw_files: list[Path | str],
     processed_dir: Path,
     year: int,
     bbox: list[float],
     temp_dir: Path,
+    cog_profile: str | None = None,
     **kwargs,
 ) -> Path:
     """
-    Merges, reprograms, clips, and converts DEM tiles to a final COG.
+    Merges, clips and reprojects DEM tiles into the final COG in a single pass.
+    Remote tiles are read in place, so only the blocks in the bbox are fetched.
     """
     log.info(f"Starting processing for {len(raw_files)} DEM tiles...")
-    merged_path = temp_dir / "dem_merged.tif"
-    reprojected_path = temp_dir / "dem_reprojected.tif"
     final_cog_path = processed_dir / str(year) / f"DEM_{'_'.join(map(str, bbox))}.tif"
-    final_cog_path.parent.mkdir(parents=True, exist_ok=True)
-
-    utils.merge_rasters(raw_files, merged_path)
-    utils.reproject_raster(merged_path, reprojected_path, bbox=bbox)
-    utils.to_cog(reprojected_path, final_cog_path)
 
-    merged_path.unlink()
-    reprojected_path.unlink()
+    utils.mosaic_to_cog(raw_files, final_cog_path, bbox=bbox, profile=cog_profile)
 
     log.info(f"Successfully processed DEM and saved to {final_cog_path}")
     return final_cog_path
@@ -2,23 +2,27 @@
 Dataset definition for MODIS/Terra 16-Day L3 Global 250m NDVI.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 import datetime
 
 from .. import utils
 from ..constants import NETRC_PATH
+from fastclime.config import settings
 from fastclime.core.logging import get_logger
 
 log = get_logger(__name__)
 
-DESCRIPTION = "MODIS 16-Day 250m NDVI"
+# "250m 16 days NDVI" is the first subdataset of MOD13Q1 granules.
+NDVI_SUBDATASET = 0
 
 
-def download(
+def plan(
     year: int, day_of_year: int, bbox: list[float], temp_dir: Path, **kwargs
-) -> list[Path]:
+) -> list[tuple[str, Path]]:
     """
-    Finds and downloads 16-day NDVI HDF4 files using the CMR API.
+    Finds the 16-day NDVI HDF4 granules of a period using the CMR API.
     The day_of_year should correspond to the start of a 16-day period.
     """
     if not NETRC_PATH.exists():
@@ -39,42 +43,75 @@ def download(
         temporal_range=temporal_range,
         bbox=bbox,
     )
-
-    downloaded_files = []
-    for url in urls:
-        filename = url.split("/")[-1]
-        dst_path = temp_dir / filename
-        utils.download_file(url=url, dst=dst_path)
-        downloaded_files.append(dst_path)
-
-    if not downloaded_files:
+    if not urls:
         raise FileNotFoundError(
             f"No NDVI files found for period starting {start_date.date()}"
         )
-
-    return downloaded_files
+    return [(url, temp_dir / url.split("/")[-1]) for url in urls]
 
 
-def process(
-    raw_files: list[Path], processed_dir: Path, year: int, day_of_year: int, **kwargs
-) -> Path:
-    """
-    Extracts NDVI from HDF4, merges, and saves as a single GeoTIFF.
-    """
-    # Placeholder: a real implementation would merge tiles before converting.
-    # For now, we process only the first file found.
-    log.warning(
-        "NDVI processing is simplified and only processes the first tile found."
+def download(
+    year: int,
+    day_of_year: int,
+    bbox: list[float],
+    temp_dir: Path,
+    raw_cache: utils.RawCache | None = None,
+    **kwargs,
+) -> list[Path]:
+    """Finds and downloads the 16-day NDVI HDF4 files of a period."""
+    jobs = plan(year=year, day_of_year=day_of_year, bbox=bbox, temp_dir=temp_dir)
+    with utils.DownloadManager(raw_cache=raw_cache) as manager:
+        results = manager.download_many(jobs, raise_on_error=True)
+    return [results[url] for url, _ in jobs]
+
+
+def process_file(raw_file: Path, temp_dir: Path, **kwargs) -> Path:
+    """Extracts the scaled NDVI band of one MOD13Q1 tile (runs in a worker)."""
+    return utils.hdf4_to_geotiff(
+        raw_file,
+        temp_dir / f"{raw_file.stem}_ndvi.tif",
+        subdataset_index=NDVI_SUBDATASET,
+        scale_convention="modis",
     )
-    raw_file = raw_files[0]
 
-    # The NDVI data is typically the first subdataset in MOD13Q1
-    subdataset_index = 0
 
+def finalize(
+    tiles: list[Path],
+    processed_dir: Path,
+    year: int,
+    day_of_year: int,
+    bbox: list[float],
+    cog_profile: str | None = None,
+    **kwargs,
+) -> Path:
+    """Mosaics, clips and reprojects extracted tiles into the period's COG."""
     final_path = processed_dir / str(year) / f"NDVI_{year}{day_of_year:03d}.tif"
-    final_path.parent.mkdir(parents=True, exist_ok=True)
-
-    utils.hdf4_to_geotiff(raw_file, final_path, subdataset_index=subdataset_index)
+    try:
+        utils.mosaic_to_cog(tiles, final_path, bbox=bbox, profile=cog_profile)
+    finally:
+        for tile in tiles:
+            tile.unlink(missing_ok=True)
 
     log.info(f"Successfully processed NDVI and saved to {final_path}")
     return final_path
+
+
+def process(
+    raw_files: list[Path],
+    processed_dir: Path,
+    year: int,
+    day_of_year: int,
+    bbox: list[float],
+    temp_dir: Path,
+    cog_profile: str | None = None,
+    **kwargs,
+) -> Path:
+    """
+    Extracts NDVI from every HDF4 tile in parallel, then mosaics, clips and
+    reprojects the tiles into a single COG for the 16-day period.
+    """
+    log.info(f"Extracting NDVI from {len(raw_files)} MODIS tiles...")
+    workers = min(settings.PROCESS_WORKERS, len(raw_files))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tiles = list(pool.map(partial(process_file, temp_dir=temp_dir), raw_files))
+    return finalize(tiles, processed_dir, year, day_of_year, bbox, cog_profile)
@@ -5,20 +5,36 @@ Dataset definition for SMAP L3 Daily Soil Moisture.
 from pathlib import Path
 import datetime
 
+import h5py
+import numpy as np
+
 from .. import utils
+from ..cube import TimeCube
+from ...m0_storage import lake
 from ..constants import NETRC_PATH
 from fastclime.core.logging import get_logger
 
 log = get_logger(__name__)
 
-DESCRIPTION = "SMAP L3 Daily 9km Soil Moisture"
+VAR_NAME = "Soil_Moisture_Retrieval_Data/soil_moisture"
+# Time cube of the daily soil moisture, under the dataset's processed dir.
+CUBE_DIR = "cube"
 
 
-def download(
+def open_cube(processed_dir: Path) -> TimeCube:
+    """Opens the soil moisture time cube built by `process_file`."""
+    return TimeCube.open(processed_dir / CUBE_DIR)
+
+
+def plan(
     year: int, day_of_year: int, bbox: list[float], temp_dir: Path, **kwargs
-) -> list[Path]:
+) -> list[tuple[str, Path]]:
     """
-    Finds and downloads daily SMAP L3 HDF5 files using the CMR API.
+    Finds the daily SMAP L3 HDF5 granule using the CMR API.
+
+    Every granule of a day would write the same Parquet file and cube day,
+    so only the first one CMR returns is planned; extra matches (e.g.
+    reprocessed duplicates) are logged and skipped.
     """
     if not NETRC_PATH.exists():
         raise FileNotFoundError(
@@ -37,33 +53,90 @@ def download(
         temporal_range=temporal_range,
         bbox=bbox,
     )
-
-    downloaded_files = []
-    for url in urls:
-        filename = url.split("/")[-1]
-        dst_path = temp_dir / filename
-        utils.download_file(url=url, dst=dst_path)
-        downloaded_files.append(dst_path)
-
-    if not downloaded_files:
+    if not urls:
         raise FileNotFoundError(f"No SMAP files found for {date.date()}")
-
-    return downloaded_files
+    if len(urls) > 1:
+        log.warning(
+            f"{len(urls)} SMAP granules found for {date.date()}; "
+            f"using '{urls[0]}' and skipping {urls[1:]}"
+        )
+    return [(urls[0], temp_dir / urls[0].split("/")[-1])]
 
 
-def process(
-    raw_files: list[Path], processed_dir: Path, year: int, day_of_year: int, **kwargs
+def download(
+    year: int,
+    day_of_year: int,
+    bbox: list[float],
+    temp_dir: Path,
+    raw_cache: utils.RawCache | None = None,
+    **kwargs,
+) -> list[Path]:
+    """
+    Finds and downloads daily SMAP L3 HDF5 files using the CMR API.
+    """
+    jobs = plan(year=year, day_of_year=day_of_year, bbox=bbox, temp_dir=temp_dir)
+    with utils.DownloadManager(raw_cache=raw_cache) as manager:
+        results = manager.download_many(jobs, raise_on_error=True)
+    return [results[url] for url, _ in jobs]
+
+
+def process_file(
+    raw_file: Path,
+    processed_dir: Path,
+    year: int,
+    day_of_year: int,
+    bbox: list[float] | None = None,
+    **kwargs,
 ) -> Path:
     """
-    Extracts the soil moisture data from HDF5 and saves as Parquet.
+    Extracts the soil moisture cells inside the bbox from HDF5 into the SMAP
+    Parquet lake, partitioned by year and month, and appends the same cells,
+    as extracted, to the time cube for per-cell history reads.
     """
-    raw_file = raw_files[0]
-    var_name = "Soil_Moisture_Retrieval_Data/soil_moisture"
+    var_name = VAR_NAME
 
-    final_path = processed_dir / str(year) / f"SMAP_{year}{day_of_year:03d}.parquet"
-    final_path.parent.mkdir(parents=True, exist_ok=True)
+    date = datetime.date(year, 1, 1) + datetime.timedelta(day_of_year - 1)
+    partition = lake.partition_dir(processed_dir, year=year, month=date.month)
+    final_path = partition / f"SMAP_{year}{day_of_year:03d}.parquet"
 
-    utils.hdf5_to_parquet(raw_file, final_path, var_name=var_name)
+    slabs = []
+    utils.hdf5_to_parquet(
+        raw_file,
+        final_path,
+        var_name=var_name,
+        bbox=bbox,
+        date=date,
+        on_cells=lambda *cells: slabs.append(cells),
+    )
+
+    with h5py.File(raw_file, "r") as hf:
+        grid_shape = hf[var_name].shape
+    # row, col, value, lat and lon of every cell; empty if none is in the bbox.
+    cells = [np.concatenate(arrays) for arrays in zip(*slabs)] or [[]] * 5
+    cube = TimeCube.open(processed_dir / CUBE_DIR, grid_shape=grid_shape)
+    cube.append(date, *cells)
 
     log.info(f"Successfully processed SMAP and saved to {final_path}")
     return final_path
+
+
+def finalize(outputs: list[Path], **kwargs) -> Path:
+    """Returns the day's Parquet file; `plan` yields one granule per day."""
+    return outputs[0]
+
+
+def process(
+    raw_files: list[Path],
+    processed_dir: Path,
+    year: int,
+    day_of_year: int,
+    bbox: list[float] | None = None,
+    **kwargs,
+) -> Path:
+    """
+    Extracts the soil moisture cells inside the bbox from HDF5 into the SMAP
+    Parquet lake, partitioned by year and month.
+    """
+    return finalize(
+        [process_file(raw_files[0], processed_dir, year, day_of_year, bbox=bbox)]
+    )
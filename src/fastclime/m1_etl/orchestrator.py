@@ -2,68 +2,234 @@
 
 import shutil
 import tempfile
-import hashlib
+from contextlib import nullcontext
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
+from fastclime.config import settings
 from fastclime.m1_etl.datasets import DATASETS
 from . import constants
-from ..m0_storage.catalog import get_catalog
+from ..m0_storage import lake
+from ..m0_storage.cache import CacheManager
+from ..m0_storage.catalog import DataCatalog, get_catalog
+from ..m0_storage.footprints import (
+    RASTER_SUFFIXES,
+    Footprint,
+    FootprintIndex,
+    register_footprint,
+)
+from ..m0_storage.io import calculate_sha256
+from . import qa, telemetry
+from .raw_cache import RawCache
+from .utils import DownloadManager
 from ..core.logging import get_logger
 
 log = get_logger(__name__)
 
 
-def ingest(
-    dataset_name: str,
-    year: int,
-    bbox: list[float] | None = None,
-    overwrite: bool = False,
-    keep_temp: bool = False,
-    **kwargs,
-) -> dict:
+def _init_tables(con):
+    """Creates the backfill job table if it doesn't exist."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS etl_jobs (
+            dataset_name VARCHAR,
+            job_date DATE,
+            bbox VARCHAR,
+            status VARCHAR,
+            artifact_id UUID,
+            error VARCHAR,
+            attempts INTEGER DEFAULT 0,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (dataset_name, job_date, bbox)
+        );
     """
-    Orchestrates the download, processing, and registration of a dataset.
-    """
-    if dataset_name not in DATASETS:
+    )
+
+
+def _get_spec(dataset_name: str) -> dict:
+    try:
+        return DATASETS[dataset_name]
+    except KeyError:
         log.error(f"Dataset '{dataset_name}' is not in the registry.")
         raise ValueError(
             f"Dataset '{dataset_name}' not recognized. "
             f"Available datasets: {list(DATASETS.keys())}"
+        ) from None
+
+
+def _file_bytes(files) -> int:
+    """Total size of the local files among `files` (a path or a list of them)."""
+    if isinstance(files, (str, Path)):
+        files = [files]
+    paths = [Path(f) for f in files or [] if isinstance(f, (str, Path))]
+    return sum(p.stat().st_size for p in paths if p.is_file())
+
+
+def _process_file_job(
+    process_file, raw_file: Path, process_ctx: dict
+) -> tuple[Path, telemetry.RunRecorder]:
+    """
+    Runs a dataset's `process_file` hook in a worker process; returns its
+    output and the stages it recorded, which the parent merges into its run.
+    """
+    with telemetry.run(raw_file.name, save=False) as recorder:
+        with telemetry.stage("process_file") as metric:
+            output = process_file(raw_file, **process_ctx)
+            metric.add_bytes(_file_bytes(output))
+    return output, recorder
+
+
+def _run_pipeline(
+    spec: dict,
+    download_ctx: dict,
+    process_ctx: dict,
+    workers: int,
+) -> Path:
+    """
+    Overlaps downloading and processing of a dataset's files.
+
+    Download threads feed a bounded queue, worker processes run `process_file`
+    on each file as soon as it arrives and `finalize` combines the outputs in
+    plan order. When processing falls behind, the queue fills up and the
+    downloads pause, so wall time approaches max(download, process).
+    With a single worker, files are processed in this process while the
+    download threads keep fetching, instead of in a one-process pool.
+    Each transfer (`download_file`) and each `process_file` task (with the
+    writer stages inside it) is recorded under the `pipeline` stage.
+    """
+    with telemetry.stage("plan"):
+        jobs = spec["plan"](**download_ctx)
+    workers = max(1, min(workers, len(jobs)))
+    backlog = 2 * workers
+    futures = {}
+    outputs = {}
+
+    with (
+        telemetry.stage("pipeline") as metric,
+        DownloadManager(raw_cache=download_ctx.get("raw_cache")) as manager,
+        (
+            ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext()
+        ) as pool,
+    ):
+        for url, raw_file in manager.iter_downloads(jobs, buffer=backlog):
+            if isinstance(raw_file, Exception):
+                raise raw_file
+            metric.add_bytes(_file_bytes(raw_file))
+            if pool is None:
+                with telemetry.stage("process_file") as file_metric:
+                    outputs[url] = spec["process_file"](raw_file, **process_ctx)
+                    file_metric.add_bytes(_file_bytes(outputs[url]))
+                continue
+            future = pool.submit(
+                _process_file_job, spec["process_file"], raw_file, process_ctx
+            )
+            futures[future] = url
+            running = [f for f in futures if not f.done()]
+            if len(running) >= backlog:
+                wait(running, return_when=FIRST_COMPLETED)
+        for future in as_completed(futures):
+            outputs[futures[future]], recorder = future.result()
+            telemetry.merge(recorder)
+
+    with telemetry.stage("finalize") as metric:
+        processed_file = spec["finalize"](
+            [outputs[url] for url, _ in jobs], **process_ctx
         )
+        metric.add_bytes(_file_bytes(processed_file))
+    return processed_file
 
-    spec = DATASETS[dataset_name]
-    log.info(f"Starting ingestion for dataset '{dataset_name}' for year {year}...")
 
+def _run(
+    dataset_name: str,
+    year: int,
+    bbox: list[float] | None,
+    keep_temp: bool,
+    raw_cache: RawCache | None,
+    process_workers: int | None = None,
+    **kwargs,
+) -> Path:
+    """
+    Downloads and processes one dataset job, returning the processed file.
+
+    Datasets with per-file hooks run as a pipeline on `process_workers`
+    processes; the others download everything, then process. Without a
+    `raw_cache`, downloads go to the temporary directory.
+    """
+    spec = _get_spec(dataset_name)
     temp_dir = Path(tempfile.mkdtemp(prefix=f"fastclime_{dataset_name}_"))
     log.info(f"Using temporary directory: {temp_dir}")
 
     try:
         processed_dir = constants.PROCESSED_DIR / dataset_name
-        download_ctx = {"year": year, "bbox": bbox, "temp_dir": temp_dir, **kwargs}
+        download_ctx = {
+            "year": year,
+            "bbox": bbox,
+            "temp_dir": temp_dir,
+            "raw_cache": raw_cache,
+            **kwargs,
+        }
         process_ctx = {
             "processed_dir": processed_dir,
             "year": year,
             "bbox": bbox,
             "temp_dir": temp_dir,
+            "cog_profile": spec.get("cog_profile"),
             **kwargs,
         }
 
-        downloaded_files = spec["download"](**download_ctx)
-        processed_file = spec["process"](raw_files=downloaded_files, **process_ctx)
+        if "plan" in spec:
+            processed_file = _run_pipeline(
+                spec,
+                download_ctx,
+                process_ctx,
+                workers=process_workers or settings.PROCESS_WORKERS,
+            )
+        else:
+            with telemetry.stage("download") as metric:
+                downloaded_files = spec["download"](**download_ctx)
+                metric.add_bytes(_file_bytes(downloaded_files))
+            with telemetry.stage("process") as metric:
+                processed_file = spec["process"](
+                    raw_files=downloaded_files, **process_ctx
+                )
+                metric.add_bytes(_file_bytes(processed_file))
+
+        # The writers stored their statistics in the file's header.
+        with telemetry.stage("qa"):
+            qa.check(qa.read(processed_file), dataset_name, processed_file)
+        return processed_file
 
     finally:
         if not keep_temp:
             shutil.rmtree(temp_dir, ignore_errors=True)
 
-    catalog = get_catalog()
+
+def _register(
+    catalog: DataCatalog,
+    dataset_name: str,
+    year: int,
+    processed_file: Path,
+    file_hash: str,
+    time_range: tuple[date | None, date | None] = (None, None),
+) -> dict:
+    """
+    Registers a processed file in the catalog and returns the run stats.
+
+    Rasters are also indexed in `raster_footprints` with the dates they cover,
+    and the QA statistics stored in the file go to `artifact_qa`.
+    """
     catalog.register_dataset(
         name=dataset_name,
         source="http",  # Placeholder
         version=str(year),
-        description=spec["desc"],
+        description=DATASETS[dataset_name]["desc"],
     )
-
-    file_hash = hashlib.sha256(processed_file.read_bytes()).hexdigest()
     artifact_id = catalog.register_artifact(
         dataset_name=dataset_name,
         stage="processed",
@@ -71,8 +237,12 @@ def ingest(
         file_hash=file_hash,
         file_size_bytes=processed_file.stat().st_size,
     )
-
-    stats = {
+    if processed_file.suffix.lower() in RASTER_SUFFIXES:
+        register_footprint(
+            artifact_id, dataset_name, processed_file, *time_range, catalog=catalog
+        )
+    qa.save(artifact_id, qa.read(processed_file), catalog=catalog)
+    return {
         "dataset": dataset_name,
         "year": year,
         "processed_file_path": str(processed_file),
@@ -80,4 +250,336 @@ def ingest(
         "processed_file_sha256": file_hash,
         "artifact_uuid": str(artifact_id),
     }
+
+
+def _time_range(cadence_days: int | None, day: date) -> tuple[date | None, date | None]:
+    """Dates a job's output covers; None for static (yearly) datasets."""
+    if cadence_days is None:
+        return None, None
+    return day, day + timedelta(days=cadence_days - 1)
+
+
+def _reuse(catalog: DataCatalog, footprint: Footprint, year: int) -> dict:
+    """Returns the run stats of an existing raster that already covers a job."""
+    with catalog.get_connection() as con:
+        file_hash, size = con.execute(
+            "SELECT file_hash, file_size_bytes FROM artifacts WHERE id = ?",
+            (footprint.artifact_id,),
+        ).fetchone()
+    return {
+        "dataset": footprint.dataset_name,
+        "year": year,
+        "processed_file_path": str(footprint.path),
+        "processed_file_size": size,
+        "processed_file_sha256": file_hash,
+        "artifact_uuid": footprint.artifact_id,
+        "reused": True,
+    }
+
+
+def _enforce_cache_quotas(catalog: DataCatalog) -> None:
+    """Evicts cached raw downloads (and tmp files) beyond their quotas."""
+    for result in CacheManager(catalog).enforce_quota():
+        log.info(
+            f"The '{result['stage']}' cache was over its quota of "
+            f"{result['quota_bytes']} bytes; evicted {result['files_evicted']} files."
+        )
+
+
+def _update_zonal(spec: dict, processed_file: Path, day: date) -> None:
+    """Summarizes a processed raster per parcel, if the dataset supports it."""
+    if "zonal" in spec and settings.PARCELS_PATH:
+        spec["zonal"](processed_file, day)
+
+
+def _update_terrain(
+    spec: dict,
+    catalog: DataCatalog,
+    processed_file: Path,
+    year: int,
+    enabled: bool | None = None,
+) -> dict | None:
+    """Derives and registers the terrain layers of a DEM, if enabled."""
+    if enabled is None:
+        enabled = settings.DEM_TERRAIN
+    if "terrain" in spec and enabled:
+        return spec["terrain"](processed_file, str(year), catalog=catalog)
+    return None
+
+
+def ingest(
+    dataset_name: str,
+    year: int,
+    bbox: list[float] | None = None,
+    overwrite: bool = False,
+    keep_temp: bool = False,
+    use_cache: bool = True,
+    terrain: bool | None = None,
+    **kwargs,
+) -> dict:
+    """
+    Orchestrates the download, processing, and registration of a dataset.
+
+    Raw files are kept in the persistent download cache under `raw/` and
+    reused by later runs; with `use_cache=False` they are downloaded into the
+    temporary directory instead. Unless `overwrite` is set, a processed
+    raster that already covers the bbox and dates is returned as is.
+    `terrain` derives the terrain layers of a DEM; it defaults to
+    `settings.DEM_TERRAIN`.
+    """
+    spec = _get_spec(dataset_name)
+    day = date(year, 1, 1) + timedelta(days=(kwargs.get("day_of_year") or 1) - 1)
+    time_range = _time_range(spec.get("cadence_days"), day)
+    catalog = get_catalog()
+
+    if bbox and not overwrite:
+        existing = FootprintIndex.load(dataset_name, catalog=catalog).covering(
+            bbox, *time_range
+        )
+        if existing is not None:
+            log.info(
+                f"'{existing.relative_path}' already covers {bbox}; skipping ingestion."
+            )
+            return _reuse(catalog, existing, year)
+
+    log.info(f"Starting ingestion for dataset '{dataset_name}' for year {year}...")
+    with telemetry.run(
+        dataset_name, catalog=catalog, year=year, bbox=bbox, **kwargs
+    ) as recorder:
+        raw_cache = RawCache(dataset_name, catalog) if use_cache else None
+        processed_file = _run(dataset_name, year, bbox, keep_temp, raw_cache, **kwargs)
+        with telemetry.stage("hash") as metric:
+            file_hash = calculate_sha256(processed_file)
+            metric.add_bytes(processed_file.stat().st_size)
+        with telemetry.stage("register"):
+            stats = _register(
+                catalog, dataset_name, year, processed_file, file_hash, time_range
+            )
+        if processed_file.suffix == constants.PARQUET_EXT:
+            with telemetry.stage("lake"):
+                lake.refresh_views(catalog, datasets=[dataset_name])
+        with telemetry.stage("zonal"):
+            _update_zonal(spec, processed_file, day)
+        with telemetry.stage("terrain"):
+            layers = _update_terrain(spec, catalog, processed_file, year, terrain)
+        if layers:
+            stats["terrain_artifacts"] = layers
+        with telemetry.stage("evict"):
+            _enforce_cache_quotas(catalog)
+
+    stats["run_id"] = recorder.run_id
+    return stats
+
+
+def plan_jobs(start: date, end: date, cadence_days: int | None) -> list[date]:
+    """
+    Returns the job dates between `start` and `end`, inclusive.
+
+    Dates follow each year's day-of-year grid (1, 1 + cadence, ...), which
+    matches composite products such as the 16-day MODIS periods. Without a
+    cadence there is one job per year, dated January 1st.
+    """
+    if cadence_days is None:
+        return [date(year, 1, 1) for year in range(start.year, end.year + 1)]
+    jobs = []
+    day = start
+    while day <= end:
+        if (day.timetuple().tm_yday - 1) % cadence_days == 0:
+            jobs.append(day)
+        day += timedelta(days=1)
+    return jobs
+
+
+def _backfill_job(
+    dataset_name: str,
+    job_date: date,
+    bbox: list[float] | None,
+    raw_entries: dict | None,
+    kwargs: dict,
+) -> tuple[str, str, telemetry.RunRecorder, dict | None]:
+    """
+    Runs one backfill job in a worker process; returns (path, sha256), the
+    job's telemetry and the raw cache writes, which the parent records in
+    the catalog. The worker itself never writes to the catalog.
+    """
+    day_of_year = job_date.timetuple().tm_yday
+    raw_cache = (
+        RawCache(dataset_name, entries=raw_entries) if raw_entries is not None else None
+    )
+    with telemetry.run(
+        dataset_name,
+        save=False,
+        year=job_date.year,
+        bbox=bbox,
+        day_of_year=day_of_year,
+        **kwargs,
+    ) as recorder:
+        processed_file = _run(
+            dataset_name,
+            job_date.year,
+            bbox,
+            keep_temp=False,
+            raw_cache=raw_cache,
+            # The backfill pool already runs one job per CPU.
+            process_workers=1,
+            day_of_year=day_of_year,
+            **kwargs,
+        )
+        with telemetry.stage("hash") as metric:
+            file_hash = calculate_sha256(processed_file)
+            metric.add_bytes(processed_file.stat().st_size)
+    pending = raw_cache.pending if raw_cache else None
+    return str(processed_file), file_hash, recorder, pending
+
+
+def backfill(
+    dataset_name: str,
+    start: date,
+    end: date,
+    bbox: list[float] | None = None,
+    cadence_days: int | None = None,
+    workers: int | None = None,
+    overwrite: bool = False,
+    use_cache: bool = True,
+    terrain: bool | None = None,
+    **kwargs,
+) -> dict:
+    """
+    Ingests every job of a date range on a pool of worker processes.
+
+    The cadence defaults to the dataset's own (`cadence_days` in `DATASETS`).
+    Jobs already completed for the same bbox, or covered by an existing
+    raster, are skipped unless `overwrite` is set, so a failed or interrupted
+    backfill resumes where it stopped.
+    Workers only download and process; the parent registers every result
+    and the workers' raw cache writes in the catalog, and tracks job state
+    in the `etl_jobs` table.
+    """
+    spec = _get_spec(dataset_name)
+    if cadence_days is None:
+        cadence_days = spec.get("cadence_days")
+    bbox_key = " ".join(map(str, bbox)) if bbox else ""
+    catalog = get_catalog()
+
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        done = {
+            row[0]
+            for row in con.execute(
+                """
+                SELECT job_date FROM etl_jobs
+                WHERE dataset_name = ? AND bbox = ? AND status = 'done'
+                """,
+                (dataset_name, bbox_key),
+            ).fetchall()
+        }
+
+    planned = plan_jobs(start, end, cadence_days)
+    pending = [d for d in planned if overwrite or d not in done]
+    if bbox and not overwrite:
+        index = FootprintIndex.load(dataset_name, catalog=catalog)
+        pending = [
+            d
+            for d in pending
+            if index.covering(bbox, *_time_range(cadence_days, d)) is None
+        ]
+    log.info(
+        f"Backfill of '{dataset_name}' from {start} to {end}: {len(planned)} jobs, "
+        f"{len(planned) - len(pending)} already done or covered."
+    )
+    stats = {
+        "dataset": dataset_name,
+        "jobs_planned": len(planned),
+        "jobs_skipped": len(planned) - len(pending),
+        "jobs_succeeded": 0,
+        "failed": [],
+    }
+    if not pending:
+        return stats
+
+    workers = min(workers or settings.PROCESS_WORKERS, len(pending))
+    raw_cache = RawCache(dataset_name, catalog) if use_cache else None
+    raw_entries = raw_cache.entries() if raw_cache else None
+    refresh_lake = False
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                _backfill_job, dataset_name, job_date, bbox, raw_entries, kwargs
+            ): job_date
+            for job_date in pending
+        }
+        for future in as_completed(futures):
+            job_date = futures[future]
+            artifact_id, error, recorder = None, None, None
+            try:
+                path, file_hash, recorder, raw_writes = future.result()
+                if raw_writes:
+                    raw_cache.apply(raw_writes)
+                # Registration belongs to the job's run: its status is only
+                # known once the parent has registered the result.
+                with telemetry.attach(recorder):
+                    with telemetry.stage("register"):
+                        result = _register(
+                            catalog,
+                            dataset_name,
+                            job_date.year,
+                            Path(path),
+                            file_hash,
+                            _time_range(cadence_days, job_date),
+                        )
+                    artifact_id = result["artifact_uuid"]
+                    refresh_lake |= Path(path).suffix == constants.PARQUET_EXT
+                    with telemetry.stage("zonal"):
+                        _update_zonal(spec, Path(path), job_date)
+                    with telemetry.stage("terrain"):
+                        _update_terrain(
+                            spec, catalog, Path(path), job_date.year, terrain
+                        )
+                stats["jobs_succeeded"] += 1
+            except Exception as e:
+                log.error(f"Backfill job {dataset_name} {job_date} failed: {e}")
+                error = str(e)
+                stats["failed"].append({"date": job_date.isoformat(), "error": error})
+                if recorder is None:
+                    # The worker's own recorder died with it; keep the failure.
+                    recorder = telemetry.RunRecorder(
+                        dataset_name,
+                        {"year": str(job_date.year), "job_date": str(job_date)},
+                    )
+                recorder.status, recorder.error = "failed", error
+            telemetry.save_run(recorder, catalog)
+
+            with catalog.get_connection() as con:
+                con.execute(
+                    """
+                    INSERT INTO etl_jobs
+                        (dataset_name, job_date, bbox, status, artifact_id, error,
+                         attempts, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                    ON CONFLICT (dataset_name, job_date, bbox) DO UPDATE SET
+                        status = excluded.status,
+                        artifact_id = excluded.artifact_id,
+                        error = excluded.error,
+                        attempts = etl_jobs.attempts + 1,
+                        updated_at = excluded.updated_at
+                    """,
+                    (
+                        dataset_name,
+                        job_date,
+                        bbox_key,
+                        "failed" if error else "done",
+                        artifact_id,
+                        error,
+                        datetime.now(),
+                    ),
+                )
+
+    if refresh_lake:
+        lake.refresh_views(catalog, datasets=[dataset_name])
+    _enforce_cache_quotas(catalog)
+
+    log.info(
+        f"Backfill complete: {stats['jobs_succeeded']} succeeded, "
+        f"{len(stats['failed'])} failed, {stats['jobs_skipped']} skipped."
+    )
     return stats
@@ -0,0 +1,315 @@
+"""
+Quality statistics of processed outputs, gathered while they are written.
+
+Writers feed every block they write to a `QAStats` accumulator: value count,
+fill (nodata) count, min/max, mean/stddev (merged per block with Chan's
+formula) and a histogram whose bins widen as the value range grows, so no
+second pass over the data is needed. The statistics travel inside the file
+itself:
+
+    GeoTIFF   GDAL's `STATISTICS_*` band tags, plus `QA_HISTOGRAM`; COG
+              copies of a tagged GeoTIFF (`to_cog`) keep the tags
+    Parquet   a `fastclime.qa` key in the file metadata, one entry per column
+
+`read()` gets them back from the header alone. COGs that GDAL warps and
+writes on its own (`mosaic_to_cog`) carry no tags; their statistics are
+estimated from the coarsest overview, a few kilobytes, and flagged as
+`approximate`. The orchestrator checks exact statistics against the `QA_*`
+thresholds before registering a file; approximate ones are only recorded,
+since an estimate must not pass or fail an ingest. Both are stored per
+artifact in `artifact_qa`.
+"""
+
+import json
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import rasterio
+import rasterio.errors
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from ..m0_storage.catalog import DataCatalog, get_catalog
+
+log = get_logger(__name__)
+
+HIST_BINS = 32
+HISTOGRAM_TAG = "QA_HISTOGRAM"
+PARQUET_KEY = b"fastclime.qa"
+
+
+def _init_tables(con):
+    """Creates the artifact QA table if it doesn't exist."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS artifact_qa (
+            artifact_id UUID,
+            field VARCHAR,
+            count BIGINT,
+            valid BIGINT,
+            fill_ratio DOUBLE,
+            min DOUBLE,
+            max DOUBLE,
+            mean DOUBLE,
+            std DOUBLE,
+            histogram VARCHAR, -- JSON {"edges": [...], "counts": [...]}
+            approximate BOOLEAN,
+            PRIMARY KEY (artifact_id, field)
+        );
+    """
+    )
+
+
+@dataclass
+class QAStats:
+    """Streaming statistics of one band or column."""
+
+    count: int = 0
+    valid: int = 0
+    min: float = math.inf
+    max: float = -math.inf
+    mean: float = 0.0
+    m2: float = 0.0
+    bins: int = HIST_BINS
+    hist_start: float = 0.0
+    hist_width: float = 0.0
+    hist: np.ndarray | None = field(default=None, repr=False)
+
+    def update(self, values: np.ndarray, nodata: float | None = None) -> None:
+        """Adds a block; non-finite values and `nodata` count as fill."""
+        values = np.asarray(values)
+        self.count += values.size
+        valid = np.isfinite(values)
+        if nodata is not None:
+            valid &= values != nodata
+        values = values[valid].astype(np.float64)
+        if not values.size:
+            return
+        n, block_mean = values.size, values.mean()
+        block_m2 = ((values - block_mean) ** 2).sum()
+        total = self.valid + n
+        delta = block_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += block_m2 + delta**2 * self.valid * n / total
+        self.valid = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._histogram(values)
+
+    def _histogram(self, values: np.ndarray) -> None:
+        """
+        Adds values to the histogram. When they fall outside its range the
+        bins are merged in pairs, doubling the range toward the new values.
+        """
+        if self.hist is None:
+            self.hist = np.zeros(self.bins, dtype=np.int64)
+            self.hist_start = self.min
+            self.hist_width = (self.max - self.min) / self.bins or max(
+                abs(self.min) * 1e-9, 1e-12
+            )
+        low, high = values.min(), values.max()
+        while low < self.hist_start or high > self._hist_end():
+            merged = self.hist.reshape(-1, 2).sum(axis=1)
+            empty = np.zeros_like(merged)
+            if low < self.hist_start:
+                self.hist_start -= self.bins * self.hist_width
+                self.hist = np.concatenate([empty, merged])
+            else:
+                self.hist = np.concatenate([merged, empty])
+            self.hist_width *= 2
+        index = ((values - self.hist_start) / self.hist_width).astype(np.int64)
+        self.hist += np.bincount(index.clip(0, self.bins - 1), minlength=self.bins)
+
+    def _hist_end(self) -> float:
+        return self.hist_start + self.bins * self.hist_width
+
+    @property
+    def fill_ratio(self) -> float:
+        return 1 - self.valid / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.valid) if self.valid else math.nan
+
+    def histogram(self) -> dict | None:
+        if self.hist is None:
+            return None
+        edges = self.hist_start + self.hist_width * np.arange(self.bins + 1)
+        return {"edges": edges.tolist(), "counts": self.hist.tolist()}
+
+    def to_dict(self) -> dict:
+        valid = self.valid > 0
+        return {
+            "count": self.count,
+            "valid": self.valid,
+            "fill_ratio": self.fill_ratio,
+            "min": float(self.min) if valid else None,
+            "max": float(self.max) if valid else None,
+            "mean": float(self.mean) if valid else None,
+            "std": self.std if valid else None,
+            "histogram": self.histogram(),
+        }
+
+    def band_tags(self) -> dict:
+        """GDAL's `STATISTICS_*` band tags, plus the histogram."""
+        if not self.valid:
+            return {"STATISTICS_VALID_PERCENT": 0}
+        return {
+            "STATISTICS_MINIMUM": repr(float(self.min)),
+            "STATISTICS_MAXIMUM": repr(float(self.max)),
+            "STATISTICS_MEAN": repr(float(self.mean)),
+            "STATISTICS_STDDEV": repr(self.std),
+            "STATISTICS_VALID_PERCENT": repr(100 * (1 - self.fill_ratio)),
+            HISTOGRAM_TAG: json.dumps(self.histogram()),
+        }
+
+
+def parquet_metadata(stats: dict[str, QAStats]) -> dict[bytes, bytes]:
+    """The Parquet key-value metadata holding the stats of each column."""
+    return {PARQUET_KEY: json.dumps({k: v.to_dict() for k, v in stats.items()})}
+
+
+def _overview_stats(src, band: int) -> dict | None:
+    """
+    Approximate statistics from the coarsest overview, for rasters written
+    without them (such as warped mosaics). None if the band has no overview.
+    """
+    factors = src.overviews(band)
+    if not factors:
+        return None
+    shape = (max(1, src.height // factors[-1]), max(1, src.width // factors[-1]))
+    stats = QAStats()
+    stats.update(src.read(band, out_shape=shape), nodata=src.nodata)
+    entry = stats.to_dict()
+    entry["count"] = src.width * src.height
+    entry["valid"] = round(entry["count"] * (1 - stats.fill_ratio))
+    entry["approximate"] = True
+    return entry
+
+
+def _read_raster(path: Path) -> dict:
+    out = {}
+    with rasterio.open(path) as src:
+        for band in src.indexes:
+            tags = src.tags(band)
+            if "STATISTICS_VALID_PERCENT" not in tags:
+                entry = _overview_stats(src, band)
+                if entry is not None:
+                    out[f"band{band}"] = entry
+                continue
+            count = src.width * src.height
+            valid = round(count * float(tags["STATISTICS_VALID_PERCENT"]) / 100)
+            entry = {"count": count, "valid": valid, "fill_ratio": 1 - valid / count}
+            for key, tag in (
+                ("min", "STATISTICS_MINIMUM"),
+                ("max", "STATISTICS_MAXIMUM"),
+                ("mean", "STATISTICS_MEAN"),
+                ("std", "STATISTICS_STDDEV"),
+            ):
+                entry[key] = float(tags[tag]) if valid and tag in tags else None
+            histogram = tags.get(HISTOGRAM_TAG)
+            entry["histogram"] = json.loads(histogram) if histogram else None
+            entry["approximate"] = False
+            out[f"band{band}"] = entry
+    return out
+
+
+def read(path: Path) -> dict[str, dict]:
+    """
+    Returns the QA statistics stored in a processed file, per band or column.
+    Files without statistics, or that can't be read, give an empty dict.
+    """
+    path = Path(path)
+    try:
+        if path.suffix.lower() == ".parquet":
+            metadata = pq.ParquetFile(path).metadata.metadata or {}
+            if PARQUET_KEY in metadata:
+                return json.loads(metadata[PARQUET_KEY])
+        elif path.suffix.lower() in (".tif", ".tiff"):
+            return _read_raster(path)
+    except (pa.ArrowInvalid, rasterio.errors.RasterioIOError) as e:
+        log.warning(f"Could not read QA statistics of '{path}': {e}")
+    return {}
+
+
+def thresholds(dataset_name: str) -> dict:
+    """The QA thresholds of a dataset: the global settings and its overrides."""
+    return {
+        "max_fill_ratio": settings.QA_MAX_FILL_RATIO,
+        "min_valid": settings.QA_MIN_VALID,
+        **settings.QA_THRESHOLDS.get(dataset_name, {}),
+    }
+
+
+def check(stats: dict[str, dict], dataset_name: str, path: Path) -> None:
+    """
+    Raises ValueError if a band or column breaks the dataset's thresholds:
+    `max_fill_ratio`, `min_valid` and, when set, the `min`/`max` value range.
+    Approximate statistics are not checked.
+    """
+    limits = thresholds(dataset_name)
+    problems = []
+    for name, entry in stats.items():
+        if entry.get("approximate"):
+            log.warning(
+                f"QA thresholds not checked for '{Path(path).name}' {name}: "
+                "its statistics are estimated from an overview."
+            )
+            continue
+        if entry["fill_ratio"] > limits["max_fill_ratio"]:
+            problems.append(
+                f"{name}: fill ratio {entry['fill_ratio']:.1%} > "
+                f"{limits['max_fill_ratio']:.1%}"
+            )
+        if entry["valid"] < limits["min_valid"]:
+            problems.append(
+                f"{name}: {entry['valid']} valid values < {limits['min_valid']}"
+            )
+        if "min" in limits and entry["min"] is not None:
+            if entry["min"] < limits["min"]:
+                problems.append(f"{name}: min {entry['min']} < {limits['min']}")
+        if "max" in limits and entry["max"] is not None:
+            if entry["max"] > limits["max"]:
+                problems.append(f"{name}: max {entry['max']} > {limits['max']}")
+    if problems:
+        raise ValueError(
+            f"QA failed for '{Path(path).name}' ({dataset_name}): "
+            + "; ".join(problems)
+        )
+
+
+def save(
+    artifact_id,
+    stats: dict[str, dict],
+    catalog: DataCatalog | None = None,
+) -> None:
+    """Stores the QA statistics of an artifact in `artifact_qa`."""
+    if not stats:
+        return
+    catalog = catalog or get_catalog()
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        con.executemany(
+            "INSERT OR REPLACE INTO artifact_qa "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    artifact_id,
+                    name,
+                    entry["count"],
+                    entry["valid"],
+                    entry["fill_ratio"],
+                    entry["min"],
+                    entry["max"],
+                    entry["mean"],
+                    entry["std"],
+                    json.dumps(entry["histogram"]),
+                    entry.get("approximate", False),
+                )
+                for name, entry in stats.items()
+            ],
+        )
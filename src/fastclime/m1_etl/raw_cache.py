@@ -0,0 +1,196 @@
+"""
+Persistent, content-keyed cache of raw downloads.
+
+Downloaded files are kept under `raw/<dataset>/<sha[:2]>/<sha>/<filename>`
+and indexed in the `raw_cache` catalog table by URL and SHA256, so a later
+ingest of the same tiles or granules reuses the bytes already on disk.
+Partial downloads wait in `raw/<dataset>/_incoming/` until they are complete.
+The files are ordinary members of the `raw/` cache stage: hits are recorded
+with `CacheManager.touch`, and every ingest and backfill evicts the least
+recently used ones once the stage exceeds `CACHE_QUOTA_RAW_GB`.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from ..m0_storage.cache import CacheManager
+from ..m0_storage.catalog import DataCatalog, get_catalog
+
+log = get_logger(__name__)
+
+INCOMING_DIR = "_incoming"
+
+
+def _init_tables(con):
+    """Creates the raw download index if it doesn't exist."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS raw_cache (
+            url VARCHAR PRIMARY KEY,
+            dataset_name VARCHAR,
+            sha256 VARCHAR,
+            relative_path VARCHAR,
+            size_bytes BIGINT,
+            fetched_at TIMESTAMP DEFAULT current_timestamp
+        );
+    """
+    )
+
+
+class RawCache:
+    """
+    Maps download URLs to content-addressed files under `raw/<dataset>/`.
+
+    A cache built from `entries` is detached from the catalog: lookups use
+    that copy of the index, and the writes it would make are collected in
+    `pending` instead, for the process that owns the catalog to `apply`.
+    Backfill workers use it so they never contend for the catalog's lock.
+    """
+
+    def __init__(
+        self,
+        dataset_name: str,
+        catalog: DataCatalog | None = None,
+        data_dir: Path | None = None,
+        entries: dict[str, tuple[str, str, int]] | None = None,
+    ):
+        self.dataset_name = dataset_name
+        self.data_dir = Path(data_dir or settings.DATA_DIR)
+        self.root = self.data_dir / "raw" / dataset_name
+        # Downloads run on a thread pool; URLs with the same content share a
+        # file, and concurrent upserts of the same row conflict in DuckDB.
+        self._lock = threading.Lock()
+        self._entries = entries
+        self.pending = {"index": [], "drop": [], "touch": []}
+        if entries is None:
+            self.catalog = catalog or get_catalog()
+            self.cache = CacheManager(self.catalog, data_dir=self.data_dir)
+            with self.catalog.get_connection() as con:
+                _init_tables(con)
+
+    def entries(self) -> dict[str, tuple[str, str, int]]:
+        """Returns the dataset's index, url -> (sha256, relative path, size)."""
+        with self.catalog.get_connection() as con:
+            rows = con.execute(
+                """
+                SELECT url, sha256, relative_path, size_bytes
+                FROM raw_cache WHERE dataset_name = ?
+                """,
+                (self.dataset_name,),
+            ).fetchall()
+        return {url: (sha, rel, size) for url, sha, rel, size in rows}
+
+    def apply(self, pending: dict) -> None:
+        """Records the writes a detached cache collected in `pending`."""
+        with self.catalog.get_connection() as con:
+            for url in pending["drop"]:
+                con.execute("DELETE FROM raw_cache WHERE url = ?", (url,))
+            if pending["index"]:
+                con.executemany(
+                    """
+                    INSERT OR REPLACE INTO raw_cache
+                        (url, dataset_name, sha256, relative_path, size_bytes)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (url, self.dataset_name, sha, rel, size)
+                        for url, sha, rel, size in pending["index"]
+                    ],
+                )
+        touched = [self.data_dir / rel for rel in pending["touch"]]
+        self.cache.touch([p for p in touched if p.is_file()])
+
+    def path_for(self, sha256: str, filename: str) -> Path:
+        """Returns the content-keyed location of a file."""
+        return self.root / sha256[:2] / sha256 / filename
+
+    def lookup(self, url: str, expected_sha: str | None = None) -> Path | None:
+        """
+        Returns the cached file for `url`, or None if it must be downloaded.
+
+        Entries whose file was evicted or no longer matches the recorded size
+        (or `expected_sha`) are dropped from the index.
+        """
+        if self._entries is not None:
+            row = self._entries.get(url)
+        else:
+            with self.catalog.get_connection() as con:
+                row = con.execute(
+                    "SELECT sha256, relative_path, size_bytes FROM raw_cache "
+                    "WHERE url = ?",
+                    (url,),
+                ).fetchone()
+        if row is None:
+            return None
+
+        sha, rel, size = row
+        path = self.data_dir / rel
+        if (
+            path.is_file()
+            and path.stat().st_size == size
+            and expected_sha in (None, sha)
+        ):
+            with self._lock:
+                self._touch(path)
+            log.info(f"Using cached '{path.name}' for '{url}'.")
+            return path
+
+        with self._lock:
+            self._drop(url)
+        return None
+
+    def staging_path(self, url: str, filename: str) -> Path:
+        """Returns a stable download location for `url`, so partial files resume."""
+        key = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return self.root / INCOMING_DIR / f"{key}_{filename}"
+
+    def add(self, url: str, staged: Path, sha256: str) -> Path:
+        """Moves a finished download into the cache and indexes it by URL."""
+        path = self.path_for(sha256, staged.name.split("_", 1)[1])
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            existing = next(path.parent.iterdir(), None)
+            if existing is not None:
+                # Same content already cached under another URL (or filename).
+                staged.unlink()
+                path = existing
+            else:
+                os.replace(staged, path)
+            self._index(url, sha256, path)
+            self._touch(path)
+        return path
+
+    def _index(self, url: str, sha256: str, path: Path) -> None:
+        rel = path.relative_to(self.data_dir).as_posix()
+        size = path.stat().st_size
+        if self._entries is not None:
+            self._entries[url] = (sha256, rel, size)
+            self.pending["index"].append((url, sha256, rel, size))
+            return
+        with self.catalog.get_connection() as con:
+            con.execute(
+                """
+                INSERT OR REPLACE INTO raw_cache
+                    (url, dataset_name, sha256, relative_path, size_bytes)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (url, self.dataset_name, sha256, rel, size),
+            )
+
+    def _drop(self, url: str) -> None:
+        if self._entries is not None:
+            self._entries.pop(url, None)
+            self.pending["drop"].append(url)
+            return
+        with self.catalog.get_connection() as con:
+            con.execute("DELETE FROM raw_cache WHERE url = ?", (url,))
+
+    def _touch(self, path: Path) -> None:
+        if self._entries is not None:
+            self.pending["touch"].append(path.relative_to(self.data_dir).as_posix())
+            return
+        self.cache.touch([path])
@@ -0,0 +1,381 @@
+"""
+Per-stage telemetry of ETL runs.
+
+`run()` opens a recorder for one ingest job; code anywhere below it wraps its
+work in `stage(name)` to record wall time, bytes processed and the peak
+resident memory seen while the stage was open. A background thread samples
+the RSS of the process, so short spikes inside a stage are caught. Runs are
+stored in the `etl_runs` and `etl_stage_metrics` catalog tables and
+summarized by `fastclime ingest stats`.
+
+Outside of a run `stage()` only logs its duration, so instrumented helpers
+can be called from anywhere. Recorders are plain data and can be returned
+from worker processes: the parent either saves them (`save_run`) or folds
+their stages into its own run (`merge`). Work measured on other threads is
+added with `RunRecorder.add`. The peak RSS of a run is the highest seen in
+any of its processes.
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from fastclime.core.logging import get_logger
+from ..m0_storage.catalog import DataCatalog, get_catalog
+
+log = get_logger(__name__)
+
+RSS_SAMPLE_S = 0.05
+MIB = 1024**2
+
+_CURRENT: ContextVar["RunRecorder | None"] = ContextVar("etl_run", default=None)
+
+
+def _init_tables(con):
+    """Creates the run telemetry tables if they don't exist."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS etl_runs (
+            run_id UUID PRIMARY KEY,
+            dataset_name VARCHAR,
+            params VARCHAR,
+            status VARCHAR,
+            error VARCHAR,
+            started_at TIMESTAMP,
+            seconds DOUBLE,
+            peak_rss_mb DOUBLE
+        );
+    """
+    )
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS etl_stage_metrics (
+            run_id UUID,
+            seq INTEGER,
+            stage VARCHAR,
+            parent VARCHAR,
+            started_at TIMESTAMP,
+            seconds DOUBLE,
+            bytes BIGINT,
+            mb_per_s DOUBLE,
+            peak_rss_mb DOUBLE,
+            PRIMARY KEY (run_id, seq)
+        );
+    """
+    )
+
+
+def _current_rss() -> int:
+    """Resident memory of this process in bytes (0 where unsupported)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+@dataclass
+class StageMetric:
+    """Timing, volume and memory of one stage."""
+
+    stage: str
+    parent: str | None
+    started_at: datetime
+    seconds: float = 0.0
+    bytes: int = 0
+    peak_rss: int = 0
+
+    def add_bytes(self, n: int) -> None:
+        self.bytes += int(n)
+
+    @property
+    def mb_per_s(self) -> float | None:
+        return self.bytes / MIB / self.seconds if self.bytes and self.seconds else None
+
+
+@dataclass
+class RunRecorder:
+    """The stages of one ETL run."""
+
+    dataset_name: str
+    params: dict = field(default_factory=dict)
+    run_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    started_at: datetime = field(default_factory=datetime.now)
+    seconds: float = 0.0
+    status: str = "running"
+    error: str | None = None
+    stages: list[StageMetric] = field(default_factory=list)
+    peak_rss: int = 0
+
+    def __post_init__(self):
+        self._open: list[StageMetric] = []
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_open", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open = []
+
+    @property
+    def current_stage(self) -> str | None:
+        """Name of the innermost open stage."""
+        return self._open[-1].stage if self._open else None
+
+    def add(self, metric: StageMetric) -> None:
+        """Adds a stage measured elsewhere, e.g. on a download thread."""
+        self.stages.append(metric)
+        self.peak_rss = max(self.peak_rss, metric.peak_rss)
+
+    def merge(self, other: "RunRecorder", parent: str | None = None) -> None:
+        """Adds the stages of a worker's recorder, its top level under `parent`."""
+        for metric in other.stages:
+            if metric.parent is None:
+                metric.parent = parent
+            self.stages.append(metric)
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+
+    def sample(self) -> None:
+        """Folds the current RSS into the run and every open stage."""
+        rss = _current_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        for metric in list(self._open):
+            metric.peak_rss = max(metric.peak_rss, rss)
+
+    @contextmanager
+    def stage(self, name: str):
+        parent = self.current_stage
+        metric = StageMetric(name, parent, datetime.now())
+        self.stages.append(metric)
+        self._open.append(metric)
+        self.sample()
+        started = time.perf_counter()
+        try:
+            yield metric
+        finally:
+            metric.seconds = time.perf_counter() - started
+            self.sample()
+            self._open.remove(metric)
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, recorder: RunRecorder):
+        super().__init__(daemon=True, name="etl-rss-sampler")
+        self.recorder = recorder
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(RSS_SAMPLE_S):
+            self.recorder.sample()
+
+
+@contextmanager
+def run(
+    dataset_name: str, save: bool = True, catalog: DataCatalog | None = None, **params
+):
+    """
+    Records an ETL run; stages opened in this context are attached to it.
+
+    The run is saved to the catalog on exit (also when it fails) unless
+    `save` is False, e.g. in worker processes that return the recorder.
+    """
+    recorder = RunRecorder(dataset_name, {k: str(v) for k, v in params.items()})
+    token = _CURRENT.set(recorder)
+    sampler = _Sampler(recorder)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield recorder
+        recorder.status = "done"
+    except BaseException as e:
+        recorder.status, recorder.error = "failed", str(e)
+        raise
+    finally:
+        sampler.stopped.set()
+        sampler.join()
+        recorder.sample()
+        recorder.seconds = time.perf_counter() - started
+        _CURRENT.reset(token)
+        if save:
+            save_run(recorder, catalog)
+
+
+def current() -> RunRecorder | None:
+    """The recorder of the run open in this context, if any."""
+    return _CURRENT.get()
+
+
+@contextmanager
+def attach(recorder: RunRecorder):
+    """
+    Records the stages opened in this context into an existing recorder,
+    such as one returned by a worker process, without timing it again.
+    """
+    token = _CURRENT.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _CURRENT.reset(token)
+
+
+def merge(recorder: RunRecorder) -> None:
+    """Folds a worker's stages into the current run, under its open stage."""
+    current = _CURRENT.get()
+    if current is not None:
+        current.merge(recorder, parent=current.current_stage)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a stage of the current run and yields its metric; call
+    `metric.add_bytes(n)` to record the volume it processed.
+    """
+    recorder = _CURRENT.get()
+    if recorder is None:
+        metric = StageMetric(name, None, datetime.now())
+        started = time.perf_counter()
+        try:
+            yield metric
+        finally:
+            log.debug(f"Stage '{name}' took {time.perf_counter() - started:.2f} s.")
+        return
+    with recorder.stage(name) as metric:
+        yield metric
+    log.debug(f"Stage '{name}' took {metric.seconds:.2f} s.")
+
+
+def timed(name: str):
+    """
+    Decorator recording each call as a stage. The bytes are the size of the
+    file the function writes: its `dst` argument, or the path it returns.
+    """
+
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as metric:
+                result = func(*args, **kwargs)
+                out = signature.bind_partial(*args, **kwargs).arguments.get("dst")
+                if isinstance(result, Path):
+                    out = result
+                if isinstance(out, Path) and out.is_file():
+                    metric.add_bytes(out.stat().st_size)
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def save_run(recorder: RunRecorder, catalog: DataCatalog | None = None) -> None:
+    """Persists a run and its stages."""
+    catalog = catalog or get_catalog()
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        con.execute(
+            "INSERT OR REPLACE INTO etl_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                recorder.run_id,
+                recorder.dataset_name,
+                " ".join(f"{k}={v}" for k, v in recorder.params.items()),
+                recorder.status,
+                recorder.error,
+                recorder.started_at,
+                recorder.seconds,
+                recorder.peak_rss / MIB,
+            ),
+        )
+        if recorder.stages:
+            con.executemany(
+                "INSERT OR REPLACE INTO etl_stage_metrics "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        recorder.run_id,
+                        seq,
+                        m.stage,
+                        m.parent,
+                        m.started_at,
+                        m.seconds,
+                        m.bytes,
+                        m.mb_per_s,
+                        m.peak_rss / MIB,
+                    )
+                    for seq, m in enumerate(recorder.stages)
+                ],
+            )
+    log.info(
+        f"ETL run {recorder.run_id} ({recorder.dataset_name}) {recorder.status} "
+        f"in {recorder.seconds:.1f} s, peak RSS {recorder.peak_rss / MIB:.0f} MiB."
+    )
+
+
+def run_stats(
+    dataset_name: str | None = None,
+    limit: int = 20,
+    catalog: DataCatalog | None = None,
+) -> dict:
+    """
+    Returns the latest runs and per-stage aggregates over them.
+
+    Stage aggregates (median/p90 seconds, throughput, peak RSS) cover the
+    same `limit` most recent runs per dataset, so a regression shows up as a
+    stage whose median drifts from run to run.
+    """
+    catalog = catalog or get_catalog()
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        runs = con.execute(
+            """
+            SELECT run_id, dataset_name, params, status, error, started_at,
+                   seconds, peak_rss_mb
+            FROM etl_runs
+            WHERE ? IS NULL OR dataset_name = ?
+            ORDER BY started_at DESC
+            LIMIT ?
+            """,
+            (dataset_name, dataset_name, limit),
+        ).df()
+        stages = con.execute(
+            """
+            WITH recent AS (
+                SELECT run_id, dataset_name FROM etl_runs
+                WHERE ? IS NULL OR dataset_name = ?
+                QUALIFY row_number() OVER (
+                    PARTITION BY dataset_name ORDER BY started_at DESC
+                ) <= ?
+            )
+            SELECT r.dataset_name, s.stage,
+                   count(DISTINCT s.run_id) AS runs,
+                   count(*) AS calls,
+                   median(s.seconds) AS median_s,
+                   quantile_cont(s.seconds, 0.9) AS p90_s,
+                   sum(s.bytes) AS bytes,
+                   median(s.mb_per_s) AS median_mb_per_s,
+                   max(s.peak_rss_mb) AS peak_rss_mb
+            FROM etl_stage_metrics s JOIN recent r USING (run_id)
+            GROUP BY ALL
+            ORDER BY r.dataset_name, median_s DESC
+            """,
+            (dataset_name, dataset_name, limit),
+        ).df()
+    runs["run_id"] = runs["run_id"].astype(str)
+    runs["started_at"] = runs["started_at"].astype(str)
+    # NaN (e.g. no throughput for a stage without bytes) is not valid JSON.
+    return {
+        name: df.astype(object).where(df.notna(), None).to_dict(orient="records")
+        for name, df in (("runs", runs), ("stages", stages))
+    }
@@ -0,0 +1,251 @@
+"""
+Terrain derivatives of the processed DEM: slope, aspect and air pressure.
+
+The DEM is split into tiles of `TILE_SIZE` x `TILE_SIZE` pixels, each read
+with a halo of `HALO` pixels so Horn's 3x3 finite differences are exact at
+tile edges. Tiles are computed on worker processes and written into tiled
+GeoTIFFs as they arrive, with at most two tiles per worker in flight, so
+memory is bounded by the tile size whatever the size of the DEM. The
+GeoTIFFs are then converted to COGs:
+
+    slope     degrees from horizontal
+    aspect    degrees clockwise from north of the downslope direction
+              (nodata on flat cells)
+    pressure  kPa, FAO-56 Eq. 7 from the elevation
+
+Each layer is registered as its own dataset (`dem_slope`, `dem_aspect`,
+`dem_pressure`), so it can be found with `m0_storage.find_rasters`.
+"""
+
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from . import qa, utils
+from ..m0_storage.catalog import DataCatalog, get_catalog
+from ..m0_storage.footprints import register_footprint
+from ..m0_storage.io import calculate_sha256
+from ..m2_dynamic.utils import get_atmospheric_pressure
+
+log = get_logger(__name__)
+
+TILE_SIZE = 1024
+HALO = 1
+LAYERS = ("slope", "aspect", "pressure")
+DESCRIPTIONS = {
+    "slope": "Terrain slope (degrees) derived from the DEM",
+    "aspect": "Terrain aspect (degrees from north) derived from the DEM",
+    "pressure": "Atmospheric pressure (kPa, FAO-56 Eq. 7) derived from the DEM",
+}
+# Mean Earth radius, to convert geographic pixel sizes to metres.
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def _tiles(width: int, height: int, size: int):
+    """Yields the windows of a `size` grid covering the raster."""
+    for row in range(0, height, size):
+        for col in range(0, width, size):
+            yield Window(col, row, min(size, width - col), min(size, height - row))
+
+
+def _pixel_size_m(dataset, window: Window) -> tuple[np.ndarray, float]:
+    """
+    Returns the pixel width of each row of `window` and the pixel height, in
+    metres. Geographic pixels narrow with latitude, so their width varies.
+    """
+    res_x, res_y = dataset.res
+    if not dataset.crs.is_geographic:
+        return np.full((int(window.height), 1), res_x), res_y
+    rows = np.arange(window.row_off, window.row_off + window.height) + 0.5
+    lat = np.radians(dataset.transform.f + rows * dataset.transform.e)
+    metres = math.radians(1) * EARTH_RADIUS_M
+    return (res_x * metres * np.cos(lat))[:, None], res_y * metres
+
+
+def horn_gradient(
+    z: np.ndarray, dx: np.ndarray | float, dy: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the east and north gradients of the interior of `z` (Horn, 1981).
+
+    `z` has one halo pixel on every side, rows running north to south; the
+    result has the shape of `z` without its halo.
+    """
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, f = z[1:-1, :-2], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+    east = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * dx)
+    north = ((a + 2 * b + c) - (g + 2 * h + i)) / (8 * dy)
+    return east, north
+
+
+def _derive_tile(dem_path: str, window: Window) -> tuple[Window, dict]:
+    """Computes every layer for one tile; runs in a worker process."""
+    with rasterio.open(dem_path) as src:
+        # Read the tile plus its halo, clipped to the raster; missing halo
+        # rows and columns at the raster's edges repeat the edge pixels.
+        col0 = max(window.col_off - HALO, 0)
+        row0 = max(window.row_off - HALO, 0)
+        col1 = min(window.col_off + window.width + HALO, src.width)
+        row1 = min(window.row_off + window.height + HALO, src.height)
+        z = src.read(1, window=Window(col0, row0, col1 - col0, row1 - row0))
+        z = z.astype(np.float64)
+        if src.nodata is not None:
+            z[z == src.nodata] = np.nan
+        pad = (
+            (
+                HALO - (window.row_off - row0),
+                HALO - (row1 - window.row_off - window.height),
+            ),
+            (
+                HALO - (window.col_off - col0),
+                HALO - (col1 - window.col_off - window.width),
+            ),
+        )
+        z = np.pad(z, pad, mode="edge")
+        dx, dy = _pixel_size_m(src, window)
+
+    east, north = horn_gradient(z, dx, dy)
+    elevation = z[HALO:-HALO, HALO:-HALO]
+    slope = np.degrees(np.arctan(np.hypot(east, north)))
+    # The downslope direction is minus the gradient.
+    aspect = np.degrees(np.arctan2(-east, -north)) % 360
+    aspect[(east == 0) & (north == 0)] = np.nan
+    layers = {
+        "slope": slope,
+        "aspect": aspect,
+        "pressure": get_atmospheric_pressure(elevation),
+    }
+    for name, data in layers.items():
+        data = data.astype("float32")
+        data[~np.isfinite(data)] = utils.RASTER_NODATA
+        layers[name] = data
+    return window, layers
+
+
+def derive(
+    dem_path: Path,
+    out_dir: Path | None = None,
+    tile_size: int = TILE_SIZE,
+    workers: int | None = None,
+    cog_profile: str = "dem",
+) -> dict[str, Path]:
+    """
+    Computes the slope, aspect and pressure COGs of a DEM.
+
+    Outputs are written next to the DEM as `<layer>_<dem name>.tif` unless
+    `out_dir` is given, encoded with `cog_profile` (the layers are smooth
+    floats like the DEM itself). Returns the path of each layer.
+    """
+    dem_path = Path(dem_path)
+    out_dir = Path(out_dir or dem_path.parent)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    outputs = {name: out_dir / f"{name}_{dem_path.name}" for name in LAYERS}
+    tmp_paths = {
+        name: path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        for name, path in outputs.items()
+    }
+
+    with rasterio.open(dem_path) as src:
+        profile = {
+            "driver": "GTiff",
+            "width": src.width,
+            "height": src.height,
+            "count": 1,
+            "dtype": "float32",
+            "nodata": utils.RASTER_NODATA,
+            "crs": src.crs,
+            "transform": src.transform,
+            "tiled": True,
+            "blockxsize": utils.COG_BLOCKSIZE,
+            "blockysize": utils.COG_BLOCKSIZE,
+        }
+        tiles = list(_tiles(src.width, src.height, tile_size))
+    workers = max(1, min(workers or settings.PROCESS_WORKERS, len(tiles)))
+    log.info(
+        f"Deriving terrain layers of '{dem_path.name}' "
+        f"({len(tiles)} tiles on {workers} workers)..."
+    )
+
+    dsts = {name: rasterio.open(tmp_paths[name], "w", **profile) for name in LAYERS}
+    stats = {name: qa.QAStats() for name in LAYERS}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for window in tiles:
+                pending.add(pool.submit(_derive_tile, str(dem_path), window))
+                if len(pending) < 2 * workers:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _write_tile(dsts, stats, *future.result())
+            for future in pending:
+                _write_tile(dsts, stats, *future.result())
+        for name, dst in dsts.items():
+            dst.update_tags(1, **stats[name].band_tags())
+    finally:
+        for dst in dsts.values():
+            dst.close()
+
+    try:
+        for name in LAYERS:
+            utils.to_cog(tmp_paths[name], outputs[name], profile=cog_profile)
+    finally:
+        for tmp in tmp_paths.values():
+            tmp.unlink(missing_ok=True)
+    log.info(f"Terrain layers written to '{out_dir}'.")
+    return outputs
+
+
+def _write_tile(dsts: dict, stats: dict, window: Window, layers: dict) -> None:
+    for name, data in layers.items():
+        dsts[name].write(data, 1, window=window)
+        stats[name].update(data, nodata=utils.RASTER_NODATA)
+
+
+def register(
+    outputs: dict[str, Path],
+    version: str,
+    catalog: DataCatalog | None = None,
+) -> dict[str, str]:
+    """
+    Registers terrain layers as `dem_<layer>` artifacts with their footprints;
+    returns the artifact id of each layer.
+    """
+    catalog = catalog or get_catalog()
+    ids = {}
+    for name, path in outputs.items():
+        dataset_name = f"dem_{name}"
+        catalog.register_dataset(
+            name=dataset_name,
+            source="dem",
+            version=version,
+            description=DESCRIPTIONS[name],
+        )
+        artifact_id = catalog.register_artifact(
+            dataset_name=dataset_name,
+            stage="processed",
+            relative_path=str(path.relative_to(settings.DATA_DIR)),
+            file_hash=calculate_sha256(path),
+            file_size_bytes=path.stat().st_size,
+        )
+        register_footprint(artifact_id, dataset_name, path, catalog=catalog)
+        qa.save(artifact_id, qa.read(path), catalog=catalog)
+        ids[name] = str(artifact_id)
+    return ids
+
+
+def update_dem(
+    dem_path: Path,
+    version: str,
+    catalog: DataCatalog | None = None,
+) -> dict[str, str]:
+    """Derives and registers the terrain layers of a processed DEM."""
+    return register(derive(dem_path), version, catalog=catalog)
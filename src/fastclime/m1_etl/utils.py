@@ -1,86 +1,435 @@
 """Utility functions for the ETL pipeline."""
 
 import hashlib
+import math
+import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, Iterator
+from urllib.parse import urlparse
+from xml.etree import ElementTree as ET
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from fastclime.config import settings
 from fastclime.core.logging import get_logger
 import rasterio
+from rasterio import shutil as rio_shutil
+from rasterio.dtypes import dtype_rev, typename_fwd
+from rasterio.io import MemoryFile
 from rasterio.merge import merge
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import (
+    calculate_default_transform,
+    reproject,
+    transform_bounds,
+    Resampling,
+)
+from rasterio.windows import Window, from_bounds
 from shapely.geometry import box
 import geopandas as gpd
 import h5py
-import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+from . import qa, telemetry
+from .cmr import CMRClient
 from .constants import TARGET_CRS
+from .raw_cache import RawCache
+from ..m0_storage.io import HASH_CHUNK_SIZE, calculate_sha256
+from ..m0_storage.lake import PARQUET_COMPRESSION, ROW_GROUP_SIZE
+from ..m0_storage.sync import PART_SUFFIX
+
+COG_BLOCKSIZE = 512
+# Named COG encodings, selected per dataset with `cog_profile` in `DATASETS`.
+# Values were picked with `scripts/bench_cog.py`; options left out fall back
+# to the `COG_COMPRESS`/`COG_PREDICTOR` settings (see `cog_options`).
+COG_PROFILES = {
+    "default": {},
+    # Smooth float elevations: the floating-point predictor pays off, and
+    # ZSTD reads random windows about a third faster than DEFLATE.
+    "dem": {"compress": "ZSTD", "predictor": "FLOATING_POINT", "level": 9},
+    # Noisy float NDVI on a 1e-4 grid with nodata: the floating-point
+    # predictor makes files larger than raw; plain DEFLATE is ~20% smaller.
+    "ndvi": {"compress": "DEFLATE", "predictor": "NO", "level": 6},
+}
+# Nodata of float rasters derived from scaled integer bands.
+RASTER_NODATA = -9999.0
+# How stored integers map to physical values with `scale_factor`/`add_offset`:
+# CF conventions multiply; MODIS HDF-EOS products such as MOD13 vegetation
+# indices divide (NDVI is stored as NDVI * 10000).
+SCALE_CONVENTIONS = {
+    "cf": lambda data, scale, offset: data * scale + offset,
+    "modis": lambda data, scale, offset: (data - offset) / scale,
+}
+# Rows per HDF5 read when a dataset is stored contiguously (unchunked).
+HDF5_SLAB_ROWS = 256
+
+# Bytes buffered per network read; whatever was buffered when a connection
+# drops is lost, so this is kept well below the hashing block size.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# GDAL options for reading COGs in place over HTTP. Only the header and the
+# blocks a read touches are fetched, with adjacent blocks merged into one
+# range request and fetched blocks kept in the VSI cache.
+REMOTE_PREFIX = "/vsicurl/"
+REMOTE_GDAL_OPTIONS = {
+    # Don't list the server directory looking for sidecar files.
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif,.tiff",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_MAX_RETRY": 3,
+    "GDAL_HTTP_RETRY_DELAY": 5,
+    "VSI_CACHE": "TRUE",
+}
 
 log = get_logger(__name__)
 
 
+def make_session(pool_size: int = settings.DOWNLOAD_WORKERS) -> requests.Session:
+    """Returns a requests Session whose connection pool fits `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Client errors other than timeouts/throttling will not go away on retry."""
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        status = e.response.status_code
+        return not (400 <= status < 500) or status in (408, 429)
+    return True
+
+
+def _validator_path(part: Path) -> Path:
+    # Ends in PART_SUFFIX so cache eviction and manifests skip it like the
+    # partial file it describes.
+    return part.with_name(part.name.removesuffix(PART_SUFFIX) + ".etag" + PART_SUFFIX)
+
+
+def _response_validator(r) -> str | None:
+    """The strong ETag of a response, or its Last-Modified date."""
+    etag = r.headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return r.headers.get("last-modified")
+
+
+def _fetch_to_part(
+    url: str,
+    part: Path,
+    http,
+    progress: "_AggregateProgress | None",
+) -> str:
+    """
+    Streams `url` into `part`, resuming from its current size with a Range
+    request. Returns the SHA256 of the complete file, computed as bytes arrive.
+
+    A resume sends `If-Range` with the validator (ETag or Last-Modified) of
+    the response that started the file, so a remote file that has changed
+    since is fetched whole instead of spliced onto the old bytes; partial
+    files without a validator are restarted. The final size is checked
+    against the size the server announced before the file counts as done.
+    """
+    validator_path = _validator_path(part)
+    validator = validator_path.read_text() if validator_path.exists() else None
+    offset = part.stat().st_size if part.exists() and validator else 0
+    sha = hashlib.sha256()
+    if offset:
+        # hashlib state can't be persisted, so the partial bytes are hashed
+        # once here; the bytes still to come are hashed in flight.
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha.update(block)
+
+    headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+    with http.get(url, stream=True, timeout=60, headers=headers) as r:
+        if offset and r.status_code == 416:
+            # Nothing left to fetch if the partial file is already complete.
+            total = r.headers.get("content-range", "").rpartition("/")[2]
+            if total == str(offset):
+                validator_path.unlink()
+                return sha.hexdigest()
+            part.unlink()
+            validator_path.unlink()
+            raise ValueError(f"Stale partial download for {part.name}; restarting.")
+        r.raise_for_status()
+        if offset and r.status_code != 206:
+            log.info(f"'{url}' changed or ignored the Range request; restarting.")
+            offset = 0
+            sha = hashlib.sha256()
+        elif offset:
+            log.info(f"Resuming '{part.name}' at byte {offset}.")
+        remaining = int(r.headers.get("content-length", 0))
+        if r.status_code == 206:
+            total = r.headers.get("content-range", "").rpartition("/")[2]
+            expected_size = int(total) if total.isdigit() else None
+        else:
+            expected_size = remaining if "content-length" in r.headers else None
+            validator = _response_validator(r)
+            if validator:
+                validator_path.write_text(validator)
+            else:
+                validator_path.unlink(missing_ok=True)
+
+        if progress is None:
+            pbar_ctx = tqdm(
+                total=offset + remaining,
+                initial=offset,
+                unit="iB",
+                unit_scale=True,
+                desc=f"Downloading {part.name.removesuffix(PART_SUFFIX)}",
+            )
+        else:
+            progress.add_total(remaining)
+            pbar_ctx = nullcontext(progress)
+
+        with open(part, "ab" if offset else "wb") as f, pbar_ctx as pbar:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                sha.update(chunk)
+                pbar.update(len(chunk))
+    size = part.stat().st_size
+    if expected_size is not None and size != expected_size:
+        # Kept, with its validator, so the retry resumes from here.
+        raise ValueError(
+            f"Incomplete download of {part.name}: {size} of {expected_size} bytes."
+        )
+    validator_path.unlink(missing_ok=True)
+    return sha.hexdigest()
+
+
 def download_file(
-    url: str, dst: Path, expected_sha: str | None = None, retries: int = 3
-):
+    url: str,
+    dst: Path,
+    expected_sha: str | None = None,
+    retries: int = 3,
+    session: requests.Session | None = None,
+    progress: "_AggregateProgress | None" = None,
+    backoff: float = 5.0,
+) -> str:
     """
     Downloads a file with retries, progress bar, and optional SHA256 verification.
     Skips download if a file with the correct SHA already exists.
+
+    Bytes are streamed into `<dst>.part`; a retry (or a later call) resumes it
+    with an HTTP Range request instead of starting over. The hash is updated
+    per chunk and the finished file is moved into place atomically, so `dst`
+    is never left half-written. A shared `session` reuses pooled connections
+    across calls. When a shared `progress` is given, bytes are reported there
+    instead of a per-file bar. Returns the SHA256 of the file.
     """
     dst.parent.mkdir(parents=True, exist_ok=True)
+    http = session or requests
 
     if dst.exists() and expected_sha:
         log.debug(f"File {dst} exists. Verifying SHA...")
-        local_sha = hashlib.sha256(dst.read_bytes()).hexdigest()
+        local_sha = calculate_sha256(dst)
         if local_sha == expected_sha:
             log.info(
                 f"File '{dst.name}' already exists with matching SHA. Skipping download."
             )
-            return
+            return local_sha
         else:
             log.warning(
                 f"File '{dst.name}' exists but SHA is incorrect. Re-downloading."
             )
 
+    part = dst.with_name(dst.name + PART_SUFFIX)
     log.info(f"Downloading '{url}' to '{dst}'...")
     for attempt in range(retries):
         try:
-            with requests.get(url, stream=True, timeout=60) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get("content-length", 0))
-
-                with (
-                    open(dst, "wb") as f,
-                    tqdm(
-                        total=total_size,
-                        unit="iB",
-                        unit_scale=True,
-                        desc=f"Downloading {dst.name}",
-                    ) as pbar,
-                ):
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-
+            local_sha = _fetch_to_part(url, part, http, progress)
+            if expected_sha and local_sha != expected_sha:
+                part.unlink()
+                raise ValueError(
+                    f"SHA mismatch for {dst.name}. Expected {expected_sha}, got {local_sha}"
+                )
+            os.replace(part, dst)
             if expected_sha:
-                local_sha = hashlib.sha256(dst.read_bytes()).hexdigest()
-                if local_sha != expected_sha:
-                    raise ValueError(
-                        f"SHA mismatch for {dst.name}. Expected {expected_sha}, got {local_sha}"
-                    )
-                else:
-                    log.info(f"Successfully downloaded and verified {dst.name}.")
-            return  # Success
+                log.info(f"Successfully downloaded and verified {dst.name}.")
+            return local_sha
         except (requests.exceptions.RequestException, ValueError) as e:
             log.warning(f"Attempt {attempt + 1}/{retries} failed for '{url}': {e}")
-            if attempt + 1 < retries:
-                time.sleep(5 * (2**attempt))  # Exponential backoff
+            if attempt + 1 < retries and _is_retryable(e):
+                time.sleep(backoff * (2**attempt))  # Exponential backoff
             else:
-                log.error(f"Failed to download '{url}' after {retries} attempts.")
+                log.error(f"Failed to download '{url}' after {attempt + 1} attempts.")
                 raise
 
 
+class _AggregateProgress:
+    """A single, thread-safe progress bar shared by concurrent downloads."""
+
+    def __init__(self, n_files: int):
+        self._lock = threading.Lock()
+        self._bar = tqdm(
+            total=0, unit="iB", unit_scale=True, desc=f"Downloading {n_files} files"
+        )
+
+    def add_total(self, n: int):
+        with self._lock:
+            self._bar.total += n
+            self._bar.refresh()
+
+    def update(self, n: int):
+        with self._lock:
+            self._bar.update(n)
+
+    def close(self):
+        self._bar.close()
+
+
+class DownloadManager:
+    """
+    Downloads many files concurrently over one pooled HTTP session.
+
+    A bounded thread pool runs the transfers, a per-host semaphore caps the
+    concurrent requests sent to any single server, and all transfers report
+    to one aggregate progress bar.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = settings.DOWNLOAD_WORKERS,
+        max_per_host: int = settings.DOWNLOAD_MAX_PER_HOST,
+        session: requests.Session | None = None,
+        raw_cache: RawCache | None = None,
+    ):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.session = session or make_session(pool_size=max_workers)
+        self.raw_cache = raw_cache
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+
+    def __enter__(self) -> "DownloadManager":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def download(
+        self,
+        url: str,
+        dst: Path,
+        expected_sha: str | None = None,
+        progress: _AggregateProgress | None = None,
+    ) -> Path:
+        """
+        Downloads one file, honouring the per-host concurrency limit.
+
+        With a `raw_cache`, cached bytes are reused and new downloads are kept
+        in the cache; the returned path then points into the cache, not `dst`.
+        """
+        if self.raw_cache is not None:
+            cached = self.raw_cache.lookup(url, expected_sha)
+            if cached is not None:
+                return cached
+            target = self.raw_cache.staging_path(url, dst.name)
+        else:
+            target = dst
+
+        with self._host_slot(url):
+            sha = download_file(
+                url,
+                target,
+                expected_sha=expected_sha,
+                session=self.session,
+                progress=progress,
+            )
+        if self.raw_cache is not None:
+            return self.raw_cache.add(url, target, sha)
+        return dst
+
+    def iter_downloads(
+        self, jobs: list[tuple[str, Path]], buffer: int | None = None
+    ) -> Iterator[tuple[str, Path | Exception]]:
+        """
+        Downloads `(url, dst)` jobs concurrently, yielding `(url, path)` pairs
+        in completion order; a failed transfer yields its exception instead.
+
+        At most `buffer` finished downloads wait to be consumed. Beyond that
+        the download workers pause, so a slow consumer throttles the network
+        instead of filling the disk. Inside an ETL run each transfer is
+        recorded as a `download_file` stage under the caller's open stage.
+        """
+        if not jobs:
+            return
+        finished = queue.Queue(maxsize=buffer or self.max_workers)
+        progress = _AggregateProgress(len(jobs))
+        # Download threads don't inherit the caller's context.
+        recorder = telemetry.current()
+        parent = recorder.current_stage if recorder else None
+
+        def run(url: str, dst: Path):
+            metric = telemetry.StageMetric("download_file", parent, datetime.now())
+            started = time.perf_counter()
+            try:
+                result = self.download(url, dst, progress=progress)
+            except Exception as e:
+                result = e
+            if recorder is not None and not isinstance(result, Exception):
+                metric.seconds = time.perf_counter() - started
+                metric.add_bytes(result.stat().st_size)
+                recorder.add(metric)
+            finished.put((url, result))
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [pool.submit(run, url, dst) for url, dst in jobs]
+        try:
+            for _ in jobs:
+                yield finished.get()
+        finally:
+            # Unblock workers if the consumer stopped early.
+            pool.shutdown(wait=False, cancel_futures=True)
+            while not all(f.done() for f in futures):
+                try:
+                    finished.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            progress.close()
+
+    def download_many(
+        self, jobs: list[tuple[str, Path]], raise_on_error: bool = False
+    ) -> dict[str, Path | Exception]:
+        """
+        Downloads `(url, dst)` jobs concurrently.
+
+        Returns a mapping from URL to the downloaded path, or to the exception
+        that made it fail. With `raise_on_error`, the first failure is raised
+        once all transfers have finished.
+        """
+        results = dict(self.iter_downloads(jobs, buffer=len(jobs)))
+
+        errors = [r for r in results.values() if isinstance(r, Exception)]
+        if jobs:
+            log.info(f"Downloaded {len(jobs) - len(errors)}/{len(jobs)} files.")
+        if errors and raise_on_error:
+            raise errors[0]
+        return results
+
+
 def merge_rasters(raster_paths: list[Path], out_path: Path):
     """Merges multiple raster files into a single mosaic."""
     log.info(f"Merging {len(raster_paths)} rasters into '{out_path}'...")
@@ -105,11 +454,31 @@ def merge_rasters(raster_paths: list[Path], out_path: Path):
     log.info("Merging complete.")
 
 
+def _thread_count(num_threads: str | int | None) -> int:
+    """Resolves a GDAL-style thread count ("ALL_CPUS" or a number) to an int."""
+    value = num_threads or settings.RASTER_NUM_THREADS
+    if str(value).upper() == "ALL_CPUS":
+        return os.cpu_count() or 1
+    return int(value)
+
+
+@telemetry.timed("reproject")
 def reproject_raster(
-    src: Path, dst: Path, crs: str = TARGET_CRS, bbox: list | None = None
+    src: Path,
+    dst: Path,
+    crs: str = TARGET_CRS,
+    bbox: list | None = None,
+    resampling: Resampling = Resampling.bilinear,
+    num_threads: str | int | None = None,
+    warp_mem_limit: int | None = None,
 ):
     """
     Reprojects a raster to a new CRS and optionally clips it to a bounding box.
+
+    GDAL splits each band into chunks of at most `warp_mem_limit` MB and warps
+    them on `num_threads` threads (defaults: `RASTER_WARP_MEM_MB`,
+    `RASTER_NUM_THREADS`). The thread count never changes the result; with
+    the default memory limit it is identical to a plain single-threaded warp.
     """
     log.info(f"Reprojecting '{src}' to '{dst}' (CRS: {crs}, Bbox: {bbox})...")
     dst.parent.mkdir(parents=True, exist_ok=True)
@@ -165,6 +534,7 @@ def reproject_raster(
             )
 
             with rasterio.open(dst, "w", **kwargs) as dest:
+                # Band by band: a multi-band warp rounds floats differently.
                 for i in range(1, reproj_src.count + 1):
                     reproject(
                         source=rasterio.band(reproj_src, i),
@@ -173,7 +543,9 @@ def reproject_raster(
                         src_crs=reproj_src.crs,
                         dst_transform=transform,
                         dst_crs=crs,
-                        resampling=Resampling.bilinear,
+                        resampling=resampling,
+                        num_threads=_thread_count(num_threads),
+                        warp_mem_limit=warp_mem_limit or settings.RASTER_WARP_MEM_MB,
                     )
 
     # Clean up temporary clipped file if it was created
@@ -183,103 +555,508 @@ def reproject_raster(
     log.info("Reprojection complete.")
 
 
-def to_cog(src: Path, dst: Path):
-    """Converts a GeoTIFF to a Cloud Optimized GeoTIFF (COG)."""
-    log.info(f"Converting '{src}' to COG format at '{dst}'...")
+def remote_path(url: str) -> str:
+    """Returns the GDAL path that reads `url` with HTTP range requests."""
+    return f"{REMOTE_PREFIX}{url}"
+
+
+def is_remote(path: Path | str) -> bool:
+    """Tells whether a raster path is read through a GDAL virtual filesystem."""
+    return str(path).startswith("/vsi")
+
+
+def remote_env(**options) -> rasterio.Env:
+    """Returns a GDAL environment tuned for windowed reads of remote COGs."""
+    return rasterio.Env(**{**REMOTE_GDAL_OPTIONS, **options})
+
+
+def build_vrt(raster_paths: list[Path | str]) -> str:
+    """
+    Returns the XML of a VRT mosaic of rasters sharing CRS, bands and dtype.
+
+    Nothing is read until the mosaic is; where sources overlap the first one
+    wins, as with `rasterio.merge`.
+    """
+    sources = [rasterio.open(p) for p in raster_paths]
+    try:
+        first = sources[0]
+        res_x, res_y = first.res
+        left = min(s.bounds.left for s in sources)
+        top = max(s.bounds.top for s in sources)
+        right = max(s.bounds.right for s in sources)
+        bottom = min(s.bounds.bottom for s in sources)
+
+        root = ET.Element(
+            "VRTDataset",
+            rasterXSize=str(math.ceil(round((right - left) / res_x, 6))),
+            rasterYSize=str(math.ceil(round((top - bottom) / res_y, 6))),
+        )
+        ET.SubElement(root, "SRS").text = first.crs.to_wkt()
+        ET.SubElement(root, "GeoTransform").text = (
+            f"{left!r}, {res_x!r}, 0.0, {top!r}, 0.0, {-res_y!r}"
+        )
+        for band in range(1, first.count + 1):
+            vrt_band = ET.SubElement(
+                root,
+                "VRTRasterBand",
+                dataType=typename_fwd[dtype_rev[first.dtypes[band - 1]]],
+                band=str(band),
+            )
+            if first.nodata is not None:
+                ET.SubElement(vrt_band, "NoDataValue").text = repr(first.nodata)
+            # Later sources are drawn on top, so the first raster goes last.
+            for src in reversed(sources):
+                source = ET.SubElement(vrt_band, "ComplexSource")
+                ET.SubElement(source, "SourceFilename", relativeToVRT="0").text = (
+                    src.name if is_remote(src.name) else str(Path(src.name).resolve())
+                )
+                ET.SubElement(source, "SourceBand").text = str(band)
+                ET.SubElement(
+                    source,
+                    "SrcRect",
+                    xOff="0",
+                    yOff="0",
+                    xSize=str(src.width),
+                    ySize=str(src.height),
+                )
+                ET.SubElement(
+                    source,
+                    "DstRect",
+                    xOff=repr((src.bounds.left - left) / res_x),
+                    yOff=repr((top - src.bounds.top) / res_y),
+                    xSize=repr(src.width * src.res[0] / res_x),
+                    ySize=repr(src.height * src.res[1] / res_y),
+                )
+                if src.nodata is not None:
+                    ET.SubElement(source, "NODATA").text = repr(src.nodata)
+    finally:
+        for src in sources:
+            src.close()
+    return ET.tostring(root, encoding="unicode")
+
+
+def _bbox_window(dataset, bbox: list[float]) -> Window:
+    """Returns the pixel window of `dataset` covering a lon/lat bbox."""
+    window = from_bounds(
+        *transform_bounds(TARGET_CRS, dataset.crs, *bbox), transform=dataset.transform
+    )
+    # Round away from the bbox so partially covered pixels are kept.
+    col_start = math.floor(round(window.col_off, 6))
+    row_start = math.floor(round(window.row_off, 6))
+    col_end = math.ceil(round(window.col_off + window.width, 6))
+    row_end = math.ceil(round(window.row_off + window.height, 6))
+    return Window(
+        col_start, row_start, col_end - col_start, row_end - row_start
+    ).intersection(Window(0, 0, dataset.width, dataset.height))
+
+
+@telemetry.timed("mosaic_cog")
+def mosaic_to_cog(
+    raster_paths: list[Path | str],
+    dst: Path,
+    crs: str = TARGET_CRS,
+    bbox: list[float] | None = None,
+    resampling: Resampling = Resampling.bilinear,
+    **cog_options,
+) -> Path:
+    """
+    Mosaics, clips, reprojects and writes rasters to a COG in a single pass.
+
+    The mosaic is a VRT held in memory and the reprojection a WarpedVRT over
+    the bbox window, so GDAL reads, warps and writes block by block: no
+    intermediate rasters are written and peak memory depends on the block
+    size, not on the size of the bbox. Remote paths (see `remote_path`) are
+    read in place, fetching only the blocks inside the bbox window.
+    `cog_options` are passed on to `write_cog`.
+    """
+    log.info(
+        f"Building COG '{dst}' from {len(raster_paths)} rasters "
+        f"(CRS: {crs}, Bbox: {bbox})..."
+    )
+    remote = any(is_remote(p) for p in raster_paths)
+    with (
+        remote_env() if remote else nullcontext(),
+        MemoryFile(build_vrt(raster_paths).encode(), ext=".vrt") as memfile,
+    ):
+        with memfile.open() as mosaic:
+            window = (
+                _bbox_window(mosaic, bbox)
+                if bbox
+                else Window(0, 0, mosaic.width, mosaic.height)
+            )
+            transform, width, height = calculate_default_transform(
+                mosaic.crs,
+                crs,
+                int(window.width),
+                int(window.height),
+                *mosaic.window_bounds(window),
+            )
+            with WarpedVRT(
+                mosaic,
+                crs=crs,
+                transform=transform,
+                width=width,
+                height=height,
+                resampling=resampling,
+            ) as warped:
+                write_cog(warped, dst, **cog_options)
+
+    log.info("COG mosaic complete.")
+    return dst
+
+
+def cog_options(profile: str | None = None, **overrides) -> dict:
+    """
+    Resolves the encoding options of a named COG profile (see `COG_PROFILES`).
+
+    Options the profile leaves out come from the `COG_COMPRESS` and
+    `COG_PREDICTOR` settings; non-None `overrides` win over both.
+    """
+    if profile is not None and profile not in COG_PROFILES:
+        raise ValueError(
+            f"COG profile '{profile}' not recognized. "
+            f"Available profiles: {list(COG_PROFILES)}"
+        )
+    options = {
+        "compress": settings.COG_COMPRESS,
+        "predictor": settings.COG_PREDICTOR,
+        "blocksize": COG_BLOCKSIZE,
+        "level": None,
+        "overview_resampling": "AVERAGE",
+        **COG_PROFILES.get(profile, {}),
+    }
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
+
+
+def write_cog(
+    dataset,
+    dst: Path,
+    compress: str | None = None,
+    predictor: str | int | None = None,
+    num_threads: str | int | None = None,
+    blocksize: int | None = None,
+    level: int | None = None,
+    overview_resampling: str | None = None,
+    profile: str | None = None,
+) -> Path:
+    """
+    Writes an open dataset as a COG.
+
+    GDAL's COG driver copies the source block by block (CreateCopy) through a
+    block cache of `settings.RASTER_CACHE_MB`, so memory use is bounded no
+    matter how large the raster is. Compression and overview generation run
+    on `num_threads` threads (default `RASTER_NUM_THREADS`). The encoding
+    comes from the named `profile` (see `cog_options`); explicit arguments
+    override it. Band tags of the source, such as QA statistics (see
+    `m1_etl.qa`), are copied along.
+    """
+    options = cog_options(
+        profile,
+        compress=compress,
+        predictor=predictor,
+        blocksize=blocksize,
+        level=level,
+        overview_resampling=overview_resampling,
+    )
+    if options["level"] is None:
+        del options["level"]
+    options["predictor"] = str(options["predictor"])
     dst.parent.mkdir(parents=True, exist_ok=True)
+    with rasterio.Env(GDAL_CACHEMAX=settings.RASTER_CACHE_MB):
+        rio_shutil.copy(
+            dataset,
+            dst,
+            driver="COG",
+            num_threads=str(num_threads or settings.RASTER_NUM_THREADS),
+            bigtiff="IF_SAFER",
+            **options,
+        )
+    return dst
+
+
+@telemetry.timed("cog")
+def to_cog(
+    src: Path,
+    dst: Path,
+    compress: str | None = None,
+    predictor: str | int | None = None,
+    num_threads: str | int | None = None,
+    profile: str | None = None,
+) -> Path:
+    """
+    Converts a GeoTIFF to a Cloud Optimized GeoTIFF (COG), block by block.
+    QA statistics tagged on the source are kept.
+    """
+    log.info(f"Converting '{src}' to COG format at '{dst}'...")
 
     with rasterio.open(src, "r") as src_dataset:
-        profile = src_dataset.profile.copy()
-        profile.update(
-            {
-                "driver": "COG",
-                "compress": "LZW",
-                "blocksize": 512,
-            }
+        write_cog(
+            src_dataset,
+            dst,
+            compress=compress,
+            predictor=predictor,
+            num_threads=num_threads,
+            profile=profile,
         )
-        overview_level = 6
-        overviews = [2**j for j in range(1, overview_level + 1)]
-
-        with rasterio.open(dst, "w", **profile) as dst_dataset:
-            dst_dataset.write(src_dataset.read())
-            dst_dataset.build_overviews(overviews, Resampling.average)
 
     log.info("COG conversion complete.")
+    return dst
+
 
+def _subdataset(src: Path, index: int) -> str:
+    """Returns the GDAL name of a subdataset, or `src` if it has none."""
+    with rasterio.open(src) as container:
+        subdatasets = container.subdatasets
+    return subdatasets[index] if subdatasets else str(src)
 
-def hdf4_to_geotiff(src: Path, dst: Path, subdataset_index: int):
+
+def _scaling(band) -> tuple[float, float, float | None, tuple[float, float] | None]:
+    """Reads (scale, offset, fill, valid_range) from HDF-EOS band metadata."""
+    # GDAL's HDF4 driver reports attributes on the dataset, GeoTIFF on the band.
+    tags = {**band.tags(), **band.tags(1)}
+    scale = float(tags.get("scale_factor", 1.0))
+    offset = float(tags.get("add_offset", 0.0))
+    fill = band.nodata
+    if fill is None and "_FillValue" in tags:
+        fill = float(tags["_FillValue"])
+    valid_range = None
+    if "valid_range" in tags:
+        low, high = (float(v) for v in tags["valid_range"].split(","))
+        valid_range = (low, high)
+    return scale, offset, fill, valid_range
+
+
+@telemetry.timed("hdf4_to_geotiff")
+def hdf4_to_geotiff(
+    src: Path,
+    dst: Path,
+    subdataset_index: int,
+    apply_scale: bool = True,
+    scale_convention: str = "cf",
+) -> Path:
     """
     Extracts a specific subdataset from an HDF4 file and saves it as a GeoTIFF.
+
+    With `apply_scale`, values are converted to physical units as float32
+    using the band's `scale_factor`/`add_offset` and `scale_convention` (see
+    `SCALE_CONVENTIONS`), and fill or out-of-range values become
+    `RASTER_NODATA`. The band is copied block by block, and QA statistics of
+    the written blocks are stored in the band's tags.
     """
+    if scale_convention not in SCALE_CONVENTIONS:
+        raise ValueError(
+            f"Scale convention '{scale_convention}' not recognized. "
+            f"Available conventions: {list(SCALE_CONVENTIONS)}"
+        )
+    unscale = SCALE_CONVENTIONS[scale_convention]
     log.info(
         f"Extracting subdataset index {subdataset_index} from HDF4 '{src}' to '{dst}'..."
     )
     dst.parent.mkdir(parents=True, exist_ok=True)
 
-    with rasterio.open(f"HDF4_EOS:EOS_GRID:{src}:{subdataset_index}") as band:
+    with rasterio.open(_subdataset(src, subdataset_index)) as band:
         meta = band.meta
-        meta["driver"] = "GTiff"
+        meta.update({"driver": "GTiff", "count": 1, "tiled": True})
+        if apply_scale:
+            scale, offset, fill, valid_range = _scaling(band)
+            meta.update({"dtype": "float32", "nodata": RASTER_NODATA})
+        stats = qa.QAStats()
         with rasterio.open(dst, "w", **meta) as dst_dataset:
-            dst_dataset.write(band.read(1))
+            for _, window in band.block_windows(1):
+                data = band.read(1, window=window)
+                if apply_scale:
+                    invalid = np.zeros(data.shape, dtype=bool)
+                    if fill is not None:
+                        invalid |= data == fill
+                    if valid_range:
+                        invalid |= (data < valid_range[0]) | (data > valid_range[1])
+                    data = unscale(data, scale, offset).astype("float32")
+                    data[invalid] = RASTER_NODATA
+                dst_dataset.write(data, 1, window=window)
+                stats.update(data, nodata=meta.get("nodata"))
+            dst_dataset.update_tags(1, **stats.band_tags())
     log.info("HDF4 to GeoTIFF conversion complete.")
+    return dst
+
+
+def _slabs(start: int, stop: int, step: int):
+    """Yields [a, b) ranges covering [start, stop), aligned to multiples of step."""
+    for a in range(start - start % step, stop, step):
+        yield max(a, start), min(a + step, stop)
 
 
-def hdf5_to_parquet(src: Path, dst: Path, var_name: str):
+def _bbox_extent(lat, lon, bbox: list[float], step: int) -> tuple[slice, slice] | None:
+    """
+    Finds the rows and columns whose cell centres fall inside a lon/lat bbox.
+
+    The lat/lon arrays are scanned in row slabs, so memory is bounded by the
+    slab size. Fill values (e.g. -9999) never match a valid bbox.
     """
-    Extracts a variable from an HDF5 file, handles fill values, and saves as Parquet.
+    min_lon, min_lat, max_lon, max_lat = bbox
+    rows = np.zeros(lat.shape[0], dtype=bool)
+    cols = np.zeros(lat.shape[1], dtype=bool)
+    for a, b in _slabs(0, lat.shape[0], step):
+        inside = (
+            (lat[a:b] >= min_lat)
+            & (lat[a:b] <= max_lat)
+            & (lon[a:b] >= min_lon)
+            & (lon[a:b] <= max_lon)
+        )
+        rows[a:b] |= inside.any(axis=1)
+        cols |= inside.any(axis=0)
+    if not rows.any():
+        return None
+    row_idx, col_idx = np.flatnonzero(rows), np.flatnonzero(cols)
+    return (
+        slice(row_idx[0], row_idx[-1] + 1),
+        slice(col_idx[0], col_idx[-1] + 1),
+    )
+
+
+def _write_row_groups(writer, tables: list, final: bool = False):
+    """
+    Writes the buffered tables as whole `ROW_GROUP_SIZE` row groups and
+    returns the rows left over, or writes everything if `final`.
+    """
+    table = pa.concat_tables(tables)
+    full = (
+        table.num_rows if final else table.num_rows // ROW_GROUP_SIZE * ROW_GROUP_SIZE
+    )
+    writer.write_table(table.slice(0, full), row_group_size=ROW_GROUP_SIZE)
+    return table.slice(full)
+
+
+@telemetry.timed("hdf5_to_parquet")
+def hdf5_to_parquet(
+    src: Path,
+    dst: Path,
+    var_name: str,
+    bbox: list[float] | None = None,
+    date=None,
+    lat_name: str | None = None,
+    lon_name: str | None = None,
+    on_cells: Callable[..., None] | None = None,
+) -> int:
+    """
+    Extracts a gridded variable from an HDF5 file into a Parquet table of
+    `(date, lat, lon, row, col, value)`, optionally limited to a lon/lat bbox.
+
+    The latitude/longitude arrays default to the `latitude`/`longitude`
+    datasets next to the variable (the SMAP EASE-grid layout). Data is read in
+    chunk-aligned row slabs of the bbox's rows and columns only, fill values
+    are dropped, and rows are streamed into ZSTD row groups of
+    `ROW_GROUP_SIZE` rows, so memory scales with the bbox slab and one row
+    group and not with the global grid. `row`/`col` are grid indices,
+    which together with `lat`/`lon` make the output joinable to parcels.
+    QA statistics of the values in the bbox, fill included, are stored in
+    the file's metadata. `on_cells`, if given, is called with the
+    `row, col, value, lat, lon` arrays of each slab's written cells, so
+    callers can reuse them without reading the file back. Returns the number
+    of rows written.
     """
     log.info(f"Extracting variable '{var_name}' from HDF5 '{src}' to '{dst}'...")
     dst.parent.mkdir(parents=True, exist_ok=True)
+    group = var_name.rpartition("/")[0]
+    lat_name = lat_name or f"{group}/latitude".lstrip("/")
+    lon_name = lon_name or f"{group}/longitude".lstrip("/")
 
-    with h5py.File(src, "r") as hf:
-        dataset = hf[var_name]
-        data = dataset[:]
+    schema = pa.schema(
+        [
+            ("date", pa.date32()),
+            ("lat", pa.float32()),
+            ("lon", pa.float32()),
+            ("row", pa.int32()),
+            ("col", pa.int32()),
+            ("value", pa.float32()),
+        ]
+    )
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    written = 0
+    stats = qa.QAStats()
 
-        # Handle fill values, which are common in NASA datasets
+    with h5py.File(src, "r") as hf:
+        dataset, lat, lon = hf[var_name], hf[lat_name], hf[lon_name]
+        step = (dataset.chunks or (HDF5_SLAB_ROWS,))[0]
         fill_value = dataset.attrs.get("_FillValue")
-        if fill_value is not None:
-            data = np.where(data == fill_value, np.nan, data)
 
-        # For simplicity, we flatten the 2D array and save it as a single column.
-        # A more advanced implementation could preserve lat/lon.
-        flat_data = data.flatten()
-        df = pd.DataFrame({"value": flat_data})
-        df.dropna(inplace=True)
+        if bbox:
+            extent = _bbox_extent(lat, lon, bbox, step)
+        else:
+            extent = (slice(0, dataset.shape[0]), slice(0, dataset.shape[1]))
+        if extent is None:
+            log.warning(f"No cells of '{src.name}' fall inside the bbox {bbox}.")
+            extent = (slice(0, 0), slice(0, 0))
+        rows, cols = extent
+
+        try:
+            with pq.ParquetWriter(
+                tmp, schema, compression=PARQUET_COMPRESSION
+            ) as writer:
+                # Slabs hold far fewer rows than a row group; they are
+                # buffered and written in full ROW_GROUP_SIZE groups.
+                pending, pending_rows = [], 0
+                for a, b in _slabs(rows.start, rows.stop, step):
+                    values = dataset[a:b, cols]
+                    lats, lons = lat[a:b, cols], lon[a:b, cols]
+                    # Handle fill values, which are common in NASA datasets
+                    inside = np.ones(values.shape, dtype=bool)
+                    if bbox:
+                        min_lon, min_lat, max_lon, max_lat = bbox
+                        inside &= (lats >= min_lat) & (lats <= max_lat)
+                        inside &= (lons >= min_lon) & (lons <= max_lon)
+                    stats.update(values[inside], nodata=fill_value)
+                    valid = inside & np.isfinite(values)
+                    if fill_value is not None:
+                        valid &= values != fill_value
+                    r, c = np.nonzero(valid)
+                    if not len(r):
+                        continue
+                    cells = {
+                        "lat": lats[r, c].astype("float32"),
+                        "lon": lons[r, c].astype("float32"),
+                        "row": (r + a).astype("int32"),
+                        "col": (c + cols.start).astype("int32"),
+                        "value": values[r, c].astype("float32"),
+                    }
+                    if on_cells is not None:
+                        on_cells(
+                            *(cells[k] for k in ("row", "col", "value", "lat", "lon"))
+                        )
+                    pending.append(
+                        pa.table(
+                            {"date": pa.array([date] * len(r), pa.date32()), **cells},
+                            schema=schema,
+                        )
+                    )
+                    pending_rows += len(r)
+                    written += len(r)
+                    if pending_rows >= ROW_GROUP_SIZE:
+                        pending = [_write_row_groups(writer, pending)]
+                        pending_rows = pending[0].num_rows
+                if pending_rows:
+                    _write_row_groups(writer, pending, final=True)
+                writer.add_key_value_metadata(qa.parquet_metadata({"value": stats}))
+            os.replace(tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
 
-        df.to_parquet(dst)
-    log.info("HDF5 to Parquet conversion complete.")
+    log.info(f"HDF5 to Parquet conversion complete: {written} cells.")
+    return written
 
 
+@telemetry.timed("search")
 def search_nasa_cmr(
     short_name: str, version: str, temporal_range: tuple[str, str], bbox: list[float]
 ) -> list[str]:
     """
     Searches the NASA CMR for data granules and returns their download URLs.
+
+    Results are paginated and cached on disk; see `m1_etl.cmr.CMRClient`.
     """
-    cmr_url = "https://cmr.earthdata.nasa.gov/search/granules.json"
-    params = {
-        "short_name": short_name,
-        "version": version,
-        "temporal": f"{temporal_range[0]},{temporal_range[1]}",
-        "bounding_box": ",".join(map(str, bbox)),
-        "page_size": 200,  # Max allowed page size
-    }
-    log.info(f"Searching CMR with params: {params}")
-
-    response = requests.get(cmr_url, params=params)
-    response.raise_for_status()
-    data = response.json()
-
-    urls = []
-    if "feed" in data and "entry" in data["feed"]:
-        for entry in data["feed"]["entry"]:
-            # Find the download link, usually of type 'GET DATA' via HTTPS
-            for link in entry.get("links", []):
-                if link.get("rel", "").endswith("#data") and "https" in link.get(
-                    "href", ""
-                ):
-                    urls.append(link["href"])
-                    break
+    with CMRClient() as client:
+        granules = client.search(short_name, version, temporal_range, bbox)
+    urls = [g["url"] for g in granules if g["url"]]
 
     if not urls:
         log.warning(f"No granules found for {short_name} with the given parameters.")
@@ -0,0 +1,283 @@
+"""
+Per-parcel zonal statistics over processed rasters.
+
+Parcel polygons are rasterized once per raster grid into a label raster
+(label `i + 1` for the i-th parcel, 0 outside every parcel), cached under
+`tmp/zonal/` together with the label -> parcel mapping. Statistics for a new
+raster on the same grid are then a single pass over its blocks: the mean,
+min, max and pixel count of every parcel are accumulated with `bincount`
+and `reduceat`, so the cost depends on the number of pixels, not on the
+number of parcels. Results are bulk-inserted into `plant_ndvi_daily`.
+
+Parcels must have both a `parcel_id` and a `zone_id`: `m3_ml.datasets`
+joins the NDVI to `metrics_hourly` on (date, parcel_id, zone_id), so a
+guessed zone would silently drop every row from the training data.
+"""
+
+import hashlib
+import json
+import math
+import os
+from datetime import date
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import rasterio.errors
+from rasterio import features
+from rasterio.windows import Window, from_bounds
+
+from fastclime.config import settings
+from fastclime.core.logging import get_logger
+from ..m0_storage.cache import CacheManager
+from ..m0_storage.catalog import DataCatalog, get_catalog
+from ..m0_storage.io import calculate_sha256
+
+log = get_logger(__name__)
+
+LABEL_DTYPE = "uint32"
+LABEL_BLOCKSIZE = 512
+ZONAL_TABLE = "plant_ndvi_daily"
+# Columns a parcels file needs; together they are the join key of `m3_ml`.
+PARCEL_COLUMNS = ("parcel_id", "zone_id")
+
+
+def _init_tables(con):
+    """Creates the NDVI zonal table, adding the stats columns if it predates them."""
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {ZONAL_TABLE} (
+            date DATE,
+            parcel_id TEXT,
+            zone_id TEXT,
+            ndvi DOUBLE
+        );
+    """
+    )
+    for column, kind in (
+        ("ndvi_min", "DOUBLE"),
+        ("ndvi_max", "DOUBLE"),
+        ("pixel_count", "BIGINT"),
+    ):
+        con.execute(
+            f"ALTER TABLE {ZONAL_TABLE} ADD COLUMN IF NOT EXISTS {column} {kind}"
+        )
+
+
+def _grid_key(parcels_hash: str, dataset) -> str:
+    """Identifies a parcels file rasterized on the grid of `dataset`."""
+    grid = json.dumps(
+        [parcels_hash, dataset.crs.to_wkt(), list(dataset.transform)[:6]]
+        + [dataset.width, dataset.height]
+    )
+    return hashlib.sha256(grid.encode()).hexdigest()[:16]
+
+
+def _parcel_window(dataset, bounds) -> Window | None:
+    """Returns the whole-pixel window of `dataset` covering `bounds`."""
+    window = from_bounds(*bounds, transform=dataset.transform)
+    col_start = math.floor(round(window.col_off, 6))
+    row_start = math.floor(round(window.row_off, 6))
+    col_end = math.ceil(round(window.col_off + window.width, 6))
+    row_end = math.ceil(round(window.row_off + window.height, 6))
+    window = Window(col_start, row_start, col_end - col_start, row_end - row_start)
+    try:
+        return window.intersection(Window(0, 0, dataset.width, dataset.height))
+    except rasterio.errors.WindowError:
+        return None
+
+
+class LabelGrid:
+    """Parcels rasterized onto the grid of a raster, cached on disk."""
+
+    def __init__(
+        self,
+        parcels_path: Path,
+        cache_dir: Path | None = None,
+    ):
+        self.parcels_path = Path(parcels_path)
+        self.cache_dir = Path(cache_dir or settings.DIR_TMP / "zonal")
+        self._parcels_hash = calculate_sha256(self.parcels_path)
+
+    def load(self, dataset) -> tuple[Path | None, pd.DataFrame]:
+        """
+        Returns the label raster and label table for the grid of `dataset`.
+
+        The label raster only covers the window of `dataset` that contains
+        parcels; it is None when no parcel overlaps the raster.
+        """
+        key = _grid_key(self._parcels_hash, dataset)
+        labels_path = self.cache_dir / f"{key}.tif"
+        table_path = self.cache_dir / f"{key}.parquet"
+        # The table is written last, so its presence marks a complete entry.
+        if table_path.is_file() and labels_path.is_file():
+            return labels_path, pd.read_parquet(table_path)
+
+        log.info(f"Rasterizing parcels '{self.parcels_path.name}' (grid {key})...")
+        parcels = gpd.read_file(self.parcels_path).to_crs(dataset.crs)
+        missing = [c for c in PARCEL_COLUMNS if c not in parcels.columns]
+        if missing:
+            raise ValueError(
+                f"Parcels file '{self.parcels_path}' is missing {missing}. "
+                f"Available columns: {list(parcels.columns)}"
+            )
+        table = pd.DataFrame(
+            {
+                "label": np.arange(1, len(parcels) + 1, dtype=LABEL_DTYPE),
+                "parcel_id": parcels["parcel_id"].astype(str).to_numpy(),
+                "zone_id": parcels["zone_id"].astype(str).to_numpy(),
+            }
+        )
+
+        window = _parcel_window(dataset, parcels.total_bounds)
+        if window is None:
+            return None, table
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        transform = dataset.window_transform(window)
+        shape = (int(window.height), int(window.width))
+        labels = features.rasterize(
+            zip(parcels.geometry, table["label"].tolist()),
+            out_shape=shape,
+            transform=transform,
+            fill=0,
+            dtype=LABEL_DTYPE,
+        )
+        tmp = labels_path.with_name(f".{labels_path.name}.{os.getpid()}.tmp")
+        with rasterio.open(
+            tmp,
+            "w",
+            driver="GTiff",
+            width=shape[1],
+            height=shape[0],
+            count=1,
+            dtype=LABEL_DTYPE,
+            crs=dataset.crs,
+            transform=transform,
+            tiled=True,
+            blockxsize=LABEL_BLOCKSIZE,
+            blockysize=LABEL_BLOCKSIZE,
+            compress="DEFLATE",
+        ) as dst:
+            dst.write(labels, 1)
+        os.replace(tmp, labels_path)
+        table.to_parquet(table_path, index=False)
+        return labels_path, table
+
+
+def zonal_stats(raster_path: Path, grid: LabelGrid) -> pd.DataFrame:
+    """
+    Computes mean/min/max/count of band 1 for every parcel of `grid`.
+
+    Nodata and non-finite pixels are ignored; parcels without a valid pixel
+    are left out of the result.
+    """
+    columns = ["parcel_id", "zone_id", "mean", "min", "max", "count"]
+    with rasterio.open(raster_path) as src:
+        labels_path, table = grid.load(src)
+        if labels_path is None:
+            return pd.DataFrame(columns=columns)
+
+        n = len(table) + 1
+        count = np.zeros(n, dtype=np.int64)
+        total = np.zeros(n, dtype=np.float64)
+        low = np.full(n, np.inf)
+        high = np.full(n, -np.inf)
+
+        with rasterio.open(labels_path) as label_ds:
+            col_off, row_off = ~src.transform * (
+                label_ds.transform.c,
+                label_ds.transform.f,
+            )
+            col_off, row_off = round(col_off), round(row_off)
+            for _, block in label_ds.block_windows(1):
+                labels = label_ds.read(1, window=block)
+                values = src.read(
+                    1,
+                    window=Window(
+                        block.col_off + col_off,
+                        block.row_off + row_off,
+                        block.width,
+                        block.height,
+                    ),
+                )
+                valid = (labels > 0) & np.isfinite(values)
+                if src.nodata is not None:
+                    valid &= values != src.nodata
+                lab = labels[valid]
+                if not lab.size:
+                    continue
+                val = values[valid].astype(np.float64)
+
+                count += np.bincount(lab, minlength=n)
+                total += np.bincount(lab, weights=val, minlength=n)
+                order = np.argsort(lab, kind="stable")
+                lab, val = lab[order], val[order]
+                starts = np.flatnonzero(np.r_[True, lab[1:] != lab[:-1]])
+                ids = lab[starts]
+                low[ids] = np.minimum(low[ids], np.minimum.reduceat(val, starts))
+                high[ids] = np.maximum(high[ids], np.maximum.reduceat(val, starts))
+
+    hit = np.flatnonzero(count[1:]) + 1
+    rows = table.iloc[hit - 1]
+    return pd.DataFrame(
+        {
+            "parcel_id": rows["parcel_id"].to_numpy(),
+            "zone_id": rows["zone_id"].to_numpy(),
+            "mean": total[hit] / count[hit],
+            "min": low[hit],
+            "max": high[hit],
+            "count": count[hit],
+        },
+        columns=columns,
+    )
+
+
+def update_ndvi(
+    raster_path: Path,
+    day: date,
+    parcels_path: Path | None = None,
+    catalog: DataCatalog | None = None,
+) -> int:
+    """
+    Writes the per-parcel NDVI of a raster into `plant_ndvi_daily`.
+
+    Rows of the same date and parcel are replaced, so reprocessing a raster
+    is idempotent. New label rasters count against the `tmp/` cache quota.
+    Returns the number of parcels written.
+    """
+    parcels_path = parcels_path or settings.PARCELS_PATH
+    if parcels_path is None:
+        raise ValueError("No parcels file given and FASTCLIME_PARCELS_PATH is unset.")
+    stats = zonal_stats(Path(raster_path), LabelGrid(parcels_path))
+    stats.insert(0, "date", pd.Timestamp(day))
+
+    catalog = catalog or get_catalog()
+    with catalog.get_connection() as con:
+        _init_tables(con)
+        con.register("stats", stats)
+        con.execute("BEGIN TRANSACTION")
+        con.execute(
+            f"""
+            DELETE FROM {ZONAL_TABLE} USING stats
+            WHERE {ZONAL_TABLE}.date = ?
+              AND {ZONAL_TABLE}.parcel_id = stats.parcel_id
+              AND {ZONAL_TABLE}.zone_id = stats.zone_id
+            """,
+            (day,),
+        )
+        con.execute(
+            f"""
+            INSERT INTO {ZONAL_TABLE}
+                (date, parcel_id, zone_id, ndvi, ndvi_min, ndvi_max, pixel_count)
+            SELECT date::DATE, parcel_id, zone_id, mean, min, max, count FROM stats
+            """
+        )
+        con.execute("COMMIT")
+        con.unregister("stats")
+    CacheManager(catalog).enforce_quota(("tmp",))
+
+    log.info(f"Wrote NDVI of {len(stats)} parcels for {day} to '{ZONAL_TABLE}'.")
+    return len(stats)
@@ -78,6 +78,11 @@ def get_delta_saturation_vapor_pressure(temp_c: float) -> float:
     return numerator / denominator
 
 
+def get_atmospheric_pressure(elevation_m: float) -> float:
+    """Eq. 7: Atmospheric pressure (P) in kPa at an elevation above sea level."""
+    return 101.3 * ((293 - 0.0065 * elevation_m) / 293) ** 5.26
+
+
 def get_psychrometric_constant(atmospheric_pressure_kpa: float) -> float:
     """Eq. 8: Psychrometric constant (gamma) in kPa/C."""
     return 0.000665 * atmospheric_pressure_kpa
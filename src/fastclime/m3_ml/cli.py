@@ -1,7 +1,5 @@
 import json
 import typer
-from .train import train_one, train_all
-from .serve import predict_batch
 from pathlib import Path
 from typing import Optional
 from fastclime.m0_storage.catalog import DataCatalog, get_catalog
@@ -25,6 +23,9 @@ def train(
     db_path: Optional[Path] = typer.Option(None, help="Path to the DuckDB database."),
 ):
     """Train a specified ML model."""
+    # Imported here: lightgbm takes a second to load, even for `--help`.
+    from .train import train_one, train_all
+
     catalog = DataCatalog(db_path) if db_path else get_catalog()
     kwargs = {"catalog": catalog}
     if n_estimators:
@@ -43,6 +44,8 @@ def train(
 
 @app.command()
 def batch(model: str, csv_in: Path, csv_out: Path, db_path: Optional[Path] = typer.Option(None, help="Path to the DuckDB database.")):
+    from .serve import predict_batch
+
     catalog = DataCatalog(db_path) if db_path else get_catalog()
     predict_batch(model, csv_in, csv_out, catalog=catalog)
     typer.echo(f"Saved predictions -> {csv_out}")
@@ -1,7 +1,7 @@
-import duckdb
 import pandas as pd
 from .const import TARGETS
-from fastclime.m0_storage import DATA_DIR
+from fastclime.m0_storage import DATA_DIR, lake
+from fastclime.m0_storage.catalog import DataCatalog
 
 
 from pathlib import Path
@@ -12,14 +12,19 @@ def load_hourly_metrics(
     limit_years: int | None = None, db_path: Optional[Path] = None
 ) -> pd.DataFrame:
     """JOIN metrics_hourly + plant_ndvi_daily en una tabla diaria."""
-    con = duckdb.connect(":memory:")
-    con.execute("INSTALL spatial; LOAD spatial;")  # si usas extensiones
-
     if db_path is None:
         db_path = DATA_DIR / "catalog.db"
 
     print(f"Loading data from {db_path}")
-    con.execute(f"ATTACH '{db_path}';")
+    # Lee de los snapshots Parquet del catálogo: no bloquea ni espera a los
+    # procesos que están escribiendo (ingest, model run).
+    con = DataCatalog(db_path).read_connection(
+        tables=("metrics_hourly", "plant_ndvi_daily")
+    )
+    # `storage lake export --delete` saca las horas antiguas del catálogo;
+    # se leen también del lago para no perderlas.
+    lake.include_exported(con, "metrics_hourly", time_column="ts")
+    con.execute("INSTALL spatial; LOAD spatial;")  # si usas extensiones
     base = """
         SELECT date_trunc('day', ts) AS date,
                parcel_id, zone_id,
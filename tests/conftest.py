@@ -9,6 +9,7 @@ from fastclime.config import settings
 from fastclime.m0_storage.catalog import DataCatalog
 from fastclime.m3_ml.train import _ensure_tables
 
+
 @pytest.fixture(scope="function")
 def mock_etl_env(tmp_path: Path, monkeypatch, db_path):
     """
@@ -67,10 +68,121 @@ def db_path(tmp_path_factory) -> pathlib.Path:
     """Ruta temporal para la base DuckDB usada en integración."""
     return tmp_path_factory.mktemp("db") / "catalog.db"
 
+
 @pytest.fixture(scope="session", autouse=True)
 def bootstrap_catalog(db_path):
     import fastclime.m0_storage.catalog as cat_mod
+
     con = duckdb.connect(str(db_path))
     _ensure_tables(con)
     con.close()
     cat_mod._CATALOG_SINGLETON = cat_mod.DataCatalog(db_path)
+
+
+@pytest.fixture
+def http_server(tmp_path_factory):
+    """
+    Serves a temporary directory over HTTP on localhost.
+
+    Yields a dict with the served `root`, the `url` prefix and `stats`, which
+    records the number of requests and the peak number of concurrent ones.
+    `Range: bytes=N-` and `bytes=N-M` requests are answered with 206 and
+    logged in `stats["ranges"]`, and `stats["bytes_sent"]` counts the body
+    bytes written; `stats["truncate"][name] = n` drops the connection
+    after `n` bytes of the next response for `name`, and
+    `stats["delays"][name]` overrides the global `delay` for one file.
+    `stats["served"][name]` is the wall-clock time the last response for
+    `name` was fully written. Responses carry an ETag and Last-Modified, and
+    a Range with a stale `If-Range` gets the whole file (200).
+    """
+    import http.server
+    import threading
+    import time
+    from functools import partial
+
+    root = tmp_path_factory.mktemp("http_root")
+    stats = {
+        "requests": 0,
+        "active": 0,
+        "peak": 0,
+        "delay": 0.0,
+        "ranges": [],
+        "truncate": {},
+        "delays": {},
+        "bytes_sent": 0,
+        "served": {},
+    }
+    lock = threading.Lock()
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                stats["requests"] += 1
+                stats["active"] += 1
+                stats["peak"] = max(stats["peak"], stats["active"])
+            try:
+                name = Path(self.path).name
+                time.sleep(stats["delays"].get(name, stats["delay"]))
+                self._serve()
+            finally:
+                with lock:
+                    stats["active"] -= 1
+
+        def _serve(self):
+            path = Path(self.translate_path(self.path))
+            if not path.is_file():
+                return super().do_GET()
+            data = path.read_bytes()
+            start, end = 0, len(data)
+            mtime = path.stat().st_mtime_ns
+            etag = f'"{mtime:x}-{len(data):x}"'
+            byte_range = self.headers.get("Range")
+            if self.headers.get("If-Range") not in (None, etag):
+                byte_range = None
+            if byte_range:
+                first, last = byte_range.removeprefix("bytes=").split("-")
+                start = int(first)
+                end = min(int(last) + 1, len(data)) if last else len(data)
+                stats["ranges"].append((path.name, start))
+                if start >= len(data):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(data)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header(
+                    "Content-Range", f"bytes {start}-{end - 1}/{len(data)}"
+                )
+            else:
+                self.send_response(200)
+            body = data[start:end]
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", self.date_time_string(mtime // 10**9))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            cut = stats["truncate"].pop(path.name, None)
+            body = body if cut is None else body[:cut]
+            self.wfile.write(body)
+            with lock:
+                stats["bytes_sent"] += len(body)
+                stats["served"][path.name] = time.time()
+            if cut is not None:
+                self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(Handler, directory=str(root))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield {
+        "root": root,
+        "url": f"http://127.0.0.1:{server.server_port}",
+        "stats": stats,
+    }
+    server.shutdown()
+    server.server_close()
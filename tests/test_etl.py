@@ -1,5 +1,6 @@
 """Tests for the M1 ETL Ingest pipeline."""
 
+import pytest
 from pathlib import Path
 from fastclime.m1_etl import ingest
 from fastclime.m0_storage.catalog import DataCatalog
@@ -9,6 +10,8 @@ def test_dem_ingest_pipeline(mocker, mock_etl_env, db_path):
     """
     Tests the full DEM ingest pipeline using mocked downloads and processing.
     """
+    import numpy as np
+
     # Arrange
     BBOX = [-78.5, 8.5, -78.0, 9.0]
     YEAR = 2021
@@ -21,7 +24,9 @@ def test_dem_ingest_pipeline(mocker, mock_etl_env, db_path):
     # Mock the process function to create a dummy final file
     final_file = mock_etl_env["processed_dir"] / "dem" / str(YEAR) / "final_dem.tif"
     final_file.parent.mkdir(parents=True, exist_ok=True)
-    final_file.touch()
+    # Footprints, QA and terrain layers are read from the processed raster,
+    # placed away from the terrain test's DEM since they share the catalog.
+    _write_dem(final_file, np.linspace(100, 200, 64).reshape(8, 8), crs="EPSG:32618")
 
     mocker.patch(
         "fastclime.m1_etl.datasets.dem.process",
@@ -51,3 +56,1455 @@ def test_dem_ingest_pipeline(mocker, mock_etl_env, db_path):
         assert artifact_entry[3] == str(
             final_path.relative_to(mock_etl_env["data_dir"])
         )
+
+
+def test_download_manager_pools_and_limits_per_host(http_server, tmp_path):
+    """Concurrent downloads share a session and respect the per-host limit."""
+    from fastclime.m1_etl import utils
+
+    for i in range(12):
+        (http_server["root"] / f"tile_{i}.tif").write_bytes(bytes([i]) * 2048)
+    http_server["stats"]["delay"] = 0.05
+
+    jobs = [
+        (f"{http_server['url']}/tile_{i}.tif", tmp_path / f"tile_{i}.tif")
+        for i in range(12)
+    ]
+    with utils.DownloadManager(max_workers=8, max_per_host=3) as manager:
+        results = manager.download_many(jobs)
+
+    assert all(results[url] == dst for url, dst in jobs)
+    assert (tmp_path / "tile_7.tif").read_bytes() == bytes([7]) * 2048
+    assert 1 < http_server["stats"]["peak"] <= 3
+
+
+def test_download_file_resumes_with_range_requests(http_server, tmp_path):
+    """An interrupted download resumes from its .part file and is verified."""
+    import hashlib
+    from fastclime.m1_etl import utils
+
+    payload = bytes(range(256)) * 4096  # 1 MiB
+    (http_server["root"] / "big.h5").write_bytes(payload)
+    expected = hashlib.sha256(payload).hexdigest()
+    http_server["stats"]["truncate"]["big.h5"] = 300_000
+
+    dst = tmp_path / "big.h5"
+    sha = utils.download_file(
+        f"{http_server['url']}/big.h5", dst, expected_sha=expected, backoff=0
+    )
+
+    assert sha == expected
+    assert dst.read_bytes() == payload
+    assert not (tmp_path / "big.h5.part").exists()
+    [(name, offset)] = http_server["stats"]["ranges"]
+    assert name == "big.h5" and 0 < offset <= 300_000
+
+
+def test_download_file_restarts_when_the_remote_changed(http_server, tmp_path):
+    """A resume only splices onto bytes of the same version of the file."""
+    import os
+    import requests
+    from fastclime.m1_etl import utils
+
+    served = http_server["root"] / "changing.h5"
+    served.write_bytes(b"a" * 500_000)
+    http_server["stats"]["truncate"]["changing.h5"] = 200_000
+    url, dst = f"{http_server['url']}/changing.h5", tmp_path / "changing.h5"
+    with pytest.raises((requests.exceptions.RequestException, ValueError)):
+        utils.download_file(url, dst, retries=1, backoff=0)
+    part = tmp_path / "changing.h5.part"
+    assert 0 < part.stat().st_size <= 200_000
+    assert (tmp_path / "changing.h5.etag.part").exists()
+
+    served.write_bytes(b"b" * 500_000)
+    os.utime(served, ns=(served.stat().st_atime_ns, served.stat().st_mtime_ns + 10**9))
+    utils.download_file(url, dst, backoff=0)
+    assert dst.read_bytes() == b"b" * 500_000
+    assert not part.exists() and not (tmp_path / "changing.h5.etag.part").exists()
+
+
+def test_download_file_does_not_retry_client_errors(http_server, tmp_path):
+    """A 404 fails immediately instead of backing off."""
+    import requests
+    from fastclime.m1_etl import utils
+
+    before = http_server["stats"]["requests"]
+    with pytest.raises(requests.exceptions.HTTPError):
+        utils.download_file(f"{http_server['url']}/missing.tif", tmp_path / "x.tif")
+    assert http_server["stats"]["requests"] - before == 1
+
+
+class _FakeCMR:
+    """Serves canned CMR granule pages, two entries per page."""
+
+    def __init__(self, days):
+        self.entries = [
+            {
+                "id": f"G{day}",
+                "time_start": f"2024-05-{day:02d}T00:00:00.000Z",
+                "time_end": f"2024-05-{day:02d}T23:59:59.000Z",
+                "links": [{"rel": "x#data", "href": f"https://x/G{day}.h5"}],
+            }
+            for day in days
+        ]
+        self.calls = []
+        self.offline = False
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def get(self, url, params, headers, timeout):
+        import requests
+        from unittest.mock import Mock
+
+        self.calls.append(headers.get("CMR-Search-After"))
+        if self.offline:
+            raise requests.exceptions.ConnectionError("offline")
+        start = int(headers.get("CMR-Search-After", 0))
+        page = self.entries[start : start + 2]
+        response = Mock()
+        response.json.return_value = {"feed": {"entry": page}}
+        response.headers = {"CMR-Search-After": str(start + 2)} if page else {}
+        return response
+
+
+def test_cmr_client_pages_caches_and_works_offline(tmp_path, monkeypatch):
+    """Pages are followed, later searches hit the cache, stale data is a fallback."""
+    import requests
+    from fastclime.config import settings
+    from fastclime.m1_etl import cmr, utils
+
+    monkeypatch.setattr(cmr, "PAGE_SIZE", 2)
+    session = _FakeCMR(days=range(1, 6))
+    client = cmr.CMRClient(session=session, cache_dir=tmp_path)
+    may_3 = ("2024-05-03T00:00:00Z", "2024-05-03T23:59:59Z")
+
+    granules = client.search("SPL3SMP", "009", may_3, [-79, 8, -78, 9])
+    assert [g["url"] for g in granules] == ["https://x/G3.h5"]
+    assert session.calls == [None, "2", "4"]
+
+    # Another day of the same month is served from the cached month window.
+    may_5 = ("2024-05-05T00:00:00Z", "2024-05-05T23:59:59Z")
+    assert client.search("SPL3SMP", "009", may_5, [-79, 8, -78, 9])[0]["id"] == "G5"
+    assert len(session.calls) == 3
+
+    session.offline = True
+    stale = cmr.CMRClient(session=session, cache_dir=tmp_path, ttl_hours=0)
+    assert len(stale.search("SPL3SMP", "009", may_3, [-79, 8, -78, 9])) == 1
+    with pytest.raises(requests.exceptions.ConnectionError):
+        stale.search("SPL3SMP", "009", may_3, [0, 0, 1, 1])
+
+    # Only sessions the client created itself are closed with it.
+    with cmr.CMRClient(session=session, cache_dir=tmp_path):
+        pass
+    assert not session.closed
+    owned = _FakeCMR(days=range(1, 6))
+    monkeypatch.setattr(cmr.requests, "Session", lambda: owned)
+    monkeypatch.setattr(settings, "DATA_DIR", tmp_path)
+    assert utils.search_nasa_cmr("SPL3SMP", "009", may_5, [-79, 8, -78, 9]) == [
+        "https://x/G5.h5"
+    ]
+    assert owned.closed
+
+
+def test_raw_cache_reuses_downloads_and_survives_eviction(
+    http_server, tmp_path, monkeypatch
+):
+    """Cached URLs are not fetched again; evicted files are fetched on demand."""
+    from fastclime.config import settings
+    from fastclime.m0_storage.cache import CacheManager
+    from fastclime.m1_etl import utils
+    from fastclime.m1_etl.raw_cache import RawCache
+
+    data_dir = tmp_path / "data"
+    monkeypatch.setattr(settings, "DATA_DIR", data_dir)
+    catalog = DataCatalog(db_path=tmp_path / "catalog.db")
+    catalog.init_catalog()
+    raw_cache = RawCache("dem", catalog=catalog, data_dir=data_dir)
+
+    for i in range(3):
+        (http_server["root"] / f"tile_{i}.tif").write_bytes(bytes([i]) * 4096)
+    (http_server["root"] / "copy.tif").write_bytes(bytes([0]) * 4096)
+    jobs = [
+        (f"{http_server['url']}/{name}", tmp_path / "scratch" / name)
+        for name in ("tile_0.tif", "tile_1.tif", "tile_2.tif", "copy.tif")
+    ]
+
+    def fetch():
+        before = http_server["stats"]["requests"]
+        with utils.DownloadManager(raw_cache=raw_cache) as manager:
+            results = manager.download_many(jobs, raise_on_error=True)
+        return results, http_server["stats"]["requests"] - before
+
+    results, requests_made = fetch()
+    assert requests_made == 4
+    tile_0 = results[jobs[0][0]]
+    assert tile_0.is_relative_to(data_dir / "raw" / "dem")
+    assert tile_0.parent.name.startswith(tile_0.parent.parent.name)
+    # Identical content is stored once, whatever the URL.
+    assert results[jobs[3][0]].parent == tile_0.parent
+    assert not (tmp_path / "scratch").exists()
+
+    results_again, requests_made = fetch()
+    assert requests_made == 0
+    assert results_again == results
+
+    evicted = CacheManager(catalog, data_dir=data_dir).evict("raw", quota_bytes=0)
+    assert evicted["files_evicted"] == 3
+    _, requests_made = fetch()
+    assert requests_made == 4
+
+
+def test_ingest_evicts_the_raw_cache_past_its_quota(mock_etl_env, monkeypatch):
+    """Raw downloads kept by an ingest are evicted in LRU order over quota."""
+    import hashlib
+    from fastclime.config import settings
+    from fastclime.m0_storage.cache import GIB
+    from fastclime.m1_etl import orchestrator
+    from fastclime.m1_etl.datasets import DATASETS
+
+    def download(raw_cache, day_of_year, **kwargs):
+        url = f"https://example.com/granule_{day_of_year}.h5"
+        staged = raw_cache.staging_path(url, "granule.h5")
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        staged.write_bytes(bytes([day_of_year]) * 2000)
+        sha = hashlib.sha256(staged.read_bytes()).hexdigest()
+        return [raw_cache.add(url, staged, sha)]
+
+    def process(raw_files, processed_dir, day_of_year, **kwargs):
+        path = processed_dir / f"granules_{day_of_year}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(raw_files[0].read_bytes())
+        return path
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fakecached",
+        {"download": download, "process": process, "desc": "Fake cached"},
+    )
+    monkeypatch.setattr(orchestrator.lake, "refresh_views", lambda *a, **k: None)
+    monkeypatch.setattr(settings, "CACHE_QUOTA_RAW_GB", 5000 / GIB)
+
+    results = [
+        orchestrator.ingest("fakecached", year=2024, day_of_year=day)
+        for day in (1, 2, 3)
+    ]
+    cached = sorted((mock_etl_env["raw_dir"] / "fakecached").rglob("granule.h5"))
+    # Two 2000-byte files fit the 5000-byte quota; the oldest was evicted.
+    assert len(cached) == 2
+    assert {p.read_bytes()[0] for p in cached} == {2, 3}
+    assert all(Path(r["processed_file_path"]).exists() for r in results)
+
+
+def _write_tiles(tmp_path, count=1, size=100, res=0.01):
+    """Writes a 2x2 grid of random float32 EPSG:4326 tiles around (-78, 9)."""
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, (lon, lat) in enumerate([(-79, 9), (-78, 9), (-79, 8), (-78, 8)]):
+        path = tmp_path / f"tile_{i}.tif"
+        with rasterio.open(
+            path,
+            "w",
+            driver="GTiff",
+            width=size,
+            height=size,
+            count=count,
+            dtype="float32",
+            crs="EPSG:4326",
+            transform=from_origin(lon, lat + 1, res, res),
+            nodata=-9999,
+        ) as dst:
+            dst.write((rng.random((count, size, size)) * 1000).astype("float32"))
+        paths.append(path)
+    return paths
+
+
+def test_mosaic_to_cog_matches_merged_window(tmp_path):
+    """The single-pass COG equals the bbox window of an in-memory merge."""
+    import numpy as np
+    import rasterio
+    from rasterio.merge import merge
+    from rasterio.windows import from_bounds
+    from fastclime.m1_etl import utils
+
+    (tmp_path / "tiles").mkdir()
+    tiles = _write_tiles(tmp_path / "tiles", count=2)
+    bbox = [-78.55, 8.45, -77.95, 9.03]
+    out_dir = tmp_path / "out"
+    dst = utils.mosaic_to_cog(tiles, out_dir / "dem.tif", bbox=bbox)
+
+    mosaic, transform = merge([str(p) for p in tiles])
+    window = from_bounds(*bbox, transform=transform).round_offsets().round_lengths()
+    expected = mosaic[
+        :,
+        int(window.row_off) : int(window.row_off + window.height),
+        int(window.col_off) : int(window.col_off + window.width),
+    ]
+    with rasterio.open(dst) as cog:
+        assert cog.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+        assert cog.bounds == pytest.approx(bbox)
+        np.testing.assert_array_equal(cog.read(), expected)
+    assert [p.name for p in out_dir.iterdir()] == ["dem.tif"]
+
+
+def test_to_cog_streams_with_codec_and_predictor(tmp_path):
+    """to_cog keeps the pixels, tiles in 512 blocks and honours codec options."""
+    import numpy as np
+    import rasterio
+    from fastclime.m1_etl import utils
+
+    [src, *_] = _write_tiles(tmp_path, size=1200, res=0.001)
+    dst = utils.to_cog(src, tmp_path / "cog.tif", compress="ZSTD", num_threads=4)
+
+    with rasterio.open(src) as a, rasterio.open(dst) as b:
+        np.testing.assert_array_equal(a.read(), b.read())
+        assert b.compression.name == "zstd"
+        assert b.tags(ns="IMAGE_STRUCTURE")["PREDICTOR"] == "3"  # floating point
+        assert b.block_shapes == [(512, 512)]
+        assert b.overviews(1) == [2, 4]
+
+
+def test_cog_profiles_are_selected_per_dataset(tmp_path):
+    """Each raster dataset names a valid profile; arguments override it."""
+    import numpy as np
+    import rasterio
+    from fastclime.m1_etl import utils
+    from fastclime.m1_etl.datasets import DATASETS
+
+    for spec in DATASETS.values():
+        if "cog_profile" in spec:
+            assert spec["cog_profile"] in utils.COG_PROFILES
+    with pytest.raises(ValueError, match="COG profile 'nope'"):
+        utils.cog_options("nope")
+
+    [src, *_] = _write_tiles(tmp_path, size=1200, res=0.001)
+    ndvi = utils.to_cog(src, tmp_path / "ndvi.tif", profile="ndvi")
+    dem = utils.to_cog(src, tmp_path / "dem.tif", profile="dem", compress="LZW")
+    with rasterio.open(src) as a, rasterio.open(ndvi) as b, rasterio.open(dem) as c:
+        np.testing.assert_array_equal(a.read(), b.read())
+        assert b.compression.name == "deflate"
+        assert "PREDICTOR" not in b.tags(ns="IMAGE_STRUCTURE")
+        assert c.compression.name == "lzw"
+        assert c.tags(ns="IMAGE_STRUCTURE")["PREDICTOR"] == "3"
+
+
+@pytest.mark.parametrize("resampling", ["bilinear", "cubic"])
+def test_reproject_raster_threads_match_single_threaded(tmp_path, resampling):
+    """Multi-threaded warping is bit-identical to a plain per-band warp."""
+    import numpy as np
+    import rasterio
+    from rasterio.warp import Resampling, calculate_default_transform, reproject
+    from fastclime.m1_etl import utils
+
+    [src, *_] = _write_tiles(tmp_path, count=2, size=600, res=0.002)
+    dst = tmp_path / "warped.tif"
+    utils.reproject_raster(
+        src, dst, crs="EPSG:3857", resampling=Resampling[resampling], num_threads=4
+    )
+
+    with rasterio.open(src) as s, rasterio.open(dst) as out:
+        transform, width, height = calculate_default_transform(
+            s.crs, "EPSG:3857", s.width, s.height, *s.bounds
+        )
+        expected = np.empty((s.count, height, width), dtype="float32")
+        for i in range(s.count):
+            reproject(
+                s.read(i + 1),
+                expected[i],
+                src_transform=s.transform,
+                src_crs=s.crs,
+                src_nodata=s.nodata,
+                dst_transform=transform,
+                dst_crs="EPSG:3857",
+                dst_nodata=s.nodata,
+                resampling=Resampling[resampling],
+            )
+        np.testing.assert_array_equal(out.read(), expected)
+
+
+def test_hdf5_to_parquet_subsets_bbox_in_chunks(tmp_path, monkeypatch):
+    """Only bbox cells are kept, with their geolocation and grid indices."""
+    import datetime
+    import h5py
+    import numpy as np
+    import pyarrow.parquet as pq
+    from fastclime.m1_etl import qa, utils
+
+    monkeypatch.setattr(utils, "ROW_GROUP_SIZE", 50)
+    n_rows, n_cols = 60, 120
+    lat_1d = np.linspace(84, -84, n_rows)
+    lon_1d = np.linspace(-179, 179, n_cols)
+    lat = np.repeat(lat_1d[:, None], n_cols, axis=1).astype("float32")
+    lon = np.repeat(lon_1d[None, :], n_rows, axis=0).astype("float32")
+    values = np.arange(n_rows * n_cols, dtype="float32").reshape(n_rows, n_cols)
+    # EASE-grid style: cells without a retrieval have fill in every array.
+    for arr in (lat, lon, values):
+        arr[::7, ::5] = -9999.0
+
+    src = tmp_path / "smap.h5"
+    with h5py.File(src, "w") as hf:
+        group = hf.create_group("Soil_Moisture_Retrieval_Data")
+        sm = group.create_dataset("soil_moisture", data=values, chunks=(8, 16))
+        sm.attrs["_FillValue"] = np.float32(-9999.0)
+        group.create_dataset("latitude", data=lat, chunks=(8, 16))
+        group.create_dataset("longitude", data=lon, chunks=(8, 16))
+
+    bbox = [-100.0, -30.0, 20.0, 40.0]
+    dst = tmp_path / "out.parquet"
+    written = utils.hdf5_to_parquet(
+        src,
+        dst,
+        "Soil_Moisture_Retrieval_Data/soil_moisture",
+        bbox=bbox,
+        date=datetime.date(2024, 5, 4),
+    )
+
+    inside = (
+        (lat >= -30) & (lat <= 40) & (lon >= -100) & (lon <= 20) & (values != -9999)
+    )
+    table = pq.read_table(dst)
+    assert table.column_names == ["date", "lat", "lon", "row", "col", "value"]
+    assert written == table.num_rows == inside.sum()
+    # Slabs of 8 rows are buffered into full row groups; only the last is short.
+    metadata = pq.ParquetFile(dst).metadata
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    assert sizes[:-1] == [50] * (len(sizes) - 1) and 0 < sizes[-1] <= 50
+
+    df = table.to_pandas()
+    assert set(df["date"]) == {datetime.date(2024, 5, 4)}
+    np.testing.assert_array_equal(df["value"], values[df["row"], df["col"]])
+    np.testing.assert_array_equal(df["lat"], lat[df["row"], df["col"]])
+
+    # Fill cells inside the bbox count in the QA stats stored in the footer.
+    stats = qa.read(dst)["value"]
+    in_bbox = (lat >= -30) & (lat <= 40) & (lon >= -100) & (lon <= 20)
+    assert stats["count"] == in_bbox.sum() and stats["valid"] == written
+    assert stats["max"] == df["value"].max()
+
+    # A failed conversion leaves neither the output nor its temporary file.
+    def fail(stats):
+        raise RuntimeError("metadata failed")
+
+    monkeypatch.setattr(qa, "parquet_metadata", fail)
+    with pytest.raises(RuntimeError):
+        utils.hdf5_to_parquet(
+            src,
+            tmp_path / "failed.parquet",
+            "Soil_Moisture_Retrieval_Data/soil_moisture",
+        )
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.parquet", "smap.h5"]
+
+
+def test_ndvi_process_mosaics_every_tile(tmp_path):
+    """All MODIS tiles are scaled, fill-masked and mosaicked into one COG."""
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+    from rasterio.warp import transform_bounds
+    from fastclime.m1_etl.datasets import ndvi
+
+    sinusoidal = "+proj=sinu +lon_0=0 +x_0=0 +y_0=0 +R=6371007.181 +units=m +no_defs"
+    size, res = 200, 500.0
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    raw_files = []
+    # Four adjacent sinusoidal tiles around (-78.5, 9); NDVI stored * 10000.
+    for i, (x0, y0) in enumerate([(-8.7e6, 1.1e6), (-8.6e6, 1.1e6)]):
+        for j, dy in enumerate((0, -size * res)):
+            path = raw_dir / f"MOD13Q1.h{i}v{j}.tif"
+            data = np.full((size, size), (i * 2 + j + 1) * 1000, dtype="int16")
+            data[:10, :10] = -3000
+            with rasterio.open(
+                path,
+                "w",
+                driver="GTiff",
+                width=size,
+                height=size,
+                count=1,
+                dtype="int16",
+                crs=sinusoidal,
+                transform=from_origin(x0, y0 + dy, res, res),
+                nodata=-3000,
+            ) as dst:
+                dst.write(data, 1)
+                dst.update_tags(1, scale_factor="10000", valid_range="-2000, 10000")
+            raw_files.append(path)
+
+    with rasterio.open(raw_files[0]) as first, rasterio.open(raw_files[-1]) as last:
+        corners = transform_bounds(
+            first.crs,
+            "EPSG:4326",
+            first.bounds.left,
+            last.bounds.bottom,
+            last.bounds.right,
+            first.bounds.top,
+        )
+    bbox = [round(v, 3) for v in corners]
+    out = ndvi.process(
+        raw_files,
+        processed_dir=tmp_path / "processed",
+        year=2024,
+        day_of_year=129,
+        bbox=bbox,
+        temp_dir=tmp_path / "tmp",
+    )
+
+    assert out.name == "NDVI_2024129.tif"
+    with rasterio.open(out) as cog:
+        assert cog.crs.to_epsg() == 4326
+        data = cog.read(1, masked=True)
+    # Interior pixels of each tile keep their scaled value.
+    for value in (0.1, 0.2, 0.3, 0.4):
+        assert np.isclose(data.compressed(), value).any()
+    assert data.min() >= 0.1 - 1e-6 and data.max() <= 0.4 + 1e-6
+    assert not list((tmp_path / "tmp").glob("*.tif"))
+
+
+def test_hdf4_scaling_follows_the_named_convention(tmp_path, monkeypatch):
+    """CF bands multiply and add the offset; MODIS bands subtract and divide."""
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+    from fastclime.m1_etl import utils
+    from fastclime.m1_etl.datasets import ndvi
+
+    src = tmp_path / "band.tif"
+    with rasterio.open(
+        src,
+        "w",
+        driver="GTiff",
+        width=4,
+        height=4,
+        count=1,
+        dtype="int16",
+        crs="EPSG:4326",
+        transform=from_origin(-79, 9, 0.01, 0.01),
+    ) as dst:
+        dst.write(np.full((4, 4), 150, dtype="int16"), 1)
+        dst.update_tags(1, scale_factor="2", add_offset="10")
+
+    expected = {"cf": 150 * 2 + 10, "modis": (150 - 10) / 2}
+    for convention, value in expected.items():
+        out = utils.hdf4_to_geotiff(
+            src, tmp_path / f"{convention}.tif", 0, scale_convention=convention
+        )
+        with rasterio.open(out) as dataset:
+            assert np.allclose(dataset.read(1), value)
+    with pytest.raises(ValueError, match="Scale convention 'gdal'"):
+        utils.hdf4_to_geotiff(src, tmp_path / "x.tif", 0, scale_convention="gdal")
+
+    # Extracted tiles are removed even when the mosaic fails.
+    tile = utils.hdf4_to_geotiff(src, tmp_path / "tile.tif", 0)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("mosaic failed")
+
+    monkeypatch.setattr(utils, "mosaic_to_cog", fail)
+    with pytest.raises(RuntimeError):
+        ndvi.finalize([tile], tmp_path, year=2024, day_of_year=1, bbox=None)
+    assert not tile.exists()
+
+
+def test_backfill_runs_in_parallel_and_resumes(mock_etl_env, monkeypatch, db_path):
+    """Completed jobs are skipped on rerun; only the failed one runs again."""
+    import datetime
+    from fastclime.m1_etl import orchestrator
+    from fastclime.m1_etl.datasets import DATASETS
+
+    fail_marker = mock_etl_env["data_dir"] / "fail_on_day_3"
+    fail_marker.touch()
+
+    def process(raw_files, processed_dir, year, day_of_year, **kwargs):
+        if day_of_year == 3 and fail_marker.exists():
+            raise RuntimeError("transient failure")
+        path = processed_dir / f"{year}_{day_of_year:03d}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(f"{year}-{day_of_year}".encode())
+        return path
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fake",
+        {
+            "download": lambda **kwargs: [],
+            "process": process,
+            "desc": "Fake daily dataset",
+            "cadence_days": 1,
+        },
+    )
+    start, end = datetime.date(2024, 1, 1), datetime.date(2024, 1, 5)
+
+    stats = orchestrator.backfill("fake", start, end, workers=2, use_cache=False)
+    assert stats["jobs_planned"] == 5
+    assert stats["jobs_succeeded"] == 4
+    assert [f["date"] for f in stats["failed"]] == ["2024-01-03"]
+
+    fail_marker.unlink()
+    stats = orchestrator.backfill("fake", start, end, workers=2, use_cache=False)
+    assert stats["jobs_skipped"] == 4
+    assert stats["jobs_succeeded"] == 1 and not stats["failed"]
+
+    catalog = DataCatalog(db_path=db_path)
+    with catalog.get_connection() as con:
+        jobs = con.execute(
+            "SELECT status, count(*), max(attempts) FROM etl_jobs "
+            "WHERE dataset_name = 'fake' GROUP BY status"
+        ).fetchall()
+        artifacts = con.execute(
+            "SELECT count(*) FROM artifacts WHERE dataset_name = 'fake'"
+        ).fetchone()[0]
+    assert jobs == [("done", 5, 2)]
+    assert artifacts == 5
+    with catalog.get_connection() as con:
+        runs = con.execute(
+            "SELECT status, count(*) FROM etl_runs "
+            "WHERE dataset_name = 'fake' GROUP BY status ORDER BY status"
+        ).fetchall()
+    assert runs == [("done", 5), ("failed", 1)]
+
+
+def test_backfill_workers_leave_the_catalog_to_the_parent(
+    mock_etl_env, monkeypatch, db_path
+):
+    """Raw cache writes of backfill workers are recorded by the parent."""
+    import datetime
+    import hashlib
+    import os
+    from fastclime.m0_storage.catalog import DataCatalog as Catalog
+    from fastclime.m1_etl import orchestrator
+    from fastclime.m1_etl.datasets import DATASETS
+
+    def download(raw_cache, day_of_year, **kwargs):
+        url = f"https://example.com/day_{day_of_year}.h5"
+        staged = raw_cache.staging_path(url, "day.h5")
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        staged.write_bytes(bytes([day_of_year]) * 100)
+        sha = hashlib.sha256(staged.read_bytes()).hexdigest()
+        return [raw_cache.add(url, staged, sha)]
+
+    def process(raw_files, processed_dir, year, day_of_year, **kwargs):
+        path = processed_dir / f"{year}_{day_of_year:03d}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(raw_files[0].read_bytes())
+        return path
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fakeworkers",
+        {
+            "download": download,
+            "process": process,
+            "desc": "Fake daily dataset",
+            "cadence_days": 1,
+        },
+    )
+    # Forked workers inherit the patch: any catalog access from them fails.
+    parent = os.getpid()
+    get_connection = Catalog.get_connection
+
+    def parent_only(self, *args, **kwargs):
+        if os.getpid() != parent:
+            raise RuntimeError("backfill worker opened the catalog")
+        return get_connection(self, *args, **kwargs)
+
+    monkeypatch.setattr(Catalog, "get_connection", parent_only)
+    start, end = datetime.date(2024, 1, 1), datetime.date(2024, 1, 3)
+    stats = orchestrator.backfill("fakeworkers", start, end, workers=2)
+    assert stats["jobs_succeeded"] == 3 and not stats["failed"]
+
+    with Catalog(db_path=db_path).get_connection() as con:
+        cached = con.execute(
+            "SELECT url, size_bytes FROM raw_cache "
+            "WHERE dataset_name = 'fakeworkers' ORDER BY url"
+        ).fetchall()
+        hot = con.execute(
+            "SELECT count(*) FROM cache_entries "
+            "WHERE relative_path LIKE 'raw/fakeworkers/%'"
+        ).fetchone()[0]
+    assert cached == [(f"https://example.com/day_{d}.h5", 100) for d in (1, 2, 3)]
+    assert hot == 3
+
+
+def test_backfill_run_fails_when_registration_fails(mock_etl_env, monkeypatch, db_path):
+    """A job's run is saved once the parent has registered its result."""
+    import datetime
+    from fastclime.m1_etl import orchestrator
+    from fastclime.m1_etl.datasets import DATASETS
+
+    def process(raw_files, processed_dir, year, day_of_year, **kwargs):
+        path = processed_dir / f"{year}_{day_of_year:03d}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(f"{year}-{day_of_year}".encode())
+        return path
+
+    def register(*args, **kwargs):
+        raise RuntimeError("catalog unavailable")
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fakeregister",
+        {
+            "download": lambda **kwargs: [],
+            "process": process,
+            "desc": "Fake daily dataset",
+            "cadence_days": 1,
+        },
+    )
+    monkeypatch.setattr(orchestrator, "_register", register)
+    day = datetime.date(2024, 1, 1)
+    stats = orchestrator.backfill("fakeregister", day, day, workers=1, use_cache=False)
+    assert stats["failed"] == [{"date": "2024-01-01", "error": "catalog unavailable"}]
+
+    with DataCatalog(db_path=db_path).get_connection() as con:
+        runs = con.execute(
+            "SELECT status, error FROM etl_runs WHERE dataset_name = 'fakeregister'"
+        ).fetchall()
+    assert runs == [("failed", "catalog unavailable")]
+
+
+def test_plan_jobs_follows_the_day_of_year_grid():
+    """16-day jobs land on MODIS periods; no cadence means one job per year."""
+    import datetime
+    from fastclime.m1_etl.orchestrator import plan_jobs
+
+    jobs = plan_jobs(datetime.date(2023, 12, 1), datetime.date(2024, 2, 10), 16)
+    assert [d.timetuple().tm_yday for d in jobs] == [337, 353, 1, 17, 33]
+    assert plan_jobs(datetime.date(2023, 5, 1), datetime.date(2024, 2, 1), None) == [
+        datetime.date(2023, 1, 1),
+        datetime.date(2024, 1, 1),
+    ]
+
+
+def _slow_process_file(raw_file, temp_dir, **kwargs):
+    """Per-file hook for the pipeline test; module level so workers can load it."""
+    import os
+    import time
+    from fastclime.m1_etl import telemetry
+
+    started = time.time()
+    time.sleep(0.3)
+    out = temp_dir / f"{raw_file.name}.out"
+    with telemetry.stage("reverse"):
+        out.write_bytes(raw_file.read_bytes()[::-1])
+    # Wall-clock start/end of the task, shared with the test process.
+    times = Path(os.environ["FASTCLIME_TEST_PROCESS_LOG"]) / raw_file.name
+    times.write_text(f"{started} {time.time()}")
+    return out
+
+
+def test_pipeline_overlaps_downloads_and_processing(
+    mock_etl_env, monkeypatch, http_server, db_path
+):
+    """Files are processed while later ones are still downloading."""
+    from fastclime.m1_etl import orchestrator
+    from fastclime.m1_etl.datasets import DATASETS
+
+    names = [f"granule_{i}.h5" for i in range(5)]
+    for i, name in enumerate(names):
+        (http_server["root"] / name).write_bytes(bytes([i]) * 1024)
+        http_server["stats"]["delays"][name] = 0.3 * i  # arrive one by one
+
+    def plan(temp_dir, **kwargs):
+        return [(f"{http_server['url']}/{name}", temp_dir / name) for name in names]
+
+    def finalize(outputs, processed_dir, **kwargs):
+        final = processed_dir / "combined.bin"
+        final.parent.mkdir(parents=True, exist_ok=True)
+        final.write_bytes(b"".join(p.read_bytes() for p in outputs))
+        return final
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fake",
+        {
+            "download": None,
+            "process": None,
+            "plan": plan,
+            "process_file": _slow_process_file,
+            "finalize": finalize,
+            "desc": "Fake granules",
+        },
+    )
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a single worker processes files in this process")
+
+    monkeypatch.setattr(orchestrator, "ProcessPoolExecutor", no_pool)
+    process_log = mock_etl_env["data_dir"] / "process_log"
+    process_log.mkdir()
+    monkeypatch.setenv("FASTCLIME_TEST_PROCESS_LOG", str(process_log))
+    stats = orchestrator.ingest("fake", year=2024, use_cache=False, process_workers=1)
+
+    # Granules arrive 0.3 s apart: the first ones are processed, start to
+    # end, before the last one has finished downloading.
+    times = {
+        p.name: [float(t) for t in p.read_text().split()] for p in process_log.iterdir()
+    }
+    assert sorted(times) == names
+    last_download = http_server["stats"]["served"][names[-1]]
+    assert times[names[0]][1] < last_download
+    assert times[names[1]][0] < last_download
+    combined = Path(stats["processed_file_path"]).read_bytes()
+    assert combined == b"".join(bytes([i]) * 1024 for i in range(5))
+
+    # Each transfer and each worker task, with its own stages, is in the run.
+    with DataCatalog(db_path=db_path).get_connection() as con:
+        stages = con.execute(
+            "SELECT stage, parent, count(*), sum(bytes) FROM etl_stage_metrics "
+            "WHERE run_id = ? AND stage IN ('download_file', 'process_file', "
+            "'reverse') GROUP BY ALL ORDER BY stage",
+            [stats["run_id"]],
+        ).fetchall()
+    assert stages == [
+        ("download_file", "pipeline", 5, 5 * 1024),
+        ("process_file", "pipeline", 5, 5 * 1024),
+        ("reverse", "process_file", 5, 0),
+    ]
+
+
+def test_dem_remote_read_fetches_only_the_bbox_window(
+    http_server, tmp_path, monkeypatch
+):
+    """Remote mode reads the bbox blocks of the tile COGs with range requests."""
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+    from fastclime.m1_etl import utils
+    from fastclime.m1_etl.datasets import dem
+
+    tile = "Copernicus_DSM_COG_10_N08_00_W079_00_DEM"
+    size = 2048
+    src = tmp_path / "tile.tif"
+    rng = np.random.default_rng(0)
+    with rasterio.open(
+        src,
+        "w",
+        driver="GTiff",
+        width=size,
+        height=size,
+        count=1,
+        dtype="float32",
+        crs="EPSG:4326",
+        transform=from_origin(-79.0, 9.0, 1 / size, 1 / size),
+    ) as dst:
+        dst.write(rng.normal(200, 50, (1, size, size)).astype("float32"))
+    served = http_server["root"] / tile / f"{tile}.tif"
+    served.parent.mkdir()
+    with rasterio.open(src) as dataset:
+        utils.write_cog(dataset, served, compress="NONE", blocksize=128)
+    monkeypatch.setattr(dem, "BASE_URL", http_server["url"])
+
+    bbox = [-78.95, 8.9, -78.9, 8.95]
+    work = tmp_path / "work"
+    work.mkdir()
+    paths = dem.download(year=2021, bbox=bbox, temp_dir=work, remote=True)
+    assert paths == [utils.remote_path(f"{http_server['url']}/{tile}/{tile}.tif")]
+    remote = dem.process(
+        paths,
+        processed_dir=tmp_path / "remote",
+        year=2021,
+        bbox=bbox,
+        temp_dir=work,
+    )
+
+    # 16 MB tile; the bbox covers a single 64 KB block.
+    assert http_server["stats"]["bytes_sent"] < served.stat().st_size / 30
+    assert not list(work.iterdir())  # no tile was written locally
+    local = utils.mosaic_to_cog([served], tmp_path / "local.tif", bbox=bbox)
+    with rasterio.open(remote) as r, rasterio.open(local) as loc:
+        np.testing.assert_array_equal(r.read(), loc.read())
+
+
+def test_zonal_stats_match_per_parcel_masks(tmp_path, monkeypatch, db_path):
+    """Blockwise label statistics equal a per-polygon mask, and are reused."""
+    from datetime import date
+
+    import duckdb
+    import geopandas as gpd
+    import numpy as np
+    import rasterio
+    from rasterio.features import geometry_mask
+    from rasterio.transform import from_origin
+    from shapely.geometry import box
+    from fastclime.config import settings
+    from fastclime.m0_storage.catalog import DataCatalog
+    from fastclime.m1_etl import zonal
+
+    monkeypatch.setattr(settings, "DATA_DIR", tmp_path)
+    size = 600  # spans two label blocks in each direction
+    transform = from_origin(-78.6, 9.0, 0.001, 0.001)
+    values = np.random.default_rng(1).random((size, size), dtype="float32")
+    values[:50, :50] = -9999.0  # covers 4 parcels, clips 5 more
+    raster = tmp_path / "ndvi.tif"
+    with rasterio.open(
+        raster,
+        "w",
+        driver="GTiff",
+        width=size,
+        height=size,
+        count=1,
+        dtype="float32",
+        crs="EPSG:4326",
+        transform=transform,
+        nodata=-9999.0,
+    ) as dst:
+        dst.write(values, 1)
+
+    step = 0.6 / 30
+    geoms = [
+        box(
+            -78.6 + i * step,
+            8.4 + j * step,
+            -78.6 + (i + 0.8) * step,
+            8.4 + (j + 0.8) * step,
+        )
+        for i in range(30)
+        for j in range(30)
+    ] + [box(0.0, 0.0, 0.1, 0.1)]
+    parcels = gpd.GeoDataFrame(
+        {
+            "parcel_id": [f"p{i}" for i in range(len(geoms))],
+            "zone_id": [f"z{i % 3}" for i in range(len(geoms))],
+        },
+        geometry=geoms,
+        crs="EPSG:4326",
+    )
+    parcels_path = tmp_path / "parcels.gpkg"
+    parcels.to_file(parcels_path)
+    # Without a zone the rows could not be joined to metrics_hourly.
+    parcels.drop(columns="zone_id").to_file(tmp_path / "no_zones.gpkg")
+    with pytest.raises(ValueError, match=r"missing \['zone_id'\]"):
+        zonal.zonal_stats(raster, zonal.LabelGrid(tmp_path / "no_zones.gpkg"))
+
+    stats = zonal.zonal_stats(raster, zonal.LabelGrid(parcels_path)).set_index(
+        "parcel_id"
+    )
+
+    assert "p900" not in stats.index  # outside the raster
+    assert "p29" not in stats.index  # only nodata pixels
+    assert len(stats) == 896
+    for i in (0, 57, 87, 437, 899):
+        inside = ~geometry_mask(
+            [geoms[i]], out_shape=values.shape, transform=transform
+        ) & (values != -9999.0)
+        row = stats.loc[f"p{i}"]
+        assert row["count"] == inside.sum()
+        assert row["mean"] == pytest.approx(values[inside].mean(dtype="float64"))
+        assert row["min"] == values[inside].min()
+        assert row["max"] == values[inside].max()
+    assert stats.loc["p57", "zone_id"] == "z0" and stats.loc["p437", "zone_id"] == "z2"
+
+    def no_rasterize(*args, **kwargs):
+        raise AssertionError("label raster should come from the cache")
+
+    monkeypatch.setattr(zonal.features, "rasterize", no_rasterize)
+    catalog = DataCatalog(db_path=db_path)
+    day = date(2024, 5, 8)
+    for _ in range(2):  # idempotent
+        assert zonal.update_ndvi(raster, day, parcels_path, catalog=catalog) == 896
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        rows = con.execute(
+            "SELECT count(*), sum(pixel_count) FROM plant_ndvi_daily WHERE date = ?",
+            (day,),
+        ).fetchone()
+        # The same (date, parcel_id, zone_id) key m3_ml joins metrics_hourly on.
+        joined = con.execute(
+            "SELECT m.parcel_id, n.ndvi FROM (VALUES ('p57', 'z0'), ('p57', 'z1')) "
+            "m(parcel_id, zone_id) JOIN plant_ndvi_daily n USING (parcel_id, zone_id) "
+            "WHERE n.date = ?",
+            (day,),
+        ).fetchall()
+    assert rows == (896, stats["count"].sum())
+    assert joined == [("p57", pytest.approx(stats.loc["p57", "mean"]))]
+
+
+def test_ingest_reuses_rasters_that_cover_the_bbox(mock_etl_env, monkeypatch):
+    """Footprints are indexed on registration and answer coverage queries."""
+    import datetime
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_bounds
+    from fastclime.m0_storage import find_rasters
+    from fastclime.m1_etl.datasets import DATASETS
+
+    runs = []
+
+    def process(processed_dir, year, day_of_year, bbox, **kwargs):
+        runs.append((day_of_year, bbox))
+        path = processed_dir / f"R_{year}_{day_of_year:03d}_{len(runs)}.tif"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with rasterio.open(
+            path,
+            "w",
+            driver="GTiff",
+            width=50,
+            height=50,
+            count=1,
+            dtype="float32",
+            crs="EPSG:4326",
+            transform=from_bounds(*bbox, 50, 50),
+        ) as dst:
+            dst.write(np.ones((1, 50, 50), dtype="float32"))
+        return path
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fakeraster",
+        {
+            "download": lambda **kwargs: [],
+            "process": lambda raw_files, **kwargs: process(**kwargs),
+            "desc": "Fake 16-day rasters",
+            "cadence_days": 16,
+        },
+    )
+    region = [-78.5, 8.5, -78.0, 9.0]
+    first = ingest("fakeraster", year=2024, bbox=region, day_of_year=1)
+
+    inner = [-78.4, 8.6, -78.1, 8.9]
+    reused = ingest("fakeraster", year=2024, bbox=inner, day_of_year=1)
+    assert reused["reused"] and len(runs) == 1
+    assert reused["artifact_uuid"] == first["artifact_uuid"]
+    assert reused["processed_file_path"] == first["processed_file_path"]
+
+    ingest("fakeraster", year=2024, bbox=inner, day_of_year=17)  # next period
+    ingest("fakeraster", year=2024, bbox=[-78.6, 8.5, -78.0, 9.0], day_of_year=1)
+    ingest("fakeraster", year=2024, bbox=inner, day_of_year=1, overwrite=True)
+    assert len(runs) == 4
+
+    day = datetime.date(2024, 1, 10)
+    found = find_rasters(inner, day, dataset_name="fakeraster")
+    assert sorted(p.name for p in found) == [
+        "R_2024_001_1.tif",
+        "R_2024_001_3.tif",
+        "R_2024_001_4.tif",
+    ]
+    assert find_rasters([0.0, 0.0, 1.0, 1.0], day, dataset_name="fakeraster") == []
+
+
+def test_smap_plans_one_granule_per_day(tmp_path, monkeypatch):
+    """Duplicate CMR matches are not processed concurrently into one file."""
+    from fastclime.m1_etl.datasets import smap
+
+    netrc = tmp_path / ".netrc"
+    netrc.touch()
+    monkeypatch.setattr(smap, "NETRC_PATH", netrc)
+    urls = [
+        "https://example.com/SMAP_L3_SM_P_20240101_R19240_001.h5",
+        "https://example.com/SMAP_L3_SM_P_20240101_R19240_002.h5",
+    ]
+    monkeypatch.setattr(smap.utils, "search_nasa_cmr", lambda **kwargs: urls)
+
+    jobs = smap.plan(year=2024, day_of_year=1, bbox=None, temp_dir=tmp_path)
+    assert jobs == [(urls[0], tmp_path / urls[0].split("/")[-1])]
+
+
+def test_smap_days_append_to_time_cube(tmp_path, monkeypatch):
+    """Each processed SMAP day lands in the cube; histories read back intact."""
+    import datetime
+    import h5py
+    import numpy as np
+    import pandas as pd
+    import pyarrow.parquet as pq
+    from fastclime.m1_etl import cube as cube_mod
+    from fastclime.m1_etl.datasets import smap
+
+    n_rows, n_cols = 40, 70
+    lat = np.repeat(np.linspace(60, -60, n_rows)[:, None], n_cols, axis=1)
+    lon = np.repeat(np.linspace(-170, 170, n_cols)[None, :], n_rows, axis=0)
+    rng = np.random.default_rng(2)
+    bbox = [-100.0, -30.0, 20.0, 40.0]
+    processed_dir = tmp_path / "processed" / "smap"
+    days = [(2024, 365), (2025, 1), (2025, 3)]
+    grids = []
+    # The cube is filled from the extracted cells, not from the written file.
+    monkeypatch.setattr(pq, "read_table", None)
+    for year, doy in days:
+        values = rng.random((n_rows, n_cols)).astype("float32")
+        values[::6, ::4] = -9999.0
+        grids.append(values)
+        src = tmp_path / f"SMAP_{year}{doy:03d}.h5"
+        with h5py.File(src, "w") as hf:
+            group = hf.create_group("Soil_Moisture_Retrieval_Data")
+            sm = group.create_dataset("soil_moisture", data=values)
+            sm.attrs["_FillValue"] = np.float32(-9999.0)
+            group.create_dataset("latitude", data=lat.astype("float32"))
+            group.create_dataset("longitude", data=lon.astype("float32"))
+        smap.process_file(src, processed_dir, year, doy, bbox=bbox)
+    monkeypatch.undo()
+
+    cube = smap.open_cube(processed_dir)
+    first, last = datetime.date(2024, 12, 30), datetime.date(2025, 1, 3)
+    assert cube.dates() == [first, datetime.date(2025, 1, 1), last]
+    assert len(list(cube.root.glob("c*.npy"))) > 1
+
+    df = pd.read_parquet(
+        processed_dir / "year=2025" / "month=1" / "SMAP_2025003.parquet"
+    )
+    rows, cols = df["row"].to_numpy(), df["col"].to_numpy()
+    series = cube.history(rows, cols, first, last)
+    assert series.shape == (len(df), 5)
+    np.testing.assert_array_equal(series[:, 4], df["value"])
+    np.testing.assert_array_equal(series[:, 0], grids[0][rows, cols])
+    assert np.isnan(series[:, 1]).all()  # 2024-12-31 was never appended
+
+    r, c = cube.locate([df["lat"].iloc[0]], [df["lon"].iloc[0]])
+    assert (r[0], c[0]) == (rows[0], cols[0])
+
+    array = cube.to_xarray(bbox=bbox)
+    assert array.dims == ("time", "row", "col") and array.sizes["time"] == 5
+    assert float(array.lat.min()) >= -30 and float(array.lon.max()) <= 20
+    picked = array.sel(time="2025-01-03", row=rows[0], col=cols[0])
+    assert float(picked) == df["value"].iloc[0]
+    assert cube_mod.TimeCube.open(cube.root).shape == (n_rows, n_cols)
+
+    small = cube_mod.TimeCube.open(tmp_path / "small", (4, 4), time_chunk=2)
+    for i in range(5):
+        small.append(first + datetime.timedelta(days=i), [1, 3], [2, 0], [i, -i])
+    block = small.read(slice(0, 4), slice(0, 4), first, last)
+    np.testing.assert_array_equal(block[:, 1, 2], np.arange(5))
+    np.testing.assert_array_equal(
+        small.history([3], [0], first, last)[0], -np.arange(5)
+    )
+
+
+def test_ingest_records_stage_telemetry(mock_etl_env, monkeypatch, db_path):
+    """Every ingest stores its stages, bytes and throughput in the catalog."""
+    import json
+    from typer.testing import CliRunner
+    from fastclime.m1_etl import orchestrator, telemetry
+    from fastclime.m1_etl.cli import app
+    from fastclime.m1_etl.datasets import DATASETS
+
+    def download(temp_dir, **kwargs):
+        raw = temp_dir / "raw.bin"
+        raw.write_bytes(b"x" * 4096)
+        return [raw]
+
+    def process(raw_files, processed_dir, **kwargs):
+        with telemetry.stage("transform") as metric:
+            data = b"".join(p.read_bytes() for p in raw_files) * 2
+            metric.add_bytes(len(data))
+        path = processed_dir / "telemetry.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+    monkeypatch.setitem(
+        DATASETS,
+        "faketelemetry",
+        {"download": download, "process": process, "desc": "Fake telemetry"},
+    )
+    monkeypatch.setattr(orchestrator.lake, "refresh_views", lambda *a, **k: None)
+    for _ in range(2):
+        stats = orchestrator.ingest("faketelemetry", year=2024, use_cache=False)
+
+    catalog = DataCatalog(db_path=db_path)
+    with catalog.get_connection() as con:
+        status, params, peak = con.execute(
+            "SELECT status, params, peak_rss_mb FROM etl_runs WHERE run_id = ?",
+            (stats["run_id"],),
+        ).fetchone()
+        stages = con.execute(
+            "SELECT stage, parent, bytes, mb_per_s FROM etl_stage_metrics "
+            "WHERE run_id = ? ORDER BY seq",
+            (stats["run_id"],),
+        ).fetchall()
+    assert status == "done" and "year=2024" in params and peak > 0
+    assert [(s[0], s[1], s[2]) for s in stages] == [
+        ("download", None, 4096),
+        ("process", None, 8192),
+        ("transform", "process", 8192),
+        ("qa", None, 0),
+        ("hash", None, 8192),
+        ("register", None, 0),
+        ("lake", None, 0),
+        ("zonal", None, 0),
+        ("terrain", None, 0),
+        ("evict", None, 0),
+    ]
+    throughput = {s[0]: s[3] for s in stages}
+    assert throughput["download"] > 0 and throughput["register"] is None
+
+    report = telemetry.run_stats("faketelemetry", catalog=catalog)
+    assert len(report["runs"]) == 2
+    by_stage = {row["stage"]: row for row in report["stages"]}
+    assert by_stage["process"]["runs"] == 2 and by_stage["process"]["bytes"] == 16384
+    assert by_stage["zonal"]["median_mb_per_s"] is None
+
+    result = CliRunner().invoke(app, ["stats", "--dataset", "faketelemetry", "--json"])
+    assert result.exit_code == 0
+    assert len(json.loads(result.output)["runs"]) == 2
+    result = CliRunner().invoke(app, ["stats", "--dataset", "faketelemetry"])
+    assert result.exit_code == 0 and "faketelemetry/process" in result.output
+
+
+def test_terrain_is_derived_only_on_request(mock_etl_env, monkeypatch):
+    """Ingests skip the terrain hook unless `--terrain` or the setting asks."""
+    from typer.testing import CliRunner
+    from fastclime.config import settings
+    from fastclime.m1_etl import orchestrator
+    from fastclime.m1_etl.cli import app
+    from fastclime.m1_etl.datasets import DATASETS
+
+    def download(temp_dir, **kwargs):
+        raw = temp_dir / "raw.bin"
+        raw.write_bytes(b"x" * 64)
+        return [raw]
+
+    def process(raw_files, processed_dir, **kwargs):
+        path = processed_dir / "fakedem.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(raw_files[0].read_bytes())
+        return path
+
+    calls = []
+    monkeypatch.setitem(
+        DATASETS,
+        "fakedem",
+        {
+            "download": download,
+            "process": process,
+            "terrain": lambda path, year, catalog: calls.append(year) or {},
+            "desc": "Fake DEM",
+        },
+    )
+    monkeypatch.setattr(orchestrator.lake, "refresh_views", lambda *a, **k: None)
+
+    orchestrator.ingest("fakedem", year=2021, use_cache=False)
+    assert calls == []
+    args = ["run", "fakedem", "--year", "2022", "--bbox", "0 0 1 1"]
+    args += ["--no-cache", "--terrain"]
+    assert CliRunner().invoke(app, args).exit_code == 0
+    assert calls == ["2022"]
+    monkeypatch.setattr(settings, "DEM_TERRAIN", True)
+    orchestrator.ingest("fakedem", year=2023, use_cache=False)
+    orchestrator.ingest("fakedem", year=2024, use_cache=False, terrain=False)
+    assert calls == ["2022", "2023"]
+
+
+def _write_dem(path, z, crs="EPSG:32617", res=30.0, nodata=-32767.0):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=z.shape[1],
+        height=z.shape[0],
+        count=1,
+        dtype="float32",
+        crs=crs,
+        transform=from_origin(500000, 1000000, res, res),
+        nodata=nodata,
+    ) as dst:
+        dst.write(z.astype("float32"), 1)
+    return path
+
+
+def test_terrain_tiles_with_halos_match_a_single_pass(mock_etl_env, monkeypatch):
+    """Tiled slope/aspect equal the untiled result; pressure follows Eq. 7."""
+    import numpy as np
+    import rasterio
+    from fastclime.m0_storage import find_rasters
+    from fastclime.m1_etl import terrain
+    from fastclime.m2_dynamic.utils import get_atmospheric_pressure
+
+    assert get_atmospheric_pressure(1800) == pytest.approx(81.8, abs=0.05)
+
+    # A plane rising 0.1 m/m to the east and 0.05 m/m to the north.
+    rows, cols = np.mgrid[0:150, 0:200]
+    plane = 1000 + 0.1 * cols * 30 - 0.05 * rows * 30
+    out = mock_etl_env["processed_dir"] / "dem" / "2024"
+    out.mkdir(parents=True)
+    layers = terrain.derive(_write_dem(out / "plane.tif", plane), tile_size=64)
+    with rasterio.open(layers["slope"]) as src:
+        slope = src.read(1)[1:-1, 1:-1]
+    with rasterio.open(layers["aspect"]) as src:
+        aspect = src.read(1)[1:-1, 1:-1]
+    assert np.allclose(slope, np.degrees(np.arctan(np.hypot(0.1, 0.05))), atol=1e-4)
+    assert np.allclose(aspect, 180 + np.degrees(np.arctan2(0.1, 0.05)), atol=1e-3)
+
+    # A rough surface with a nodata hole, across tile boundaries.
+    rng = np.random.default_rng(0)
+    rough = rng.normal(500, 40, (300, 257))
+    rough[100:110, 60:70] = -32767.0
+    dem = _write_dem(out / "rough.tif", rough)
+    tiled = terrain.derive(dem, out_dir=out / "tiled", tile_size=48, workers=2)
+    whole = terrain.derive(dem, out_dir=out / "whole", tile_size=1024, workers=1)
+    for name in terrain.LAYERS:
+        with rasterio.open(tiled[name]) as a, rasterio.open(whole[name]) as b:
+            assert a.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") == "COG"
+            assert np.array_equal(a.read(1), b.read(1))
+    with rasterio.open(tiled["slope"]) as src:
+        slope = src.read(1)
+        assert (slope[99:111, 59:71] == src.nodata).all()
+        assert (slope[:99] != src.nodata).all()
+    with rasterio.open(tiled["pressure"]) as src:
+        assert np.allclose(
+            src.read(1)[0], get_atmospheric_pressure(rough[0]), rtol=1e-6
+        )
+
+    terrain.register(tiled, "2024")
+    bbox = [-81.0, 8.9, -80.9, 9.1]
+    found = find_rasters(bbox, dataset_name="dem_pressure")
+    assert [p.name for p in found] == ["pressure_rough.tif"]
+
+
+def test_qa_stats_stream_with_writes_and_gate_ingest(
+    mock_etl_env, monkeypatch, db_path
+):
+    """Writers tag exact stats block by block; thresholds stop bad ingests."""
+    import json
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+    from fastclime.config import settings
+    from fastclime.m1_etl import orchestrator, qa, utils
+    from fastclime.m1_etl.datasets import DATASETS
+
+    rng = np.random.default_rng(1)
+    data = rng.normal(0.4, 0.2, (700, 600)).clip(0, 0.99).astype("float32")
+    data[:70] = -9999.0
+    # Later blocks reach further, so the histogram has to widen.
+    spread = data * np.linspace(1, 5, data.shape[0], dtype="float32")[:, None]
+    spread[:70] = -9999.0
+    stats = qa.QAStats()
+    for block in np.array_split(spread, 7):
+        stats.update(block, nodata=-9999.0)
+    valid = spread[70:].astype(np.float64)
+    assert stats.valid == valid.size and stats.fill_ratio == pytest.approx(0.1)
+    assert stats.mean == pytest.approx(valid.mean())
+    assert stats.std == pytest.approx(valid.std())
+    hist = stats.histogram()
+    assert sum(hist["counts"]) == valid.size
+    assert hist["edges"][0] <= valid.min() and hist["edges"][-1] >= valid.max()
+
+    def process(raw_files, processed_dir, temp_dir, **kwargs):
+        src = temp_dir / "band.tif"
+        with rasterio.open(
+            src,
+            "w",
+            driver="GTiff",
+            width=600,
+            height=700,
+            count=1,
+            dtype="int16",
+            crs="EPSG:4326",
+            transform=from_origin(-79, 9, 0.001, 0.001),
+            nodata=-3000,
+        ) as dst:
+            dst.write(np.where(data == -9999.0, -3000, data * 10000).astype("int16"), 1)
+            dst.update_tags(1, scale_factor="10000", valid_range="-2000, 10000")
+        tif = utils.hdf4_to_geotiff(
+            src, temp_dir / "scaled.tif", 0, scale_convention="modis"
+        )
+        return utils.to_cog(tif, processed_dir / "qa.tif")
+
+    monkeypatch.setitem(
+        DATASETS,
+        "fakeqa",
+        {"download": lambda **kwargs: [], "process": process, "desc": "Fake QA"},
+    )
+    stats = orchestrator.ingest("fakeqa", year=2024, use_cache=False)
+    catalog = DataCatalog(db_path=db_path)
+    with catalog.get_connection() as con:
+        row = con.execute(
+            "SELECT field, count, valid, fill_ratio, min, max, histogram, approximate "
+            "FROM artifact_qa WHERE artifact_id = ?",
+            (stats["artifact_uuid"],),
+        ).fetchone()
+    scaled = np.round(data[data != -9999.0] * 10000).astype("int16") / 10000
+    assert row[:3] == ("band1", data.size, scaled.size)
+    assert row[3] == pytest.approx(0.1)
+    assert row[4] == pytest.approx(scaled.min()) and row[5] == pytest.approx(
+        scaled.max()
+    )
+    assert sum(json.loads(row[6])["counts"]) == scaled.size and row[7] is False
+
+    # A mosaic written by GDAL alone gets stats from its coarsest overview.
+    mosaic = utils.mosaic_to_cog(
+        [Path(stats["processed_file_path"])], mock_etl_env["temp_dir"] / "m.tif"
+    )
+    approx = qa.read(mosaic)["band1"]
+    assert approx["approximate"] and approx["fill_ratio"] == pytest.approx(0.1, 0.05)
+
+    monkeypatch.setattr(settings, "QA_THRESHOLDS", {"fakeqa": {"max_fill_ratio": 0.05}})
+    # Estimates are recorded, not enforced; the exact stats of an ingest are.
+    qa.check({"band1": approx}, "fakeqa", mosaic)
+    with pytest.raises(ValueError, match="fill ratio 10.0% > 5.0%"):
+        orchestrator.ingest("fakeqa", year=2024, use_cache=False, overwrite=True)
+    with catalog.get_connection() as con:
+        artifacts = con.execute(
+            "SELECT count(*) FROM artifacts WHERE dataset_name = 'fakeqa'"
+        ).fetchone()[0]
+        status = con.execute(
+            "SELECT status FROM etl_runs WHERE dataset_name = 'fakeqa' "
+            "ORDER BY started_at DESC LIMIT 1"
+        ).fetchone()[0]
+    assert artifacts == 1 and status == "failed"
+
+
+def test_dataset_registry_is_lazy_and_loads_plugins(tmp_path, monkeypatch):
+    """Listing imports no dataset module; plugins register via entry points."""
+    import subprocess
+    import sys
+    from importlib.metadata import EntryPoint
+    from fastclime.m1_etl import datasets
+
+    # The whole CLI, not just the registry: `fastclime ingest list` must not
+    # pull the geo stack in through another module.
+    code = (
+        "import sys; from typer.testing import CliRunner; "
+        "from fastclime.cli import app; "
+        "result = CliRunner().invoke(app, ['ingest', 'list']); "
+        "print(sorted(line.split(':')[0].strip(' -') "
+        "for line in result.output.splitlines() if line.startswith('  - '))); "
+        "print([m for m in ('rasterio', 'shapely', 'h5py', 'geopandas', "
+        "'requests', 'fastclime.m0_storage.footprints', "
+        "'fastclime.m1_etl.datasets.dem') if m in sys.modules])"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    assert out[-2:] == ["['dem', 'ndvi', 'smap']", "[]"]
+
+    (tmp_path / "fake_plugin.py").write_text(
+        "SPEC = {\n"
+        "    'desc': 'Plugin dataset',\n"
+        "    'download': 'fake_plugin_hooks:download',\n"
+        "    'process': 'fake_plugin_hooks:process',\n"
+        "}\n"
+        "BROKEN = {'desc': 'No hooks'}\n"
+    )
+    (tmp_path / "fake_plugin_hooks.py").write_text(
+        "def download(**kwargs):\n    return ['raw']\n"
+        "def process(raw_files, **kwargs):\n    return raw_files\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    group = datasets.ENTRY_POINT_GROUP
+    monkeypatch.setattr(
+        datasets,
+        "entry_points",
+        lambda group: [
+            EntryPoint("plugin", "fake_plugin:SPEC", group),
+            EntryPoint("broken", "fake_plugin:BROKEN", group),
+            EntryPoint("dem", "fake_plugin:SPEC", group),
+        ],
+    )
+    registry = datasets.DatasetRegistry(datasets.MANIFEST, group=group)
+
+    assert "plugin" in registry and "fake_plugin" not in sys.modules
+    spec = registry["plugin"]
+    assert "fake_plugin_hooks" not in sys.modules
+    assert spec["process"](spec["download"]()) == ["raw"]
+    assert registry["dem"]["desc"] == "Copernicus 30 m DEM"
+    # The broken plugin is dropped with an error instead of breaking listing.
+    assert sorted(registry) == ["dem", "ndvi", "plugin", "smap"]
+    with pytest.raises(ValueError, match="missing"):
+        registry["fake"] = {"desc": "Fake"}
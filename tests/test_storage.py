@@ -1,7 +1,16 @@
+import importlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import numpy as np
+import pandas as pd
 import pytest
+import rasterio
+from rasterio.transform import from_bounds
 from typer.testing import CliRunner
-import duckdb
-import importlib
 
 from fastclime.cli import app
 from fastclime.m0_storage import (
@@ -15,6 +24,11 @@ from fastclime.m0_storage import (
 # to make sure they get the patched DATA_DIR from the env var.
 from fastclime import config
 from fastclime.m0_storage import catalog, io, cli as storage_cli
+from fastclime.m0_storage import cache as cache_mod, lake, stats as stats_mod
+from fastclime.m0_storage import footprints
+
+# `fastclime.m0_storage.sync` is shadowed by the `sync` function on the package.
+sync_mod = importlib.import_module("fastclime.m0_storage.sync")
 
 runner = CliRunner()
 
@@ -33,6 +47,11 @@ def temp_storage(tmp_path, monkeypatch):
     importlib.reload(config)
     importlib.reload(io)
     importlib.reload(catalog)
+    importlib.reload(sync_mod)
+    importlib.reload(cache_mod)
+    importlib.reload(lake)
+    importlib.reload(stats_mod)
+    importlib.reload(footprints)
     importlib.reload(storage_cli)
 
     # Run the init command to set up the structure in the temp dir
@@ -114,3 +133,344 @@ def test_register_and_data_path(temp_storage):
         "SELECT file_hash FROM artifacts WHERE dataset_name = 'dummy_dataset'"
     ).fetchone()[0]
     assert artifact_hash_db == file_hash, "Artifact hash does not match."
+
+
+@pytest.fixture
+def remote_dir(tmp_path_factory):
+    """A local directory acting as a sync remote with a couple of datasets."""
+    remote = tmp_path_factory.mktemp("remote")
+    files = {
+        "raw/smap/SMAP_2024001.h5": b"a" * 3000,
+        "raw/smap/SMAP_2024002.h5": b"b" * 5000,
+        "processed/dem/2024/DEM.tif": b"c" * 1000,
+    }
+    for rel, content in files.items():
+        (remote / rel).parent.mkdir(parents=True, exist_ok=True)
+        (remote / rel).write_bytes(content)
+    return remote
+
+
+def test_sync_transfers_only_missing_or_changed(temp_storage, remote_dir):
+    """A second sync is a no-op; changing one remote file re-transfers only it."""
+    data_dir = temp_storage
+
+    result = runner.invoke(app, ["storage", "sync", str(remote_dir)])
+    assert result.exit_code == 0, result.stdout
+    assert (data_dir / "raw/smap/SMAP_2024002.h5").read_bytes() == b"b" * 5000
+    assert (data_dir / "processed/dem/2024/DEM.tif").exists()
+
+    index = catalog.get_catalog().get_artifact_index()
+    assert index["raw/smap/SMAP_2024001.h5"][1] == 3000
+
+    stats = sync_mod.sync(str(remote_dir))
+    assert stats["files_skipped"] == 3
+    assert stats["files_transferred"] == 0
+
+    (remote_dir / "raw/smap/SMAP_2024001.h5").write_bytes(b"z" * 10)
+    stats = sync_mod.sync(str(remote_dir))
+    assert stats["files_transferred"] == 1
+    assert stats["bytes_transferred"] == 10
+    assert (data_dir / "raw/smap/SMAP_2024001.h5").read_bytes() == b"z" * 10
+
+
+def test_sync_resumes_partial_transfer(temp_storage, remote_dir):
+    """An interrupted transfer continues from its `.part` file."""
+    data_dir = temp_storage
+    sync_mod.write_manifest(remote_dir)
+
+    part = data_dir / "raw/smap/SMAP_2024002.h5.part"
+    part.parent.mkdir(parents=True, exist_ok=True)
+    part.write_bytes(b"b" * 4000)
+
+    stats = sync_mod.sync(f"file://{remote_dir}", workers=2)
+    assert stats["failed"] == []
+    # 3000 + 1000 bytes for the fresh files, only the last 1000 for the resumed one.
+    assert stats["bytes_transferred"] == 5000
+    assert not part.exists()
+    assert (data_dir / "raw/smap/SMAP_2024002.h5").read_bytes() == b"b" * 5000
+
+
+@pytest.mark.parametrize("path", ["../outside.txt", "raw/../../outside.txt", "/tmp/x"])
+def test_sync_rejects_paths_outside_the_data_dir(temp_storage, remote_dir, path):
+    """A manifest entry escaping DATA_DIR fails the sync before any transfer."""
+    sync_mod.write_manifest(remote_dir)
+    manifest = remote_dir / sync_mod.MANIFEST_NAME
+    data = json.loads(manifest.read_text())
+    data["files"].append({"path": path, "size": 1, "sha256": "0" * 64})
+    manifest.write_text(json.dumps(data))
+
+    with pytest.raises(ValueError, match="outside of the data directory"):
+        sync_mod.sync(str(remote_dir))
+    assert not (temp_storage / "raw/smap/SMAP_2024001.h5").exists()
+    assert not (temp_storage.parent / "outside.txt").exists()
+
+    result = runner.invoke(app, ["storage", "sync", str(remote_dir)])
+    assert result.exit_code == 1
+
+
+def test_sync_rejects_unknown_scheme(temp_storage):
+    result = runner.invoke(app, ["storage", "sync", "s3://bucket/path"])
+    assert result.exit_code == 1
+
+
+def test_cache_evicts_least_recently_used(temp_storage):
+    """Eviction removes the oldest files first and keeps touched ones."""
+    data_dir = temp_storage
+    files = []
+    for i in range(4):
+        path = data_dir / "raw" / "dem" / f"tile_{i}.tif"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 1000)
+        # Tile 0 is the oldest, tile 3 the newest.
+        os.utime(path, (1_000_000 + i * 100, 1_000_000 + i * 100))
+        files.append(path)
+
+    manager = cache_mod.CacheManager()
+    manager.scan("raw")
+    manager.touch([files[0]])  # Reused, so tile 0 becomes the hottest.
+
+    result = manager.evict("raw", quota_bytes=2000)
+    assert result["files_evicted"] == 2
+    assert result["size_after_bytes"] == 2000
+    assert files[0].exists() and files[3].exists()
+    assert not files[1].exists() and not files[2].exists()
+
+    stats = manager.stats()
+    assert stats["raw"]["files"] == 2
+    assert stats["raw"]["size_bytes"] == 2000
+
+
+def test_cache_enforces_quota_after_writes(temp_storage, monkeypatch):
+    """Only a stage written past its quota is evicted, oldest files first."""
+    monkeypatch.setattr(cache_mod.settings, "CACHE_QUOTA_TMP_GB", 2500 / cache_mod.GIB)
+    manager = cache_mod.CacheManager()
+    raw = temp_storage / "raw" / "dem" / "tile.tif"
+    raw.parent.mkdir(parents=True, exist_ok=True)
+    raw.write_bytes(b"x" * 1000)
+
+    written = []
+    for i in range(4):
+        path = temp_storage / "tmp" / "zonal" / f"labels_{i}.tif"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 1000)
+        manager.touch([path])
+        written.append(path)
+        if i < 2:
+            assert manager.enforce_quota() == []
+
+    (result,) = manager.enforce_quota()
+    assert result["stage"] == "tmp" and result["files_evicted"] == 2
+    assert [p.exists() for p in written] == [False, False, True, True]
+    assert raw.exists()
+
+
+def test_cache_cli(temp_storage):
+    (temp_storage / "tmp" / "scratch.bin").write_bytes(b"x" * 10)
+
+    result = runner.invoke(app, ["storage", "cache", "stats"])
+    assert result.exit_code == 0, result.stdout
+    assert '"tmp"' in result.stdout
+
+    result = runner.invoke(
+        app, ["storage", "cache", "evict", "--stage", "tmp", "--quota-gb", "0"]
+    )
+    assert result.exit_code == 0, result.stdout
+    assert not (temp_storage / "tmp" / "scratch.bin").exists()
+
+
+def _hold_write_lock(db_path, ready, release):
+    """Writer process: keeps inserting while holding the catalog write lock."""
+    con = duckdb.connect(str(db_path))
+    ready.set()
+    i = 100
+    while not release.is_set():
+        con.execute("INSERT INTO metrics_hourly (eto_mm_h) VALUES (?)", (float(i),))
+        i += 1
+    con.close()
+
+
+def test_readers_run_alongside_writer(tmp_path):
+    """N snapshot readers keep working while another process holds the lock."""
+    cat = catalog.DataCatalog(tmp_path / "catalog.db")
+    with cat.get_connection() as con:
+        con.execute("CREATE TABLE metrics_hourly (eto_mm_h DOUBLE)")
+        con.execute("INSERT INTO metrics_hourly SELECT range FROM range(100)")
+    cat.snapshot()
+
+    ctx = multiprocessing.get_context("fork")
+    ready, release = ctx.Event(), ctx.Event()
+    writer = ctx.Process(target=_hold_write_lock, args=(cat.db_path, ready, release))
+    writer.start()
+    try:
+        assert ready.wait(timeout=30)
+
+        def read(_):
+            con = cat.read_connection(tables=("metrics_hourly",))
+            return con.execute("SELECT count(*) FROM metrics_hourly").fetchone()[0]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            counts = list(pool.map(read, range(16)))
+        assert writer.is_alive(), "Readers should not have waited for the writer."
+        assert counts == [100] * 16
+    finally:
+        release.set()
+        writer.join(timeout=30)
+
+    # Once the writer is done, the next reader picks up its rows.
+    con = cat.read_connection(tables=("metrics_hourly",))
+    assert con.execute("SELECT count(*) FROM metrics_hourly").fetchone()[0] > 100
+
+
+def test_read_connection_without_snapshots(tmp_path):
+    """A cold reader copies from the catalog, or fails clearly if it's locked."""
+    cat = catalog.DataCatalog(tmp_path / "catalog.db")
+    with cat.get_connection() as con:
+        con.execute("CREATE TABLE metrics_hourly (eto_mm_h DOUBLE)")
+        con.execute("INSERT INTO metrics_hourly SELECT range FROM range(100)")
+
+    ctx = multiprocessing.get_context("fork")
+    ready, release = ctx.Event(), ctx.Event()
+    writer = ctx.Process(target=_hold_write_lock, args=(cat.db_path, ready, release))
+    writer.start()
+    try:
+        assert ready.wait(timeout=30)
+        with pytest.raises(FileNotFoundError, match="locked by a writer"):
+            cat.read_connection(tables=("metrics_hourly",))
+        assert not (cat.snapshot_dir / "metrics_hourly.parquet").exists()
+    finally:
+        release.set()
+        writer.join(timeout=30)
+
+    # Read-only fallback: copied in memory, the catalog file is not held.
+    for path in cat.snapshot_dir.glob("*.parquet"):
+        path.unlink()
+    con = duckdb.connect(":memory:")
+    cat._copy_read_only(con, ["metrics_hourly", "nope"])
+    assert con.execute("SELECT count(*) FROM metrics_hourly").fetchone()[0] > 100
+    with cat.get_connection(timeout=0) as writer_con:
+        writer_con.execute("INSERT INTO metrics_hourly VALUES (1.0)")
+
+
+def test_lake_views_prune_partitions(temp_storage):
+    """Partitioned files are queryable through an auto-maintained view."""
+    smap_dir = temp_storage / "processed" / "smap"
+    for month in (1, 2):
+        part = lake.partition_dir(smap_dir, year=2024, month=month)
+        assert part == smap_dir / "year=2024" / f"month={month}"
+        lake.write_parquet(
+            pd.DataFrame({"value": [0.1 * month] * 10}), part / f"SMAP_{month}.parquet"
+        )
+
+    assert lake.refresh_views() == ["lake_smap"]
+    with catalog.get_catalog().get_connection() as con:
+        rows = con.execute(
+            "SELECT month, count(*) FROM lake_smap WHERE month = 2 GROUP BY month"
+        ).fetchall()
+        codec = con.execute(
+            "SELECT compression FROM parquet_metadata(?) LIMIT 1",
+            (str(smap_dir / "year=2024" / "month=1" / "SMAP_1.parquet"),),
+        ).fetchone()[0]
+    assert rows == [(2, 10)]
+    assert codec.upper() == "ZSTD"
+
+
+def test_lake_export_table(temp_storage):
+    """Exporting a table moves its rows out of the catalog into the lake."""
+    cat = catalog.get_catalog()
+    with cat.get_connection() as con:
+        con.execute("CREATE TABLE metrics_hourly (ts TIMESTAMP, eto_mm_h DOUBLE)")
+        con.execute(
+            "INSERT INTO metrics_hourly SELECT TIMESTAMP '2024-01-31' + "
+            "INTERVAL (range) HOUR, 0.5 FROM range(48)"
+        )
+
+    assert lake.export_table("metrics_hourly", "ts", delete=True) == 48
+    with cat.get_connection() as con:
+        assert con.execute("SELECT count(*) FROM metrics_hourly").fetchone()[0] == 0
+        by_month = con.execute(
+            "SELECT month, count(*) FROM lake_metrics_hourly GROUP BY 1 ORDER BY 1"
+        ).fetchall()
+    assert by_month == [(1, 24), (2, 24)]
+
+    # Later exports only add rows missing from the lake: a late row, and
+    # identical rows as many times as the catalog holds them.
+    with cat.get_connection() as con:
+        con.execute(
+            "INSERT INTO metrics_hourly VALUES (TIMESTAMP '2024-02-02', 1.0), "
+            "(TIMESTAMP '2024-02-02', 1.0), (TIMESTAMP '2024-01-15', 2.0)"
+        )
+    assert lake.export_table("metrics_hourly", "ts") == 3
+    assert lake.export_table("metrics_hourly", "ts") == 0
+    with cat.get_connection() as con:
+        con.execute("INSERT INTO metrics_hourly VALUES (TIMESTAMP '2024-02-02', 1.0)")
+    assert lake.export_table("metrics_hourly", "ts") == 1
+    with cat.get_connection() as con:
+        con.execute("INSERT INTO metrics_hourly VALUES (TIMESTAMP '2024-02-03', 4.0)")
+        lake_rows = con.execute("SELECT count(*) FROM lake_metrics_hourly").fetchone()
+    assert lake_rows == (52,)
+
+    # Readers of the table see every row once, exported or not.
+    for time_column in ("ts", None):
+        con = cat.read_connection(tables=("metrics_hourly",))
+        assert lake.include_exported(con, "metrics_hourly", time_column=time_column)
+        assert con.execute(
+            "SELECT count(*), sum(eto_mm_h) FROM metrics_hourly"
+        ).fetchone() == (53, 24.0 + 3.0 + 2.0 + 4.0)
+    assert not lake.include_exported(con, "plant_ndvi_daily")
+
+
+def test_storage_stats(temp_storage):
+    """Usage is aggregated from the catalog, with a filesystem fallback."""
+    register_dataset(name="smap", source="t", version="1", description="d")
+    register_dataset(name="dem", source="t", version="1", description="d")
+    register_artifact("smap", "raw", "raw/smap/a.h5", "h1", 100)
+    register_artifact("smap", "raw", "raw/smap/b.h5", "h1", 100)  # duplicate
+    register_artifact("smap", "processed", "processed/smap/a.parquet", "h2", 50)
+    register_artifact("dem", "processed", "processed/dem/d.tif", "h3", 250)
+    (temp_storage / "models" / "stress_clf").mkdir(parents=True)
+    (temp_storage / "models" / "stress_clf" / "model.pkl").write_bytes(b"x" * 42)
+
+    report = stats_mod.storage_stats()
+    assert report["total"]["files"] == 4
+    assert report["total"]["bytes"] == 500
+    assert report["total"]["duplicate_bytes"] == 100
+    assert report["by_dataset"]["smap"]["bytes"] == 250
+    assert report["by_stage"]["processed"]["files"] == 2
+    assert report["growth"][-1]["cumulative_bytes"] == 500
+    assert report["filesystem"]["models"]["stress_clf"]["bytes"] == 42
+
+    result = runner.invoke(app, ["storage", "stats", "--json"])
+    assert result.exit_code == 0, result.stdout
+
+
+def test_coverage_reindexes_existing_rasters(temp_storage):
+    """Rasters registered before the footprint index are picked up on reindex."""
+    path = temp_storage / "processed" / "dem" / "2021" / "DEM_a.tif"
+    path.parent.mkdir(parents=True)
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=20,
+        height=20,
+        count=1,
+        dtype="int16",
+        crs="EPSG:32617",
+        transform=from_bounds(500000, 1000000, 520000, 1020000, 20, 20),
+    ) as dst:
+        dst.write(np.zeros((1, 20, 20), dtype="int16"))
+    register_dataset(name="dem", source="t", version="1", description="d")
+    register_artifact("dem", "processed", "processed/dem/2021/DEM_a.tif", "h", 1)
+    assert len(footprints.FootprintIndex.load("dem")) == 0
+
+    result = runner.invoke(
+        app, ["storage", "coverage", "--bbox", "-81.0 9.0 -80.9 9.1", "--reindex"]
+    )
+    assert result.exit_code == 0, result.stdout
+    (hit,) = json.loads(result.stdout)
+    assert hit["path"] == "processed/dem/2021/DEM_a.tif"
+    assert hit["crs"] == "EPSG:32617" and hit["resolution"] == [1000.0, 1000.0]
+
+    index = footprints.FootprintIndex.load("dem")
+    assert index.covering([-80.95, 9.1, -80.9, 9.15]) is not None
+    assert index.covering([-81.5, 9.1, -80.9, 9.15]) is None